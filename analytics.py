@@ -0,0 +1,126 @@
+import datetime
+
+from migrations import TRAINING_VOLUME_REBUILD_SQL, split_statements
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# Weeks shown by /api/analytics/weekly when no range is given
+DEFAULT_WEEKS = 12
+
+WORKOUT_SORTS = {
+    'volume': 'v.total_volume DESC, v.workout_id',
+    'workout_id': 'v.workout_id',
+}
+
+
+class AnalyticsError(ValueError):
+    """
+    Raised for invalid analytics query parameters.
+    """
+
+
+def workout_volumes(conn, sort='volume', limit=DEFAULT_LIMIT):
+    """
+    Per-workout training volume, read from Workout_Volume.
+    :param conn: Open SQLite connection
+    :param sort: 'volume' (highest first) or 'workout_id'
+    :param limit: Maximum number of workouts
+    :return: List of dictionaries
+    """
+    if sort not in WORKOUT_SORTS:
+        raise AnalyticsError(f"Invalid sort '{sort}'; expected one of {', '.join(WORKOUT_SORTS)}")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise AnalyticsError(f"'limit' must be between 1 and {MAX_LIMIT}")
+    rows = conn.execute(f"""
+        SELECT v.workout_id, w.name, v.exercise_count, v.total_sets, v.total_reps, v.total_volume
+        FROM Workout_Volume v
+        JOIN Workout w ON w.workout_id = v.workout_id
+        ORDER BY {WORKOUT_SORTS[sort]}
+        LIMIT ?
+    """, (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def workout_volume(conn, workout_id):
+    """
+    Volume of one workout with its per-muscle-group breakdown.
+    :return: Dictionary, or None if the workout does not exist
+    """
+    row = conn.execute("""
+        SELECT v.workout_id, w.name, v.exercise_count, v.total_sets, v.total_reps, v.total_volume
+        FROM Workout_Volume v
+        JOIN Workout w ON w.workout_id = v.workout_id
+        WHERE v.workout_id = ?
+    """, (workout_id,)).fetchone()
+    if row is None:
+        return None
+    result = dict(row)
+    result['muscle_groups'] = [dict(r) for r in conn.execute("""
+        SELECT muscle_group, exercise_count, volume
+        FROM Workout_Muscle_Volume
+        WHERE workout_id = ?
+        ORDER BY volume DESC, muscle_group
+    """, (workout_id,))]
+    return result
+
+
+def muscle_group_volumes(conn):
+    """
+    Number of workouts and exercise links training each muscle group, and their total volume.
+    :return: List of dictionaries, highest volume first
+    """
+    rows = conn.execute("""
+        SELECT muscle_group, workout_count, exercise_count, volume
+        FROM Muscle_Group_Volume
+        ORDER BY volume DESC, muscle_group
+    """).fetchall()
+    return [dict(row) for row in rows]
+
+
+def week_range(start, end):
+    """
+    Expand a date range to whole ISO weeks (Monday to Sunday).
+    :return: (first Monday, last Sunday) as datetime.date
+    """
+    return (start - datetime.timedelta(days=start.weekday()),
+            end + datetime.timedelta(days=6 - end.weekday()))
+
+
+def weekly_volumes(conn, start, end):
+    """
+    Scheduled sessions and volume per ISO week, read from Weekly_Volume.
+    :param conn: Open SQLite connection
+    :param start: First date (inclusive); weeks starting before it are included if they contain it
+    :param end: Last date (inclusive)
+    :return: List of dictionaries ordered by week; weeks without sessions are omitted
+    """
+    first_monday, _ = week_range(start, end)
+    rows = conn.execute("""
+        SELECT week_start, sessions, volume
+        FROM Weekly_Volume
+        WHERE week_start BETWEEN ? AND ?
+        ORDER BY week_start
+    """, (first_monday.isoformat(), end.isoformat())).fetchall()
+    weeks = []
+    for row in rows:
+        iso_year, iso_week, _ = datetime.date.fromisoformat(row['week_start']).isocalendar()
+        weeks.append({
+            'week': f"{iso_year}-W{iso_week:02d}",
+            'week_start': row['week_start'],
+            'sessions': row['sessions'],
+            'volume': row['volume'],
+        })
+    return weeks
+
+
+def rebuild_aggregates(conn):
+    """
+    Recompute every training-volume summary table from the base tables in one transaction.
+    :param conn: Open SQLite connection
+    :return: Dictionary of row counts per summary table
+    """
+    with conn:
+        for statement in split_statements(TRAINING_VOLUME_REBUILD_SQL):
+            conn.execute(statement)
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('Workout_Volume', 'Workout_Muscle_Volume', 'Muscle_Group_Volume', 'Weekly_Volume')}
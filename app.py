@@ -1,79 +1,404 @@
-from flask import Flask, flash, render_template, jsonify, g, request, redirect, url_for
-import psycopg2
-import uuid
+from flask import Blueprint, Flask, Response, current_app, flash, render_template, jsonify, g, request, redirect, send_from_directory, stream_with_context, url_for
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.local import LocalProxy
+import calendar
+import click
+import csv
+import datetime
+import io
+import json
 import os
-import random
 import sqlite3
+import logging
+import signal
+import threading
+import time
+import atexit
+from db_pool import ConnectionPool
+from migrations import migrate, get_version
+from exercise_query import ExerciseQuery, QueryError
+import search
+import analytics
+import repository
+import columnar
+import assets
+import recurrence
+import events
+import jobs
+import sync
+import tenancy
+from response_cache import ResponseCache
+from fragment_cache import FragmentCache
+import bulk_io
+from writer import WriteQueue, WriteTimeoutError
+from id_allocator import IdAllocator, reserve_block
+import instrumentation
+from instrumentation import InstrumentedConnection, RequestMetrics
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Serializes repository records (and sqlite3 rows) directly, without converting them first.
+    """
 
-app = Flask(__name__)
-app.secret_key = 'ctk'
+    @staticmethod
+    def default(o):
+        if isinstance(o, (repository.Record, sqlite3.Row)):
+            return repository.json_default(o)
+        return DefaultJSONProvider.default(o)
+
+
+# Routes, error handlers and CLI commands; create_app() registers them on each app it builds
+bp = Blueprint('main', __name__, cli_group=None)
+
+# Settings of create_app(). WORKOUT_* environment variables override them by name (WORKOUT_DATABASE,
+# WORKOUT_POOL_SIZE, ...) and the config passed to create_app() overrides both.
+DEFAULT_CONFIG = {
+    'DATABASE': 'workoutdatabase.db',
+    'SCHEMA_FILE': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create-tables.sql'),
+    'SECRET_KEY': 'ctk',
+    # Connections per process; every worker process has its own pool over the shared WAL database
+    'POOL_SIZE': 8,
+    'RESPONSE_CACHE': True,
+    # Statements slower than this are logged with normalized SQL, to SLOW_QUERY_LOG if set
+    'SLOW_QUERY_MS': 100,
+    'SLOW_QUERY_LOG': None,
+    # Change events buffered per /api/events client before it is dropped as too slow, and clients per process
+    'EVENT_BUFFER': 256,
+    'EVENT_MAX_SUBSCRIBERS': 100,
+    # Days deleted rows stay in the /api/sync change log, and seconds between compactions of the log
+    'SYNC_RETENTION_DAYS': sync.DEFAULT_RETENTION_DAYS,
+    'SYNC_COMPACT_INTERVAL': 3600,
+    # Per-tenant databases: with TENANT_DIR set, a request naming a tenant in the TENANT_HEADER header or as a
+    # subdomain of TENANT_DOMAIN uses TENANT_DIR/<tenant>.db; other requests use DATABASE
+    'TENANT_DIR': None,
+    'TENANT_HEADER': 'X-Tenant',
+    'TENANT_DOMAIN': None,
+    # Tenants whose pools and writer threads are kept open. Tenant databases are created with
+    # `flask tenant-migrate`; with TENANT_AUTO_CREATE a request naming an unknown tenant creates one, until
+    # TENANT_DIR holds TENANT_AUTO_CREATE_MAX of them
+    'TENANT_MAX_OPEN': 32,
+    'TENANT_AUTO_CREATE': False,
+    'TENANT_AUTO_CREATE_MAX': 100,
+    # Background jobs: workers per process in the process pool (CPU-bound jobs) and the thread pool (I/O-bound
+    # jobs), seconds between looks at the queue, and days finished jobs and their files are kept. With
+    # JOB_RUNNER false this process only queues jobs and `flask jobs-worker` runs them.
+    'JOB_PROCESSES': 2,
+    'JOB_THREADS': 4,
+    'JOB_POLL_SECONDS': 1.0,
+    'JOB_RETENTION_DAYS': jobs.DEFAULT_RETENTION_DAYS,
+    'JOB_RUNNER': True,
+}
+
+
+class Services:
+    """
+    Resources of one database: connection pool, writer thread, id blocks and the generator's catalog.
+    An app has one for DATABASE and one per open tenant. Creating them opens nothing. The schema is
+    created and migrated on the first connection checkout and the writer thread starts with the first
+    write, so an app can be built before worker processes fork.
+    """
 
-@app.route('/api/schedule-workout/<int:day_id>/<int:workout_id>', methods=['POST'])
-def schedule_workout(day_id, workout_id):
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Database connection failed"}), 500
+    def __init__(self, app, database=None, tenant=None):
+        """
+        :param database: Path of the SQLite file; defaults to the DATABASE setting
+        :param tenant: Name of the tenant the database belongs to, if any
+        """
+        self.logger = app.logger
+        self.database = database or app.config['DATABASE']
+        self.tenant = tenant
+        self.schema_file = app.config['SCHEMA_FILE']
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+        # Connections are opened lazily on first checkout.
+        # Instrumented connections time every statement for Server-Timing and /metrics.
+        self.pool = ConnectionPool(self.database, max_size=app.config['POOL_SIZE'],
+                                   factory=InstrumentedConnection)
+        # Row changes committed by the writer are published to /api/events subscribers
+        self.events = events.EventHub(max_buffer=int(app.config['EVENT_BUFFER']),
+                                      slots=app.extensions['workoutdb_event_slots'])
+        self.changes = events.ChangeCapture(lambda: self.events.active)
+        # All route writes go through one writer thread that group-commits them; routes read from the pool
+        self.writer = WriteQueue(self.open_write_connection, before_commit=self.changes.collect,
+                                 after_commit=self.events.publish, logger=app.logger)
+        # Workout and Day ids come from blocks reserved through the writer, never from the table's rowid
+        self.ids = IdAllocator(lambda name, size: self.writer.run(reserve_block, name, size))
+        # Recurring schedule rules and their expansions per date range
+        self.schedule_rules = recurrence.RuleCache()
+        # Queued background jobs, run in the pools the app's databases share
+        self.jobs = jobs.JobRunner(self.open_job_connection, self.database, JOB_TYPES,
+                                   app.extensions['workoutdb_job_pools'],
+                                   poll_interval=float(app.config['JOB_POLL_SECONDS']),
+                                   retention_days=float(app.config['JOB_RETENTION_DAYS']),
+                                   on_success=self.job_succeeded, write=self.writer.run, logger=app.logger)
+        self._catalog_features = None
+        self.sync_retention_days = float(app.config['SYNC_RETENTION_DAYS'])
+        self.sync_compact_interval = float(app.config['SYNC_COMPACT_INTERVAL'])
+        self._change_log_compacted = time.monotonic()
+
+    def ensure_schema(self):
+        """
+        Create the database from the schema file if needed and apply pending migrations.
+        Runs once per app, on the first connection checkout rather than when the app is built.
+        """
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            # Migrations, ANALYZE and optimize belong to no request's timings
+            with instrumentation.unrecorded(), self.pool.connection() as conn:
+                applied = migrate(conn, self.schema_file)
+            if applied:
+                self.logger.info(f"Applied schema migrations {applied}")
+            self._schema_ready = True
+
+    def open_write_connection(self):
+        self.ensure_schema()
+        conn = self.pool.connect()
+        self.changes.install(conn)
+        return conn
+
+    def open_job_connection(self):
+        self.ensure_schema()
+        return self.pool.connect()
+
+    def job_succeeded(self, job_type):
+        # Process jobs write through their own connections; drop what they made stale in this process right away
+        if job_type.invalidates:
+            cache.invalidate(*job_type.invalidates, scope=self.tenant)
+        # Nor do their writes pass through change capture; tell event subscribers to refetch instead
+        self.events.publish([{'table': table, 'op': 'reset'} for table in job_type.changes])
+
+    def close(self):
+        """
+        Stop the writer thread once queued writes are applied and close idle connections.
+        Running jobs finish and are recorded in the background.
+        """
+        self.jobs.close()
+        self.writer.close()
+        self.pool.close_all()
+
+    def compact_change_log_if_due(self):
+        """
+        Queue a compaction of the sync change log when the last one is older than SYNC_COMPACT_INTERVAL.
+        Does not wait for it.
+        """
+        now = time.monotonic()
+        if now - self._change_log_compacted < self.sync_compact_interval:
+            return
+        self._change_log_compacted = now
+        self.writer.submit(sync.compact, self.sync_retention_days)
+
+    def catalog_features(self):
+        """
+        Exercise catalog as NumPy arrays for the workout generator; reloaded when the catalog changes.
+        """
+        if self._catalog_features is None:
+            # Imported on first use: NumPy takes longer to import than the rest of the app's own modules
+            from workout_generator import FeatureCache
+            self._catalog_features = FeatureCache()
+        return self._catalog_features
+
+
+def services():
+    """
+    :return: Services of the current request's tenant, or of the app's DATABASE
+    """
+    if 'tenant_services' in g:
+        return g.tenant_services
+    return current_app.extensions['workoutdb']
 
-    cur = conn.cursor()
+# Module-level names used by the routes; each resolves to the current app's object
+pool = LocalProxy(lambda: services().pool)
+writer = LocalProxy(lambda: services().writer)
+ids = LocalProxy(lambda: services().ids)
+catalog_features = LocalProxy(lambda: services().catalog_features())
+schedule_rules = LocalProxy(lambda: services().schedule_rules)
+event_hub = LocalProxy(lambda: services().events)
+
+def ensure_schema():
+    services().ensure_schema()
+
+# Per-endpoint latency, SQL time and row counts, exported at /metrics
+metrics = RequestMetrics()
+
+def negotiated_format():
+    """
+    Response format the client asked for: 'columnar', 'json', or None if ?format= is invalid.
+    """
     try:
-        # Insert the workout and day IDs into the 'Workout_On_Day' table
-        cur.execute(
-            "INSERT INTO workout_on_day (workout_id, day_id) VALUES (%s, %s)",
-            (workout_id, day_id)
-        )
-        conn.commit()
-        return jsonify({"message": "Workout scheduled successfully"}), 200
-    except psycopg2.Error as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 400
-    finally:
-        cur.close()
-        conn.close()
-
-def create_database(db_name, schema_file):
-    """
-    Create a new SQLite database based on the SQL schema file if the database does not already exist.
-    :param db_name: Name of the SQLite database file
-    :param schema_file: SQL schema file to create tables
-    """
-    # Check if the database already exists
-    if not os.path.exists(db_name):
-        # Connect to the SQLite database (or create it if it does not exist)
-        conn = sqlite3.connect(db_name)
-        print(f"Created database {db_name} successfully.")
-        
-        # Execute SQL script to create new tables
-        with open(schema_file, 'r') as f:
-            sql_script = f.read()
-        conn.executescript(sql_script)
-        print(f"Schema from {schema_file} executed successfully.")
-        
-        # Close the database connection
-        conn.close()
-    else:
-        print("Database already exists.")
+        return 'columnar' if columnar.requested(request) else 'json'
+    except columnar.ColumnarError:
+        return None
 
-# Replace 'workoutdatabase.db' with your database file name and 'create-tables.sql' with your SQL file path
-create_database('workoutdatabase.db', 'create-tables.sql')
-DATABASE = 'workoutdatabase.db'
+def database_scope():
+    """
+    Tenant and database file of the current request, so cached responses of tenants are kept apart.
+    """
+    tenant = g.get('tenant')
+    return tenant, (services().database if tenant else None)
+
+# Rendered catalog responses, tagged by the tables they read; create_app() binds it to the database
+cache = ResponseCache(vary=negotiated_format, scope=database_scope)
+
+# Per-row partials of the server-rendered list pages, dropped whenever the response cache invalidates their tables
+fragments = FragmentCache()
+cache.add_listener(fragments.invalidate)
+
+def create_app(config=None):
+    """
+    Build the application. Nothing is opened and no thread is started until the first request or
+    command uses the database, so this is cheap, and each worker process of a preforking server
+    builds its own app with its own pool and writer thread.
+    The response and fragment caches are per process; building another app rebinds them to its database.
+    :param config: Optional dict overriding DEFAULT_CONFIG and the WORKOUT_* environment variables
+    :return: Flask app
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    # Read without the prefix before it existed; still honoured
+    for key in ('SLOW_QUERY_MS', 'SLOW_QUERY_LOG'):
+        if os.environ.get(key):
+            app.config[key] = os.environ[key]
+    app.config.from_prefixed_env('WORKOUT')
+    app.config.update(config or {})
+    app.json = JSONProvider(app)
+
+    app.extensions['workoutdb_job_pools'] = jobs.JobPools(processes=int(app.config['JOB_PROCESSES']),
+                                                          threads=int(app.config['JOB_THREADS']))
+    atexit.register(app.extensions['workoutdb_job_pools'].close)
+    # /api/events streams each hold a server thread, so they are capped per process across all tenants
+    app.extensions['workoutdb_event_slots'] = threading.BoundedSemaphore(int(app.config['EVENT_MAX_SUBSCRIBERS']))
+    app.extensions['workoutdb'] = Services(app)
+    atexit.register(app.extensions['workoutdb'].writer.close)
+    if app.config['TENANT_DIR']:
+        tenant_dir = app.config['TENANT_DIR']
+
+        def open_tenant(tenant):
+            return Services(app, tenancy.database_path(tenant_dir, tenant), tenant)
+
+        tenants = tenancy.TenantRegistry(open_tenant, max_open=int(app.config['TENANT_MAX_OPEN']))
+        app.extensions['workoutdb_tenants'] = tenants
+        atexit.register(tenants.close_all)
+        app.before_request(bind_tenant)
+        # Registered before close_db so it runs after it: teardown functions run in reverse order
+        app.teardown_appcontext(release_tenant)
+    if app.config['JOB_RUNNER']:
+        # After bind_tenant, so a tenant's runner starts with its first request
+        app.before_request(start_job_runner)
+
+    instrumentation.init_app(app, metrics)
+    instrumentation.SLOW_QUERY_SECONDS = float(app.config['SLOW_QUERY_MS']) / 1000.0
+    if app.config['SLOW_QUERY_LOG']:
+        path = os.path.abspath(app.config['SLOW_QUERY_LOG'])
+        if not any(getattr(h, 'baseFilename', None) == path for h in instrumentation.slow_query_logger.handlers):
+            handler = logging.FileHandler(path)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            instrumentation.slow_query_logger.addHandler(handler)
+
+    cache.bind(app.config['DATABASE'])
+    cache.enabled = app.config['RESPONSE_CACHE']
+    app.jinja_env.globals['fragment'] = fragments.render
+
+    app.register_error_handler(columnar.ColumnarError, columnar_error)
+    app.teardown_appcontext(close_db)
+    app.register_blueprint(bp)
+
+    # Hashed, precompressed static files from `flask --app app assets-build`, if it has been run
+    assets.init_app(app)
+    return app
+
+def columnar_error(e):
+    return jsonify({'error': str(e)}), 400
+
+def bind_tenant():
+    """
+    Route the request to its tenant's database, opening (and with TENANT_AUTO_CREATE, creating) it on first use.
+    """
+    config = current_app.config
+    try:
+        tenant = tenancy.tenant_from_request(request, config['TENANT_HEADER'], config['TENANT_DOMAIN'])
+    except tenancy.TenantError as e:
+        return jsonify({'error': str(e)}), 400
+    if tenant is None:
+        return None
+    path = tenancy.database_path(config['TENANT_DIR'], tenant)
+    if not os.path.exists(path):
+        if (not config['TENANT_AUTO_CREATE']
+                or len(tenancy.list_tenants(config['TENANT_DIR'])) >= int(config['TENANT_AUTO_CREATE_MAX'])):
+            return jsonify({'error': f"Unknown tenant '{tenant}'"}), 404
+        if tenancy.create_database(path, config['SCHEMA_FILE']):
+            current_app.logger.info(f"Created database for tenant '{tenant}'")
+    g.tenant_services = current_app.extensions['workoutdb_tenants'].acquire(tenant)
+    g.tenant = tenant
+    return None
+
+def start_job_runner():
+    services().jobs.start()
+
+def release_tenant(exception=None):
+    tenant = g.pop('tenant', None)
+    if tenant is not None:
+        g.pop('tenant_services', None)
+        current_app.extensions['workoutdb_tenants'].release(tenant)
+
+def list_response(rows, nested=()):
+    """
+    JSON array of rows, or its columnar encoding when asked for with ?format=columnar or
+    Accept: application/vnd.workoutdb.columnar+json (see columnar.py).
+    :param rows: Dicts, sqlite3.Row or repository records
+    :param nested: Keys of dict rows holding child lists
+    """
+    if columnar.requested(request):
+        response = current_app.json.response(columnar.encode(rows, nested))
+        response.mimetype = columnar.MEDIA_TYPE
+    else:
+        response = jsonify(rows)
+    response.vary.add('Accept')
+    return response
 
 def get_db():
+    """
+    Check a connection out of the pool for the current request.
+    The connection is returned to the pool by close_db() on teardown, so routes must not close it.
+    """
     if 'sqlite_db' not in g:
-        g.sqlite_db = sqlite3.connect(DATABASE)
-        g.sqlite_db.row_factory = sqlite3.Row
+        ensure_schema()
+        g.sqlite_db = pool.acquire()
     return g.sqlite_db
 
-def get_db_connection():
-    conn = sqlite3.connect('workoutdatabase.db')
-    conn.row_factory = sqlite3.Row  # This enables column access by name: row['column_name']
-    return conn
+def day_exists(day_id):
+    """
+    Check that a Day row exists before scheduling a workout on it.
+    :param day_id: Day to look up
+    :return: True if the day exists
+    """
+    return get_db().execute("SELECT 1 FROM Day WHERE day_id = ?", (day_id,)).fetchone() is not None
+
+@bp.route('/api/schedule-workout/<int:day_id>/<int:workout_id>', methods=['POST'])
+@cache.invalidates('Day', 'Workout_On_Day')
+def schedule_workout(day_id, workout_id):
+    def write(conn):
+        # Insert the workout and day IDs into the 'Workout_On_Day' table
+        conn.execute(
+            "INSERT INTO workout_on_day (workout_id, day_id) VALUES (?, ?)",
+            (workout_id, day_id)
+        )
+    if not day_exists(day_id):
+        return jsonify({"error": "Day not found"}), 404
+    try:
+        writer.run(write)
+        return jsonify({"message": "Workout scheduled successfully"}), 200
+    except sqlite3.Error as e:
+        return jsonify({"error": str(e)}), 400
 
-@app.route('/update-exercise/<int:exercise_id>', methods=['POST'])
+@bp.route('/update-exercise/<int:exercise_id>', methods=['POST'])
+@cache.invalidates('Exercise_Detail')
 def update_exercise(exercise_id):
     data = request.form
-    db = get_db()
     try:
-        db.execute("""
+        writer.execute("""
             UPDATE Exercise_Detail SET
             description = ?,
             equipment_needed = ?,
@@ -84,79 +409,57 @@ def update_exercise(exercise_id):
             reps = ?
             WHERE exercise_detail_id = ?
         """, (data['description'], data['equipment_needed'], data['weight'], data['intensity'], data['rating'], data['sets'], data['reps'], exercise_id))
-        db.commit()
         return '', 204  # No Content response
     except Exception as e:
-        db.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/workouts/<int:workout_id>', methods=['PUT'])
+@bp.route('/api/workouts/<int:workout_id>', methods=['PUT'])
+@cache.invalidates('Workout')
 def update_workout(workout_id):
     data = request.get_json()
-    db = get_db_connection()
-    cursor = db.cursor()
     try:
-        cursor.execute('''
+        writer.execute('''
             UPDATE Workout
             SET name = ?, description = ?, rating = ?, focus = ?, intensity = ?
             WHERE workout_id = ?
         ''', (data['name'], data.get('description', ''), data.get('rating', 5), data['focus'], data['intensity'], workout_id))
-        db.commit()
         return jsonify({'success': True}), 200
     except sqlite3.IntegrityError as e:
-        db.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        db.close()
 
 
-@app.route('/api/workout-to-day/<int:day_id>/<int:workout_id>', methods=['POST', 'DELETE'])
+@bp.route('/api/workout-to-day/<int:day_id>/<int:workout_id>', methods=['POST', 'DELETE'])
+@cache.invalidates('Day', 'Workout_On_Day')
 def manage_workout_day(day_id, workout_id):
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Database connection failed"}), 500
-
-    cur = conn.cursor()
     try:
         if request.method == 'POST':
+            if not day_exists(day_id):
+                return jsonify({"success": False, "message": "Day not found"}), 404
             # Using ? placeholders for SQLite
-            cur.execute(
-                "INSERT INTO workout_on_day (workout_id, day_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+            writer.execute(
+                "INSERT INTO workout_on_day (workout_id, day_id) VALUES (?, ?)",
                 (workout_id, day_id)
             )
-            conn.commit()
             return jsonify({"success": True, "message": "Workout added to day successfully"}), 200
         elif request.method == 'DELETE':
             # Using ? placeholders for SQLite
-            cur.execute(
+            writer.execute(
                 "DELETE FROM workout_on_day WHERE workout_id = ? AND day_id = ?",
                 (workout_id, day_id)
             )
-            conn.commit()
             return jsonify({"success": True, "message": "Workout removed from day successfully"}), 200
     except sqlite3.Error as e:
-        conn.rollback()
         return jsonify({"success": False, "message": str(e)}), 400
-    finally:
-        cur.close()
-        conn.close()
 
 
-@app.teardown_appcontext
 def close_db(exception=None):
     db = g.pop('sqlite_db', None)
     if db is not None:
-        db.close()
+        pool.release(db)
 
-@app.route('/api/workouts-by-day/<int:day_id>', methods=['GET'])
+@bp.route('/api/workouts-by-day/<int:day_id>', methods=['GET'])
 def get_workouts_by_day(day_id):
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Database connection failed"}), 500
-
-    # Ensure the connection uses the sqlite3.Row row factory
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cur = conn.cursor()
     try:
         cur.execute("""
@@ -178,14 +481,10 @@ def get_workouts_by_day(day_id):
         return jsonify({'error': str(e)}), 400
     finally:
         cur.close()
-        if conn:
-            conn.close()  # Ensure the connection is closed after processing
 
-@app.route('/submit-workout/', methods=['POST'])
+@bp.route('/submit-workout/', methods=['POST'])
+@cache.invalidates('Workout')
 def submit_workout():
-    db = get_db()
-    cur = db.cursor()
-
     workout_id = request.form.get('workout_id')
     name = request.form.get('name')
     description = request.form.get('description', '')
@@ -196,7 +495,7 @@ def submit_workout():
     try:
         if workout_id:
             # Update existing workout
-            cur.execute("""
+            writer.execute("""
                 UPDATE Workout SET
                 name = ?,
                 description = ?,
@@ -205,60 +504,130 @@ def submit_workout():
                 rating = ?
                 WHERE workout_id = ?
             """, (name, description, intensity, focus, rating, workout_id))
-            db.commit()
             flash('Workout updated successfully.')
         else:
             # Insert new workout
-            cur.execute("""
-                INSERT INTO Workout (name, description, intensity, focus, rating)
-                VALUES (?, ?, ?, ?, ?)
-            """, (name, description, intensity, focus, rating))
-            db.commit()
-            workout_id = cur.lastrowid  # Retrieve the new workout ID
+            workout_id = generate_workout_id()
+            writer.execute("""
+                INSERT INTO Workout (workout_id, name, description, intensity, focus, rating)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (workout_id, name, description, intensity, focus, rating))
             flash('New workout added successfully.')
     except sqlite3.Error as e:
-        db.rollback()
         flash('Failed to save workout. Error: {}'.format(e))
-        return redirect(url_for('add_or_edit_workout', workout_id=workout_id if workout_id else None))
+        return redirect(url_for('main.add_or_edit_workout', workout_id=workout_id if workout_id else None))
 
     # Redirect to the workout list page
-    return redirect(url_for('workout_list'))
+    return redirect(url_for('main.workout_list'))
+
 
 
 
+WORKOUT_ROWS_QUERY = '''
+    SELECT w.workout_id, w.name, w.description, w.intensity, w.focus,
+           e.exercise_id, e.name AS exercise_name, e.description AS exercise_description, e.muscle_group,
+           ed.exercise_detail_id, ed.description AS detail_description, ed.equipment_needed, ed.weight,
+           ed.intensity AS detail_intensity, ed.rating, ed.sets, ed.reps
+    FROM {workouts} w
+    LEFT JOIN Exercise_In_Workout eiw ON w.workout_id = eiw.workout_id
+    LEFT JOIN Exercise e ON eiw.exercise_id = e.exercise_id
+    LEFT JOIN Exercise_Detail ed ON e.exercise_detail_id = ed.exercise_detail_id
+    ORDER BY w.workout_id, e.exercise_id
+'''
 
-@app.route('/api/workouts', methods=['GET'])
+@bp.route('/api/workouts', methods=['GET'])
+@cache.cached('Workout', 'Exercise_In_Workout', 'Exercise', 'Exercise_Detail')
 def get_workouts():
+    """
+    Workouts with their exercises and details.
+    Optional query parameters:
+      limit  - number of workouts per page; the next page cursor is sent in X-Next-Cursor
+      after  - workout_id cursor from the previous page
+      stream - if true, the JSON array is streamed one workout at a time
+      format - 'columnar' for the nested columnar encoding (also selected by Accept)
+    """
     conn = get_db()
-    query = '''
-        SELECT w.workout_id, w.name, w.description, w.intensity, w.focus,
-               e.exercise_id, e.name AS exercise_name, e.description AS exercise_description, e.muscle_group,
-               ed.exercise_detail_id, ed.description AS detail_description, ed.equipment_needed, ed.weight, 
-               ed.intensity AS detail_intensity, ed.rating, ed.sets, ed.reps
-        FROM Workout w
-        LEFT JOIN Exercise_In_Workout eiw ON w.workout_id = eiw.workout_id
-        LEFT JOIN Exercise e ON eiw.exercise_id = e.exercise_id
-        LEFT JOIN Exercise_Detail ed ON e.exercise_detail_id = ed.exercise_detail_id
-        ORDER BY w.workout_id, e.exercise_id
-    '''
     try:
+        limit = request.args.get('limit', type=int)
+        after = request.args.get('after', type=int)
+        if limit is not None and limit < 1:
+            return jsonify({'error': "'limit' must be a positive integer"}), 400
+
+        workouts_source, params, next_cursor = workout_page_source(conn, limit, after)
         cur = conn.cursor()
-        cur.execute(query)
-        workouts = cur.fetchall()
-        return jsonify(format_workouts(workouts))
+        cur.execute(WORKOUT_ROWS_QUERY.format(workouts=workouts_source), params)
+
+        # The columnar form needs every row before it can emit a column, so it is never streamed
+        if request.args.get('stream', '').lower() in ('1', 'true', 'yes') and not columnar.requested(request):
+            response = Response(stream_with_context(stream_json_array(iter_workouts(cur))),
+                                mimetype='application/json')
+        else:
+            response = list_response(format_workouts(cur), nested=('exercises',))
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+        return response
     except sqlite3.Error as e:
-        app.logger.error(f"Database error: {e}")
+        current_app.logger.error(f"Database error: {e}")
         return jsonify({'error': 'Failed to fetch workouts due to a database error'}), 500
+    except columnar.ColumnarError:
+        raise
     except Exception as e:
-        app.logger.error(f"Unexpected error: {e}")
+        current_app.logger.error(f"Unexpected error: {e}")
         return jsonify({'error': 'Failed to fetch workouts due to an internal error'}), 500
 
-def format_workouts(workouts):
-    data = {}
-    for row in workouts:
+def workout_page_source(conn, limit=None, after=None):
+    """
+    Page over Workout first so the join in WORKOUT_ROWS_QUERY only touches the workouts being returned.
+    :param conn: Open SQLite connection
+    :param limit: Workouts per page, or None for every workout after the cursor
+    :param after: workout_id cursor from the previous page, or None for the first page
+    :return: (workouts source for WORKOUT_ROWS_QUERY, its parameters, next page cursor or None)
+    """
+    if limit is None and after is None:
+        return 'Workout', [], None
+    source = '(SELECT * FROM Workout WHERE workout_id > ? ORDER BY workout_id'
+    params = [after if after is not None else -1]
+    next_cursor = None
+    if limit is not None:
+        source += ' LIMIT ?'
+        params.append(limit)
+        # The last id of this page is the next cursor, if any workout follows it
+        ids = conn.execute(
+            "SELECT workout_id FROM Workout WHERE workout_id > ? ORDER BY workout_id LIMIT 2 OFFSET ?",
+            (params[0], limit - 1)
+        ).fetchall()
+        if len(ids) == 2:
+            next_cursor = ids[0]['workout_id']
+    return source + ')', params, next_cursor
+
+def stream_json_array(items):
+    """
+    Serialize an iterable as a JSON array, one element per chunk.
+    :param items: Iterable of JSON-serializable objects
+    """
+    yield '['
+    first = True
+    for item in items:
+        if not first:
+            yield ','
+        first = False
+        yield json.dumps(item)
+    yield ']'
+
+def iter_workouts(rows):
+    """
+    Group joined workout/exercise rows into nested workout objects.
+    Rows must be ordered by workout_id; each workout is yielded as soon as its last row has been seen,
+    so only one workout is held in memory at a time.
+    :param rows: Iterable of rows from WORKOUT_ROWS_QUERY (a cursor works)
+    """
+    current = None
+    for row in rows:
         workout_id = row['workout_id']
-        if workout_id not in data:
-            data[workout_id] = {
+        if current is None or current['workout_id'] != workout_id:
+            if current is not None:
+                yield current
+            current = {
                 'workout_id': workout_id,
                 'name': row['name'],
                 'description': row['description'],
@@ -266,7 +635,7 @@ def format_workouts(workouts):
                 'focus': row['focus'],
                 'exercises': []
             }
-        
+
         if row['exercise_id']:
             exercise = {
                 'exercise_id': row['exercise_id'],
@@ -284,17 +653,16 @@ def format_workouts(workouts):
                     'reps': row['reps']
                 }
             }
-            data[workout_id]['exercises'].append(exercise)
+            current['exercises'].append(exercise)
 
-    return list(data.values())
+    if current is not None:
+        yield current
 
-@app.route('/api/exercises')
-def get_all_exercises():
-    db = get_db()
-    exercises = db.execute('SELECT * FROM Exercise').fetchall()
-    return jsonify([dict(row) for row in exercises])
+def format_workouts(workouts):
+    return list(iter_workouts(workouts))
 
-@app.route('/api/all-exercises')
+@bp.route('/api/all-exercises')
+@cache.cached('Exercise', 'Exercise_Detail')
 def all_exercises():
     db = get_db()
     cur = db.cursor()
@@ -306,79 +674,96 @@ def all_exercises():
             ORDER BY e.exercise_id
         """)
         exercises = cur.fetchall()
-        return jsonify(exercises), 200
+        return list_response([dict(x) for x in exercises]), 200
+    except columnar.ColumnarError:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/exercises-in-workouts/<int:workout_id>', methods=['GET'])
+@bp.route('/api/exercises-in-workouts/<int:workout_id>', methods=['GET'])
 def get_exercises_by_workout(workout_id):
-    db = get_db_connection()
     try:
-        # Joining Exercise and Exercise_In_Workout tables to fetch relevant exercises
-        exercises = db.execute('''
-            SELECT e.*
-            FROM Exercise e
-            JOIN Exercise_In_Workout eiw ON eiw.exercise_id = e.exercise_id
-            WHERE eiw.workout_id = ?
-        ''', (workout_id,)).fetchall()
-        exercises = [dict(ex) for ex in exercises]
-        return jsonify(exercises), 200
+        return jsonify(repository.fetch_all(get_db(), 'exercises_in_workout', workout_id)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 
 
 
-@app.route('/')
+def page_links(next_cursor):
+    """
+    Links of a keyset-paginated page, keeping the current query parameters.
+    :param next_cursor: Cursor of the next page, or None on the last page
+    :return: (first page URL, or None on the first page; next page URL, or None on the last page)
+    """
+    args = request.args.to_dict(flat=False)
+    first_url = None
+    if 'after' in args:
+        first_url = url_for(request.endpoint, **{key: value for key, value in args.items() if key != 'after'})
+    next_url = None
+    if next_cursor is not None:
+        next_url = url_for(request.endpoint, **dict(args, after=[str(next_cursor)]))
+    return first_url, next_url
+
+@bp.route('/')
 def exercise_list():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM Exercise")
-    exercises = cur.fetchall()
-    return render_template('exercise-list.html', exercises=exercises)
+    """
+    One page of the exercise catalog. Takes the /api/exercises query parameters
+    (filter, sort, direction, limit, after, ...); each card comes from the fragment cache.
+    """
+    try:
+        query = ExerciseQuery.from_args(request.args)
+    except QueryError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('main.exercise_list'))
+    cache.sync()
+    exercises, next_cursor = query.fetch_page(get_db())
+    first_url, next_url = page_links(next_cursor)
+    return render_template('exercise-list.html', exercises=exercises, first_url=first_url, next_url=next_url)
 
-@app.route('/api/exercises', methods=['GET'])
-def get_exercises():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM Exercise")
-    exercises = cur.fetchall()
-    exercises_list = [{'exercise_id': ex['exercise_id'], 'name': ex['name'], 'description': ex['description'], 'equipment_needed': ex['equipment_needed'], 'weight': ex['weight'], 'intensity': ex['intensity'], 'rating': ex['rating'], 'sets': ex['sets'], 'reps': ex['reps']} for ex in exercises]
-    return jsonify(exercises_list)
 
 
 
+# Workouts per page of the workout list, unless ?limit= asks for another size
+WORKOUT_PAGE_SIZE = 50
+MAX_WORKOUT_PAGE_SIZE = 500
 
-@app.route('/workout-list')
+@bp.route('/workout-list')
 def workout_list():
-    db = get_db()
-    workouts = db.execute("SELECT * FROM Workout").fetchall()
-    return render_template('workout-list.html', workouts=workouts)
+    """
+    One page of workouts with their exercises; each workout comes from the fragment cache.
+    Query parameters: limit (default WORKOUT_PAGE_SIZE), after (workout_id cursor from the previous page).
+    """
+    limit = request.args.get('limit', WORKOUT_PAGE_SIZE, type=int)
+    after = request.args.get('after', type=int)
+    if not 1 <= limit <= MAX_WORKOUT_PAGE_SIZE:
+        flash(f"'limit' must be between 1 and {MAX_WORKOUT_PAGE_SIZE}", 'error')
+        return redirect(url_for('main.workout_list'))
+    cache.sync()
+    conn = get_db()
+    workouts_source, params, next_cursor = workout_page_source(conn, limit, after)
+    workouts = format_workouts(conn.execute(WORKOUT_ROWS_QUERY.format(workouts=workouts_source), params))
+    first_url, next_url = page_links(next_cursor)
+    return render_template('workout-list.html', workouts=workouts, first_url=first_url, next_url=next_url)
 
 
 
-@app.route('/workout', defaults={'workout_id': None})
-@app.route('/workout/<int:workout_id>', methods=['GET', 'POST'])
+@bp.route('/workout', defaults={'workout_id': None})
+@bp.route('/workout/<int:workout_id>', methods=['GET', 'POST'])
+@cache.invalidates('Workout')
 def workout(workout_id):
     db = get_db()
     if request.method == 'GET':
         if workout_id is not None:
             # Fetch the existing workout details
-            workout = db.execute("SELECT * FROM Workout WHERE workout_id = ?", (workout_id,)).fetchone()
+            workout = repository.fetch_one(db, 'workout', workout_id)
             if workout:
-                workout_exercises = db.execute("""
-                    SELECT e.*
-                    FROM Exercise e
-                    JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id
-                    WHERE eiw.workout_id = ?
-                """, (workout_id,)).fetchall()
+                workout_exercises = repository.fetch_all(db, 'exercises_in_workout', workout_id)
                 return render_template('add-workout.html', workout=workout, workout_id=workout_id, exercises=workout_exercises)
             else:
                 # If no workout is found with the given ID, redirect to the creation page
-                return redirect(url_for('workout'))
+                return redirect(url_for('main.workout'))
         # Render the form for creating a new workout if no workout_id is provided
         return render_template('add-workout.html', workout=None, workout_id=None)
     elif request.method == 'POST':
@@ -389,160 +774,430 @@ def workout(workout_id):
         focus = request.form.get('focus', '')
         if workout_id is None:
             # Create a new workout
-            db.execute("INSERT INTO Workout (name, description, intensity, focus) VALUES (?, ?, ?, ?)",
-                       (name, description, intensity, focus))
-            db.commit()
-            return redirect(url_for('workout_list'))  # Assuming you have a route to display all workouts
+            writer.execute("INSERT INTO Workout (workout_id, name, description, intensity, focus) VALUES (?, ?, ?, ?, ?)",
+                           (generate_workout_id(), name, description, intensity, focus))
+            return redirect(url_for('main.workout_list'))  # Assuming you have a route to display all workouts
         else:
             # Update existing workout
-            db.execute("UPDATE Workout SET name=?, description=?, intensity=?, focus=? WHERE workout_id=?",
-                       (name, description, intensity, focus, workout_id))
-            db.commit()
-            return redirect(url_for('workout', workout_id=workout_id))
+            writer.execute("UPDATE Workout SET name=?, description=?, intensity=?, focus=? WHERE workout_id=?",
+                           (name, description, intensity, focus, workout_id))
+            return redirect(url_for('main.workout', workout_id=workout_id))
 
 def generate_workout_id():
     """
-    Generate a unique workout ID as an integer.
+    Allocate a unique workout ID from the in-memory block.
     """
-    # Generate a random integer between 1000 and 9999
-    workout_id = random.randint(1000, 9999)
-    return workout_id
+    return ids.next_id('Workout')
 
-@app.route('/schedule')
-def schedule():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("""
-        SELECT d.*, w.name AS workout_name, w.description AS workout_description
+# Longest range /api/schedule serves in one request (a leap year)
+MAX_SCHEDULE_RANGE_DAYS = 366
+
+def parse_date_range(args, default_start, default_end, max_days=MAX_SCHEDULE_RANGE_DAYS):
+    """
+    Read ?from=YYYY-MM-DD&to=YYYY-MM-DD from the request arguments.
+    :param max_days: Longest range accepted
+    :return: (start, end) as datetime.date
+    :raises ValueError: if a date is malformed, reversed, or the range is too long
+    """
+    start = datetime.date.fromisoformat(args['from']) if args.get('from') else default_start
+    end = datetime.date.fromisoformat(args['to']) if args.get('to') else default_end
+    if end < start:
+        raise ValueError("'to' must not be before 'from'")
+    if (end - start).days >= max_days:
+        raise ValueError(f"Date range is limited to {max_days} days")
+    return start, end
+
+def current_month_range():
+    today = datetime.date.today()
+    start = today.replace(day=1)
+    next_month = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, next_month - datetime.timedelta(days=1)
+
+def fetch_schedule(db, start, end):
+    """
+    Every day in the range with the workouts scheduled on it: the concrete Workout_On_Day rows, in one
+    indexed query on Day.date, merged with the occurrences of the recurring rules (see recurrence.py).
+    A concrete row for a workout replaces that workout's occurrence on the same date.
+    :param db: Open SQLite connection
+    :param start: First date (inclusive)
+    :param end: Last date (inclusive)
+    :return: List of day dictionaries ordered by date, each with a 'workouts' list whose entries carry the
+             'rule_id' they repeat from (None for concrete rows). Dates with only recurring workouts have
+             no Day row, so their day_id and note are None.
+    """
+    cur = db.execute("""
+        SELECT d.day_id, d.date, d.note,
+               w.workout_id, w.name, w.description, w.focus, w.intensity
         FROM Day d
-        JOIN Workout_On_Day wod ON d.day_id = wod.day_id
-        JOIN Workout w ON wod.workout_id = w.workout_id
-    """)
-    days_with_workouts = cur.fetchall()
-    return render_template('schedule.html', days=days_with_workouts)
+        LEFT JOIN Workout_On_Day wod ON d.day_id = wod.day_id
+        LEFT JOIN Workout w ON wod.workout_id = w.workout_id
+        WHERE d.date BETWEEN ? AND ?
+        ORDER BY d.date, d.day_id, w.workout_id
+    """, (start.isoformat(), end.isoformat()))
+    days = []
+    for row in cur:
+        if not days or days[-1]['day_id'] != row['day_id']:
+            days.append({'day_id': row['day_id'], 'date': row['date'], 'note': row['note'], 'workouts': []})
+        if row['workout_id'] is not None:
+            days[-1]['workouts'].append({
+                'workout_id': row['workout_id'],
+                'name': row['name'],
+                'description': row['description'],
+                'focus': row['focus'],
+                'intensity': row['intensity'],
+                'rule_id': None
+            })
+
+    occurrences = schedule_rules.expand(db, start, end)
+    if not occurrences:
+        return days
+    first_day = {}
+    scheduled = {}
+    for day in days:
+        first_day.setdefault(day['date'], day)
+        scheduled.setdefault(day['date'], set()).update(workout['workout_id'] for workout in day['workouts'])
+    for date, workouts in occurrences.items():
+        day = first_day.get(date)
+        if day is None:
+            day = {'day_id': None, 'date': date, 'note': None, 'workouts': []}
+            days.append(day)
+        taken = scheduled.get(date, ())
+        day['workouts'].extend(workout for workout in workouts if workout['workout_id'] not in taken)
+    # Stable, so Day rows sharing a date keep their day_id order
+    days.sort(key=lambda day: day['date'])
+    return days
+
+def month_calendar(month, days):
+    """
+    Weeks of a month, Sunday first, for the schedule page.
+    :param month: First day of the month
+    :param days: fetch_schedule() result for the month
+    :return: List of weeks, each a list of seven cells; a cell is None outside the month, otherwise
+             {'date', 'day', 'day_id', 'note', 'workouts'}
+    """
+    by_date = {}
+    for day in days:
+        # Several Day rows may share a date; the first one is used for scheduling and their workouts are merged
+        if day['date'] in by_date:
+            by_date[day['date']]['workouts'].extend(day['workouts'])
+        else:
+            by_date[day['date']] = {'day_id': day['day_id'], 'note': day['note'], 'workouts': list(day['workouts'])}
+    weeks = []
+    for week in calendar.Calendar(firstweekday=calendar.SUNDAY).monthdatescalendar(month.year, month.month):
+        cells = []
+        for date in week:
+            if date.month != month.month:
+                cells.append(None)
+                continue
+            day = by_date.get(date.isoformat(), {'day_id': None, 'note': None, 'workouts': []})
+            cells.append(dict(day, date=date.isoformat(), day=date.day))
+        weeks.append(cells)
+    return weeks
+
+@bp.route('/schedule')
+def schedule():
+    """
+    Calendar of one month, ?month=YYYY-MM (defaults to the current month); each day cell comes from
+    the fragment cache.
+    """
+    start, end = current_month_range()
+    if request.args.get('month'):
+        try:
+            start = datetime.datetime.strptime(request.args['month'], '%Y-%m').date()
+        except ValueError:
+            flash("'month' must look like YYYY-MM", 'error')
+            return redirect(url_for('main.schedule'))
+        end = (start + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+    cache.sync()
+    weeks = month_calendar(start, fetch_schedule(get_db(), start, end))
+    previous_month = (start - datetime.timedelta(days=1)).strftime('%Y-%m')
+    next_month = (end + datetime.timedelta(days=1)).strftime('%Y-%m')
+    return render_template('schedule.html', weeks=weeks, month=start, previous_month=previous_month,
+                           next_month=next_month)
+
+# Tables a schedule is read from, concrete and recurring
+SCHEDULE_TAGS = ('Day', 'Workout_On_Day', 'Workout', 'Schedule_Rule', 'Schedule_Rule_Exception')
+
+@bp.route('/api/schedule', methods=['GET'])
+@cache.cached(*SCHEDULE_TAGS)
+def api_schedule():
+    """
+    Scheduled workouts between ?from and ?to (inclusive, YYYY-MM-DD); defaults to the current month.
+    Occurrences of recurring rules are included with their 'rule_id'.
+    """
+    try:
+        start, end = parse_date_range(request.args, *current_month_range())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    days = fetch_schedule(get_db(), start, end)
+    return jsonify({'from': start.isoformat(), 'to': end.isoformat(), 'days': days})
+
+@bp.route('/api/days', methods=['POST'])
+@cache.invalidates('Day')
+def get_or_create_day():
+    """
+    Return the Day row for a date, creating it if needed, so the calendar can address days by date.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        date = datetime.date.fromisoformat(data.get('date', '')).isoformat()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'A date in YYYY-MM-DD format is required'}), 400
+
+    try:
+        # Allocated before queueing: the writer thread cannot wait on itself for a new block
+        day_id = writer.run(day_for_date, date, generate_day_id(), data.get('note'))
+        return jsonify({'success': True, 'day_id': day_id, 'date': date}), 200
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def day_for_date(conn, date, new_day_id, note=None):
+    """
+    Writer operation: the first Day row of a date, inserted with new_day_id if the date has none.
+    Looked up on the writer thread so two requests for the same date cannot both insert.
+    :param date: ISO date
+    :return: day_id
+    """
+    row = conn.execute("SELECT day_id FROM Day WHERE date = ? ORDER BY day_id LIMIT 1", (date,)).fetchone()
+    if row is not None:
+        return row['day_id']
+    conn.execute("INSERT INTO Day (day_id, date, note) VALUES (?, ?, ?)", (new_day_id, date, note))
+    return new_day_id
+
+@bp.route('/api/schedule-rules', methods=['GET'])
+@cache.cached('Schedule_Rule', 'Schedule_Rule_Exception')
+def list_schedule_rules():
+    """
+    Every recurring schedule rule, or only those of ?workout_id=.
+    """
+    workout_id = request.args.get('workout_id', type=int)
+    rules = schedule_rules.rules(get_db())
+    return jsonify([rule.to_dict() for rule in rules if workout_id is None or rule.workout_id == workout_id])
+
+@bp.route('/api/schedule-rules', methods=['POST'])
+@cache.invalidates('Schedule_Rule', 'Schedule_Rule_Exception')
+def create_schedule_rule():
+    """
+    Repeat a workout instead of scheduling it date by date. Body:
+      {"workout_id": 3, "freq": "WEEKLY", "interval": 1, "weekdays": ["MO", "TH"], "start": "2025-01-06",
+       "until": "2025-12-29", "exceptions": ["2025-04-21"]}
+    or the same rule as {"workout_id": 3, "start": "2025-01-06", "rrule": "FREQ=WEEKLY;BYDAY=MO,TH;UNTIL=20251229"}.
+    """
+    try:
+        rule = recurrence.Rule.from_json(request.get_json(silent=True))
+    except recurrence.RuleError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def write(conn):
+        if conn.execute("SELECT 1 FROM Workout WHERE workout_id = ?", (rule.workout_id,)).fetchone() is None:
+            return None
+        cur = conn.execute(
+            "INSERT INTO Schedule_Rule (workout_id, freq, interval, by_weekday, start_date, end_date) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (rule.workout_id, rule.freq, rule.interval, rule.by_weekday(), rule.start.isoformat(),
+             rule.until.isoformat() if rule.until else None)
+        )
+        conn.executemany("INSERT INTO Schedule_Rule_Exception (rule_id, date) VALUES (?, ?)",
+                         [(cur.lastrowid, date.isoformat()) for date in rule.exceptions])
+        return cur.lastrowid
+
+    try:
+        rule.rule_id = writer.run(write)
+    except sqlite3.Error as e:
+        return jsonify({'error': str(e)}), 500
+    if rule.rule_id is None:
+        return jsonify({'error': 'Workout not found'}), 404
+    return jsonify(rule.to_dict()), 201
+
+def find_schedule_rule(rule_id):
+    for rule in schedule_rules.rules(get_db()):
+        if rule.rule_id == rule_id:
+            return rule
+    return None
+
+@bp.route('/api/schedule-rules/<int:rule_id>', methods=['GET'])
+def get_schedule_rule(rule_id):
+    rule = find_schedule_rule(rule_id)
+    if rule is None:
+        return jsonify({'error': 'Schedule rule not found'}), 404
+    return jsonify(rule.to_dict())
+
+@bp.route('/api/schedule-rules/<int:rule_id>', methods=['DELETE'])
+@cache.invalidates('Schedule_Rule', 'Schedule_Rule_Exception')
+def delete_schedule_rule(rule_id):
+    """
+    Stop repeating; concrete rows already scheduled from the rule's overrides are kept.
+    """
+    result = writer.execute("DELETE FROM Schedule_Rule WHERE rule_id = ?", (rule_id,))
+    if result.rowcount == 0:
+        return jsonify({'error': 'Schedule rule not found'}), 404
+    return jsonify({'success': True}), 200
+
+@bp.route('/api/schedule-rules/<int:rule_id>/exceptions', methods=['POST'])
+@cache.invalidates('Schedule_Rule_Exception', 'Day', 'Workout_On_Day')
+def add_schedule_rule_exception(rule_id):
+    """
+    Override one occurrence: skip the rule on "date", and with "move_to" schedule the workout on that
+    date instead. Only the override is stored, as an exception plus one concrete Workout_On_Day row.
+    Body: {"date": "YYYY-MM-DD", "move_to": "YYYY-MM-DD"}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        date = datetime.date.fromisoformat(data.get('date', ''))
+        move_to = datetime.date.fromisoformat(data['move_to']) if data.get('move_to') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': "'date' and 'move_to' must be dates in YYYY-MM-DD format"}), 400
+    rule = find_schedule_rule(rule_id)
+    if rule is None:
+        return jsonify({'error': 'Schedule rule not found'}), 404
+    if next(rule.occurrences(date, date), None) is None and date not in rule.exceptions:
+        return jsonify({'error': f"The rule does not repeat on {date.isoformat()}"}), 400
+
+    def write(conn, new_day_id):
+        conn.execute("INSERT OR IGNORE INTO Schedule_Rule_Exception (rule_id, date) VALUES (?, ?)",
+                     (rule_id, date.isoformat()))
+        if move_to is None:
+            return None
+        day_id = day_for_date(conn, move_to.isoformat(), new_day_id)
+        conn.execute("INSERT INTO Workout_On_Day (workout_id, day_id) VALUES (?, ?)", (rule.workout_id, day_id))
+        return day_id
+
+    try:
+        day_id = writer.run(write, generate_day_id() if move_to is not None else None)
+    except sqlite3.Error as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'success': True, 'rule_id': rule_id, 'date': date.isoformat(), 'day_id': day_id}), 200
 
-@app.route('/api/day-workouts/<day_id>')
+@bp.route('/api/schedule-rules/<int:rule_id>/exceptions/<date>', methods=['DELETE'])
+@cache.invalidates('Schedule_Rule_Exception')
+def delete_schedule_rule_exception(rule_id, date):
+    """
+    Restore a skipped occurrence. A workout moved elsewhere stays scheduled there.
+    """
+    result = writer.execute("DELETE FROM Schedule_Rule_Exception WHERE rule_id = ? AND date = ?", (rule_id, date))
+    if result.rowcount == 0:
+        return jsonify({'error': 'Exception not found'}), 404
+    return jsonify({'success': True}), 200
+
+@bp.route('/api/day-workouts/<day_id>')
 def api_day_workouts(day_id):
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("""
-        SELECT w.*
-        FROM Workout w
-        JOIN Workout_On_Day wd ON w.workout_id = wd.workout_id
-        WHERE wd.day_id = ?
-    """, (day_id,))
-    workouts = cur.fetchall()
-    return jsonify([dict(x) for x in workouts])
-
-@app.route('/api/exercise-details')
+    return jsonify(repository.fetch_all(get_db(), 'workouts_on_day', day_id))
+
+@bp.route('/api/exercise-details')
+@cache.cached('Exercise_Detail')
 def api_exercise_details():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM Exercise_Detail")
-    exercise_details = cur.fetchall()
-    return jsonify([dict(x) for x in exercise_details])
+    return list_response(repository.fetch_all(get_db(), 'exercise_details'))
 
-@app.route('/api/exercises')
+@bp.route('/api/exercises')
+@cache.cached('Exercise', 'Exercise_Detail')
 def api_exercises():
-    filter_option = request.args.get('filter', None)
+    """
+    Filtered, sorted page of exercises.
+    Query parameters (list parameters may be repeated and are combined):
+      muscle_group, intensity, equipment, min_rating, max_rating,
+      sort (exercise_id | rating | name), direction (asc | desc), limit, after.
+    The legacy single ?filter= option is still accepted.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    format=columnar (or the columnar Accept type) returns the page column by column.
+    """
+    try:
+        query = ExerciseQuery.from_args(request.args)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Define the base SQL query to retrieve all exercises
-    sql_query = "SELECT * FROM Exercise"
+    exercises, next_cursor = query.fetch_page(get_db())
+    response = list_response(exercises)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+        next_args = request.args.to_dict(flat=False)
+        next_args['after'] = [next_cursor]
+        response.headers['Link'] = f'<{url_for("main.api_exercises", **next_args)}>; rel="next"'
+    return response
 
-    db = get_db()
-    cur = db.cursor()
 
-    # Execute the base SQL query to retrieve all exercises
-    cur.execute(sql_query)
-    exercises = cur.fetchall()
-
-    if filter_option:
-        # Handle filter options
-        if filter_option == 'rating_high_low':
-            exercises = sorted(exercises, key=lambda x: x['rating'], reverse=True)
-        elif filter_option == 'rating_low_high':
-            exercises = sorted(exercises, key=lambda x: x['rating'])
-        elif filter_option == 'intensity_light':
-            exercises = [exercise for exercise in exercises if exercise['intensity'] == 'Light']
-        elif filter_option == 'intensity_moderate':
-            exercises = [exercise for exercise in exercises if exercise['intensity'] == 'Moderate']
-        elif filter_option == 'intensity_vigorous':
-            exercises = [exercise for exercise in exercises if exercise['intensity'] == 'Vigorous']
-        elif filter_option == 'muscle_chest':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Chest']
-        elif filter_option == 'muscle_back':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Back']
-        elif filter_option == 'muscle_shoulders':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Shoulders']
-        elif filter_option == 'muscle_arms':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Arms']
-        elif filter_option == 'muscle_abdominals':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Abdominals']
-        elif filter_option == 'muscle_lower_back':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Lower Back']
-        elif filter_option == 'muscle_hips':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Hips']
-        elif filter_option == 'muscle_thighs':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Thighs']
-        elif filter_option == 'muscle_legs':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Legs']
-        elif filter_option == 'muscle_adductors_abductors':
-            exercises = [exercise for exercise in exercises if exercise['muscle_group'] == 'Adductors and Abductors']
-        else:
-            # Invalid filter option
-            return jsonify({'error': 'Invalid filter option'}), 400
-    # Convert exercises to JSON format and return
-    return jsonify([dict(x) for x in exercises])
+# Tables the training-volume aggregates are derived from
+VOLUME_TAGS = ('Workout', 'Exercise', 'Exercise_Detail', 'Exercise_In_Workout', 'Day', 'Workout_On_Day')
 
+# Longest range /api/analytics/weekly serves in one request (ten years)
+MAX_ANALYTICS_RANGE_DAYS = 3653
+
+@bp.route('/api/analytics/workouts')
+@cache.cached(*VOLUME_TAGS)
+def api_workout_volumes():
+    """
+    Training volume (sets x reps x weight) per workout.
+    Query parameters: sort (volume | workout_id), limit.
+    """
+    try:
+        limit = int(request.args.get('limit', analytics.DEFAULT_LIMIT))
+        volumes = analytics.workout_volumes(get_db(), sort=request.args.get('sort', 'volume'), limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(volumes)
+
+@bp.route('/api/analytics/workouts/<int:workout_id>')
+@cache.cached(*VOLUME_TAGS)
+def api_workout_volume(workout_id):
+    # Totals for one workout plus the breakdown per muscle group
+    volume = analytics.workout_volume(get_db(), workout_id)
+    if volume is None:
+        return jsonify({'error': 'Workout not found'}), 404
+    return jsonify(volume)
+
+@bp.route('/api/analytics/muscle-groups')
+@cache.cached(*VOLUME_TAGS)
+def api_muscle_group_volumes():
+    return jsonify(analytics.muscle_group_volumes(get_db()))
+
+@bp.route('/api/analytics/weekly')
+@cache.cached(*VOLUME_TAGS)
+def api_weekly_volumes():
+    """
+    Scheduled sessions and volume per ISO week between ?from and ?to (the last 12 weeks by default).
+    """
+    today = datetime.date.today()
+    default_start, _ = analytics.week_range(today - datetime.timedelta(weeks=analytics.DEFAULT_WEEKS - 1), today)
+    try:
+        start, end = parse_date_range(request.args, default_start, today, max_days=MAX_ANALYTICS_RANGE_DAYS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'from': start.isoformat(), 'to': end.isoformat(),
+                    'weeks': analytics.weekly_volumes(get_db(), start, end)})
+
+
+@bp.route('/api/search')
+@cache.cached('Exercise', 'Exercise_Detail')
+def api_search():
+    """
+    Full-text exercise search, best matches first.
+    Query parameters: q (every word is matched as a prefix), muscle_group and intensity (repeatable), limit, offset.
+    name_html and snippet_html are HTML-escaped with the matched words wrapped in <mark>.
+    Queries matching more than search.MAX_RANKED_MATCHES exercises come back unranked ("ranked": false).
+    """
+    try:
+        limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+        offset = int(request.args.get('offset', 0))
+        results, next_offset, ranked = search.search_exercises(
+            get_db(), request.args.get('q', ''), limit=limit, offset=offset,
+            muscle_groups=request.args.getlist('muscle_group'), intensities=request.args.getlist('intensity'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'query': request.args.get('q', ''), 'results': results, 'next_offset': next_offset,
+                    'ranked': ranked})
 
-@app.route('/api/workouts')
-def api_workouts():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("""
-        SELECT w.*, e.name AS exercise_name, e.intensity AS exercise_intensity, e.muscle_group
-        FROM Workout w
-        LEFT JOIN Exercise_In_Workout eiw ON w.workout_id = eiw.workout_id
-        LEFT JOIN Exercise e ON eiw.exercise_id = e.exercise_id
-        ORDER BY w.workout_id, e.exercise_id
-    """)
-    workouts = {}
-    for row in cur.fetchall():
-        workout_id = row['workout_id']
-        if workout_id not in workouts:
-            workouts[workout_id] = {
-                'workout_id': workout_id,
-                'name': row['name'],
-                'description': row['description'],
-                'intensity': row['intensity'],
-                'focus': row['focus'],
-                'exercises': []
-            }
-        if row['exercise_name']:  # Ensure there's an exercise linked
-            workouts[workout_id]['exercises'].append({
-                'name': row['exercise_name'],
-                'intensity': row['exercise_intensity'],
-                'muscle_group': row['muscle_group']
-            })
-    return jsonify(list(workouts.values()))
 
 # Route to handle insertion of exercise into workout
-@app.route('/insert-exercise', methods=['POST'])
+@bp.route('/insert-exercise', methods=['POST'])
+@cache.invalidates('Exercise_In_Workout')
 def insert_exercise():
     data = request.json
     exercise_detail_id = data.get('exercise_detail_id')
     workout_id = data.get('workout_id')
     if exercise_detail_id and workout_id:
         try:
-            # Connect to SQLite database
-            conn = sqlite3.connect('workoutdatabase.db')
-            cursor = conn.cursor()
-
             # Insert the exercise into the ExerciseInWorkout table
-            cursor.execute("INSERT INTO exercise_in_workout (exercise_detail_id, workout_id) VALUES (?, ?)",
+            writer.execute("INSERT INTO exercise_in_workout (exercise_detail_id, workout_id) VALUES (?, ?)",
                            (exercise_detail_id, workout_id))
-            conn.commit()
-            conn.close()
 
             return jsonify({'message': 'Exercise inserted successfully'}), 200
         except Exception as e:
@@ -550,61 +1205,38 @@ def insert_exercise():
     else:
         return jsonify({'message': 'Invalid data provided'}), 400
 
-@app.route('/api/exercises/<int:exercise_id>', methods=['DELETE'])
+@bp.route('/api/exercises/<int:exercise_id>', methods=['DELETE'])
+@cache.invalidates('Exercise', 'Exercise_In_Workout', 'Exercise_With_Detail')
 def delete_exercise(exercise_id):
-    db = get_db()
+    def write(conn):
+        # Drop the workout links first; foreign keys are enforced on pooled connections
+        conn.execute("DELETE FROM Exercise_In_Workout WHERE exercise_id = ?", (exercise_id,))
+        conn.execute("DELETE FROM Exercise_With_Detail WHERE exercise_id = ?", (exercise_id,))
+        conn.execute("DELETE FROM Exercise WHERE exercise_id = ?", (exercise_id,))
     try:
-        db.execute("DELETE FROM Exercise WHERE exercise_id = ?", (exercise_id,))
-        db.commit()
+        writer.run(write)
         return jsonify({'success': True, 'message': 'Exercise deleted successfully'}), 200
     except Exception as e:
-        db.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 
-@app.route('/api/exercises/<int:workout_id>')
+@bp.route('/api/exercises/<int:workout_id>')
 def api_exercises_by_workout(workout_id):
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("""
-        SELECT DISTINCT e.* 
-        FROM Exercise e 
-        JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id 
-        WHERE eiw.workout_id = ?
-    """, (workout_id,))
-    exercises = cur.fetchall()
-    return jsonify([dict(x) for x in exercises])
-
-@app.route('/select-exercise/<int:workout_id>')
+    return jsonify(repository.fetch_all(get_db(), 'exercises_in_workout', workout_id))
+
+@bp.route('/select-exercise/<int:workout_id>')
 def select_exercise(workout_id):
     try:
         exercises = get_exercises_without_details()  # Fetch exercises without details
         return render_template('select-exercise.html', exercises=exercises, workout_id=workout_id)
     except Exception as e:
         flash('Error fetching exercises: ' + str(e), 'error')
-        return redirect(url_for('workout_list'))
+        return redirect(url_for('main.workout_list'))
 
 def get_exercises_without_details():
     try:
-        db = get_db()  # Assuming this function returns the database connection
-        cur = db.cursor()
-
-        # Execute the SQL query to fetch exercises without details
-        cur.execute('''
-            SELECT * FROM Exercise
-        ''')
-
-        # Fetch all rows from the result set
-        rows = cur.fetchall()
-
-        # Convert each row into a dictionary for easier handling in templates
-        exercises = []
-        for row in rows:
-            exercise = dict(row)
-            exercises.append(exercise)
-
-        return exercises
+        return repository.fetch_all(get_db(), 'exercises')
 
     except Exception as e:
         # Handle exceptions, such as database connection errors
@@ -613,16 +1245,17 @@ def get_exercises_without_details():
 
 
 
-@app.route('/edit-select-exercise/<int:workout_id>')
+@bp.route('/edit-select-exercise/<int:workout_id>')
 def edit_select_exercise(workout_id):
     return render_template('edit-select-exercise.html', workout_id=workout_id)
 
-@app.route('/add-workout/<int:workout_id>')
+@bp.route('/add-workout/<int:workout_id>')
 def add_workout(workout_id):
     # Your logic here
     return render_template('add-workout.html', workout_id=workout_id)
 
-@app.route('/api/add-exercise-detail', methods=['POST'])
+@bp.route('/api/add-exercise-detail', methods=['POST'])
+@cache.invalidates('Exercise_Detail')
 def add_exercise_detail():
     try:
         # Retrieve data from the form
@@ -636,46 +1269,43 @@ def add_exercise_detail():
         reps = data['reps']
 
         # Insert into Exercise_Detail table
-        db = get_db()
-        cur = db.cursor()
-        cur.execute("""
+        writer.execute("""
             INSERT INTO Exercise_Detail (description, equipment_needed, weight, intensity, rating, sets, reps)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (description, equipment_needed, weight, intensity, rating, sets, reps))
-        db.commit()
 
         return jsonify({'message': 'Exercise detail added successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/exercise-to-workout/add/<int:workout_id>/<int:exercise_id>', methods=['POST'])
+def link_exercise(conn, workout_id, exercise_id):
+    """
+    Writer operation linking an exercise to a workout.
+    :return: False if the link already existed
+    """
+    return conn.execute(
+        "INSERT INTO Exercise_In_Workout (workout_id, exercise_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+        (workout_id, exercise_id)
+    ).rowcount > 0
+
+@bp.route('/api/exercise-to-workout/add/<int:workout_id>/<int:exercise_id>', methods=['POST'])
+@cache.invalidates('Exercise_In_Workout')
 def add_exercise_to_workout(workout_id, exercise_id):
     try:
         db = get_db()
-        # Check if the exercise is already linked to the workout
-        existing_link = db.execute("SELECT * FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?", (workout_id, exercise_id)).fetchone()
-        if existing_link:
+        # Insert the exercise into the Exercise_In_Workout table unless it is already linked
+        if not writer.run(link_exercise, workout_id, exercise_id):
             return jsonify({'success': False, 'message': 'Exercise is already linked to this workout.'}), 400
 
-        # Insert the exercise into the Exercise_In_Workout table
-        db.execute("INSERT INTO Exercise_In_Workout (workout_id, exercise_id) VALUES (?, ?)", (workout_id, exercise_id))
-        db.commit()
-
         # Get the newly created exercise in workout tuple
-        new_exercise_in_workout = db.execute("""
-            SELECT e.*, eiw.workout_id
-            FROM Exercise e
-            JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id
-            WHERE e.exercise_id = ? AND eiw.workout_id = ?
-        """, (exercise_id, workout_id)).fetchone()
-
-        return jsonify({'success': True, 'exercise_in_workout': dict(new_exercise_in_workout)}), 200
+        new_exercise_in_workout = repository.fetch_one(db, 'exercise_in_workout', workout_id, exercise_id)
+        return jsonify({'success': True, 'exercise_in_workout': new_exercise_in_workout}), 200
     except sqlite3.IntegrityError as e:
-        db.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/add-exercise', methods=['GET', 'POST'])
+@bp.route('/add-exercise', methods=['GET', 'POST'])
+@cache.invalidates('Exercise')
 def add_exercise():
     if request.method == 'POST':
         name = request.form['name']
@@ -683,52 +1313,25 @@ def add_exercise():
         intensity = request.form.get('intensity', '')
         rating = request.form.get('rating', '')  # Get the rating value from the form
         description = request.form.get('description', '')
-        db = get_db()
-        db.execute("INSERT INTO Exercise (name, muscle_group, intensity, rating, description) VALUES (?, ?, ?, ?, ?)",
-                   (name, muscle_group, intensity, rating, description))  # Insert the rating value into the database
-        db.commit()
-        return redirect(url_for('exercise_list'))
+        writer.execute("INSERT INTO Exercise (name, muscle_group, intensity, rating, description) VALUES (?, ?, ?, ?, ?)",
+                       (name, muscle_group, intensity, rating, description))  # Insert the rating value into the database
+        return redirect(url_for('main.exercise_list'))
     return render_template('add-exercise.html')
 
 
 
-@app.route('/api/exercises-in-workouts/<int:workout_id>')
-def exercises_in_workouts(workout_id):
-    db = get_db()
-    cur = db.cursor()
-    try:
-        cur.execute("""
-            SELECT e.*, 
-                   CASE WHEN eiw.workout_id IS NOT NULL THEN 1 ELSE 0 END as is_selected
-            FROM Exercise e
-            LEFT JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id AND eiw.workout_id = ?
-            ORDER BY e.exercise_id
-        """, (workout_id,))
-        exercises = cur.fetchall()
-        return jsonify([{
-            'exercise_id': ex['exercise_id'],
-            'exercise_name': ex['name'],
-            'intensity': ex['intensity'],
-            'muscle_group': ex['muscle_group'],
-            'is_selected': bool(ex['is_selected'])
-        } for ex in exercises]), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/exercise-to-workout/remove/<int:workout_id>/<int:exercise_id>', methods=['DELETE'])
+@bp.route('/api/exercise-to-workout/remove/<int:workout_id>/<int:exercise_id>', methods=['DELETE'])
+@cache.invalidates('Exercise_In_Workout')
 def remove_exercise_from_workout(workout_id, exercise_id):
     try:
-        db = get_db()
         # Delete Exercise in Workout tuple
-        db.execute("DELETE FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?", (workout_id, exercise_id))
-        db.commit()
+        writer.execute("DELETE FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?", (workout_id, exercise_id))
         return jsonify({'success': True, 'message': 'Exercise removed from workout successfully'})
     except sqlite3.IntegrityError as e:
-        db.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
     
-@app.route('/edit-exercise/<int:exercise_id>', methods=['GET', 'POST'])
+@bp.route('/edit-exercise/<int:exercise_id>', methods=['GET', 'POST'])
+@cache.invalidates('Exercise')
 def edit_exercise(exercise_id):
     db = get_db()
     if request.method == 'POST':
@@ -736,19 +1339,17 @@ def edit_exercise(exercise_id):
         muscle_group = request.form['muscle_group']
         intensity = request.form.get('intensity', '')
         description = request.form.get('description', '')
-        db.execute("UPDATE Exercise SET name=?, muscle_group=?, intensity=?, description=? WHERE exercise_id=?", (name, muscle_group, intensity, description, exercise_id))
-        db.commit()
-        return redirect(url_for('exercise_list'))
+        writer.execute("UPDATE Exercise SET name=?, muscle_group=?, intensity=?, description=? WHERE exercise_id=?", (name, muscle_group, intensity, description, exercise_id))
+        return redirect(url_for('main.exercise_list'))
     else:
-        cur = db.cursor()
-        cur.execute("SELECT * FROM Exercise WHERE exercise_id = ?", (exercise_id,))
-        exercise = cur.fetchone()
+        exercise = repository.fetch_one(db, 'exercise', exercise_id)
         return render_template('edit-exercise.html', exercise=exercise)
 
-@app.route('/add-or-edit-workout/', methods=['GET', 'POST'])
-@app.route('/add-or-edit-workout/<int:workout_id>', methods=['GET', 'POST'])
+@bp.route('/add-or-edit-workout/', methods=['GET', 'POST'])
+@bp.route('/add-or-edit-workout/<int:workout_id>', methods=['GET', 'POST'])
+@cache.invalidates('Workout')
 def add_or_edit_workout(workout_id=None):
-    db = get_db()  # Ensure database connection is opened at the beginning of the function
+    db = get_db()  # Pooled connection, released on teardown
     try:
         if request.method == 'POST':
             name = request.form.get('name', 'Default Workout Name')
@@ -758,37 +1359,29 @@ def add_or_edit_workout(workout_id=None):
             
             if workout_id is None:
                 workout_id = generate_workout_id()
-                db.execute("INSERT INTO Workout (workout_id, name, description, intensity, focus) VALUES (?, ?, ?, ?, ?)",
-                           (workout_id, name, description, intensity, focus))
-                app.logger.info(f"Inserted new workout with ID={workout_id}")
-                db.commit()
-                return redirect(url_for('add_or_edit_workout', workout_id=workout_id))  # Redirect to the same page with the new workout ID
+                writer.execute("INSERT INTO Workout (workout_id, name, description, intensity, focus) VALUES (?, ?, ?, ?, ?)",
+                               (workout_id, name, description, intensity, focus))
+                current_app.logger.info(f"Inserted new workout with ID={workout_id}")
+                return redirect(url_for('main.add_or_edit_workout', workout_id=workout_id))  # Redirect to the same page with the new workout ID
             else:
-                db.execute("UPDATE Workout SET name=?, description=?, intensity=?, focus=? WHERE workout_id=?",
-                           (name, description, intensity, focus, workout_id))
-                app.logger.info(f"Updated workout with ID={workout_id}")
-                db.commit()
-                return redirect(url_for('add_or_edit_workout', workout_id=workout_id))  # Redirect back to the same page with the workout ID
+                writer.execute("UPDATE Workout SET name=?, description=?, intensity=?, focus=? WHERE workout_id=?",
+                               (name, description, intensity, focus, workout_id))
+                current_app.logger.info(f"Updated workout with ID={workout_id}")
+                return redirect(url_for('main.add_or_edit_workout', workout_id=workout_id))  # Redirect back to the same page with the workout ID
         else:
             if workout_id is None:
                 workout_id = generate_workout_id()
-                return redirect(url_for('add_or_edit_workout', workout_id=workout_id))  # Redirect if no ID is provided initially
-            workout = db.execute("SELECT * FROM Workout WHERE workout_id = ?", (workout_id,)).fetchone()
-            exercises = db.execute("""
-                SELECT e.*
-                FROM Exercise e
-                JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id
-                WHERE eiw.workout_id = ?
-            """, (workout_id,)).fetchall()
+                return redirect(url_for('main.add_or_edit_workout', workout_id=workout_id))  # Redirect if no ID is provided initially
+            workout = repository.fetch_one(db, 'workout', workout_id)
+            exercises = repository.fetch_all(db, 'exercises_in_workout', workout_id)
             return render_template('add-workout.html', workout=workout, workout_id=workout_id, exercises=exercises)
     except sqlite3.Error as e:
-        app.logger.error(f"Database error: {str(e)}")
+        current_app.logger.error(f"Database error: {str(e)}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()  # Ensure db is closed only after all operations are complete
 
     
-@app.route('/insert-workout/<int:workout_id>', methods=['POST'])
+@bp.route('/insert-workout/<int:workout_id>', methods=['POST'])
+@cache.invalidates('Workout')
 def insert_workout(workout_id):
     try:
         # Extract workout data from the request
@@ -798,17 +1391,9 @@ def insert_workout(workout_id):
         focus = request.form['focus']
         rating = int(request.form.get('rating', 5))  # Assuming default rating is 5 if not provided
 
-        # Connect to the database
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-
         # Insert the workout into the database
-        cursor.execute("INSERT INTO Workout (workout_id, name, description, intensity, focus, rating) VALUES (?, ?, ?, ?, ?, ?)",
+        writer.execute("INSERT INTO Workout (workout_id, name, description, intensity, focus, rating) VALUES (?, ?, ?, ?, ?, ?)",
                        (workout_id, name, description, intensity, focus, rating))
-        conn.commit()
-
-        # Close the database connection
-        conn.close()
 
         # Return a JSON response indicating success
         return jsonify({'success': True, 'message': 'Workout added successfully'})
@@ -819,149 +1404,204 @@ def insert_workout(workout_id):
 
     
 # Flask route to generate and save a new workout, returning the new ID
-@app.route('/api/workouts/new', methods=['POST'])
+@bp.route('/api/workouts/new', methods=['POST'])
+@cache.invalidates('Workout')
 def create_new_workout():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("INSERT INTO Workout (name, description) VALUES (?, ?)", ('New Workout', 'Description'))
-    db.commit()
-    new_workout_id = cursor.lastrowid
+    new_workout_id = generate_workout_id()
+    writer.execute("INSERT INTO Workout (workout_id, name, description) VALUES (?, ?, ?)",
+                   (new_workout_id, 'New Workout', 'Description'))
     return jsonify({'workout_id': new_workout_id})
 
 
 
-@app.route('/api/exercise-to-workout/<action>/<int:workout_id>/<int:exercise_id>', methods=['POST'])
+@bp.route('/api/exercise-to-workout/<action>/<int:workout_id>/<int:exercise_id>', methods=['POST'])
+@cache.invalidates('Exercise_In_Workout')
 def add_or_remove_exercise_from_workout(action, workout_id, exercise_id):
     if action == 'add':
         try:
             db = get_db()
-            # Check if the exercise is already linked to the workout
-            existing_link = db.execute("SELECT * FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?", (workout_id, exercise_id)).fetchone()
-            if existing_link:
+            # Insert the exercise into the Exercise_In_Workout table unless it is already linked
+            if not writer.run(link_exercise, workout_id, exercise_id):
                 return jsonify({'success': False, 'message': 'Exercise is already linked to this workout.'}), 400
 
-            # Insert the exercise into the Exercise_In_Workout table
-            db.execute("INSERT INTO Exercise_In_Workout (workout_id, exercise_id) VALUES (?, ?)", (workout_id, exercise_id))
-            db.commit()
-
             # Get the newly created exercise in workout tuple
-            new_exercise_in_workout = db.execute("""
-                SELECT e.*, eiw.workout_id
-                FROM Exercise e
-                JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id
-                WHERE e.exercise_id = ? AND eiw.workout_id = ?
-            """, (exercise_id, workout_id)).fetchone()
-
-            return jsonify({'success': True, 'exercise_in_workout': dict(new_exercise_in_workout)}), 200
+            new_exercise_in_workout = repository.fetch_one(db, 'exercise_in_workout', workout_id, exercise_id)
+            return jsonify({'success': True, 'exercise_in_workout': new_exercise_in_workout}), 200
         except sqlite3.IntegrityError as e:
-            db.rollback()
             return jsonify({'success': False, 'message': str(e)}), 500
 
     elif action == 'remove':
         try:
-            db = get_db()
             # Delete Exercise in Workout tuple
-            db.execute("DELETE FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?", (workout_id, exercise_id))
-            db.commit()
+            writer.execute("DELETE FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?", (workout_id, exercise_id))
             return jsonify({'success': True, 'message': 'Exercise removed from workout successfully'})
         except sqlite3.IntegrityError as e:
-            db.rollback()
             return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/joined-exercises/<int:workout_id>')
+@bp.route('/api/workouts/<int:workout_id>/exercises', methods=['GET', 'POST'])
+@cache.invalidates('Exercise_In_Workout')
+def bulk_workout_exercises(workout_id):
+    """
+    GET returns the exercise ids linked to a workout.
+    POST applies a batch of link changes in one transaction and returns the resulting set:
+      {"add": [exercise_id, ...], "remove": [exercise_id, ...]}
+    """
+    db = get_db()
+    if db.execute("SELECT 1 FROM Workout WHERE workout_id = ?", (workout_id,)).fetchone() is None:
+        return jsonify({'success': False, 'message': 'Workout not found'}), 404
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            add = {int(x) for x in data.get('add', [])}
+            remove = {int(x) for x in data.get('remove', [])} - add
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': "'add' and 'remove' must be lists of exercise ids"}), 400
+
+        def write(conn):
+            conn.executemany(
+                "INSERT INTO Exercise_In_Workout (workout_id, exercise_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                [(workout_id, exercise_id) for exercise_id in add]
+            )
+            conn.executemany(
+                "DELETE FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?",
+                [(workout_id, exercise_id) for exercise_id in remove]
+            )
+        try:
+            writer.run(write)
+        except sqlite3.IntegrityError as e:
+            # An unknown exercise id fails the foreign key; nothing from the batch is kept
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+    rows = db.execute(
+        "SELECT exercise_id FROM Exercise_In_Workout WHERE workout_id = ? ORDER BY exercise_id",
+        (workout_id,)
+    ).fetchall()
+    return jsonify({'success': True, 'workout_id': workout_id, 'exercise_ids': [row['exercise_id'] for row in rows]})
+
+
+@bp.route('/api/generate-workout', methods=['POST'])
+@cache.invalidates('Workout', 'Exercise_In_Workout')
+def api_generate_workout():
+    """
+    Generate a balanced workout from the exercise catalog.
+    Body: {"focus": ..., "intensity": ..., "equipment": [...], "muscle_groups": [...], "exercise_count": 8,
+           "candidates": 200, "results": 1, "temperature": 0.5, "seed": ...}
+    With "save": true the best workout is stored, as a new workout named "name" or by linking its
+    exercises to an existing "workout_id".
+    """
+    # Imported here rather than at the top: see Services.catalog_features()
+    from workout_generator import GenerationError, GenerationRequest
+
+    data = request.get_json(silent=True) or {}
+    try:
+        spec = GenerationRequest.from_json(data)
+        db = get_db()
+        generated = spec.generate(catalog_features.get(db))
+    except GenerationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    exercise_ids, score = generated[0]
+    placeholders = ', '.join('?' * len(exercise_ids))
+    rows = {row['exercise_id']: dict(row) for row in db.execute(f"""
+        SELECT e.exercise_id, e.name, e.muscle_group, e.intensity, e.rating, ed.equipment_needed, ed.weight
+        FROM Exercise e
+        LEFT JOIN Exercise_Detail ed ON e.exercise_detail_id = ed.exercise_detail_id
+        WHERE e.exercise_id IN ({placeholders})
+    """, exercise_ids)}
+
+    workout_id = None
+    if data.get('save'):
+        workout_id = data.get('workout_id')
+        if workout_id is not None and not isinstance(workout_id, int):
+            return jsonify({'error': "'workout_id' must be an integer"}), 400
+
+        def write(conn, new_workout_id):
+            target = workout_id
+            if target is None:
+                target = new_workout_id
+                conn.execute(
+                    "INSERT INTO Workout (workout_id, name, description, intensity, focus) VALUES (?, ?, ?, ?, ?)",
+                    (target, data.get('name') or f"Generated {spec.focus}", 'Generated workout', spec.intensity,
+                     spec.focus)
+                )
+            elif conn.execute("SELECT 1 FROM Workout WHERE workout_id = ?", (target,)).fetchone() is None:
+                raise GenerationError('Workout not found')
+            conn.executemany(
+                "INSERT INTO Exercise_In_Workout (workout_id, exercise_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                [(target, exercise_id) for exercise_id in exercise_ids]
+            )
+            return target
+        try:
+            workout_id = writer.run(write, generate_workout_id() if workout_id is None else None)
+        except GenerationError as e:
+            return jsonify({'error': str(e)}), 404
+
+    return jsonify({
+        'workout_id': workout_id,
+        'score': score,
+        'exercises': [rows[exercise_id] for exercise_id in exercise_ids if exercise_id in rows],
+        'alternatives': [{'exercise_ids': ids, 'score': s} for ids, s in generated[1:]],
+    })
+
+
+@bp.route('/api/joined-exercises/<int:workout_id>')
 def get_joined_exercises(workout_id):
-    db = get_db()  # Connect to the database
-    cur = db.cursor()
     try:
-        cur.execute("""
-            SELECT e.*, ed.*
-            FROM Exercise e
-            JOIN Exercise_Detail ed ON e.exercise_detail_id = ed.exercise_detail_id
-            JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id
-            WHERE eiw.workout_id = ?
-        """, (workout_id,))
-        joined_exercises = cur.fetchall()
-        return jsonify(joined_exercises)
+        return jsonify(repository.fetch_all(get_db(), 'detailed_exercises_in_workout', workout_id))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()  # Close the cursor
-        db.close()  # Close the database connection
 
-@app.route('/api/exercise-to-workout/<int:exercise_id>/<int:workout_id>', methods=['POST', 'DELETE'])
+@bp.route('/api/exercise-to-workout/<int:exercise_id>/<int:workout_id>', methods=['POST', 'DELETE'])
+@cache.invalidates('Exercise_In_Workout')
 def exercise_to_workout(exercise_id, workout_id):
     try:
-        connection = sqlite3.connect('workoutdatabase.db')
-        cursor = connection.cursor()
 
         if request.method == 'POST':
             # Insert Exercise in Workout tuple
-            cursor.execute("INSERT INTO Exercise_In_Workout (exercise_id, workout_id) VALUES (?, ?)", (exercise_id, workout_id))
-            connection.commit()
+            writer.execute("INSERT INTO Exercise_In_Workout (exercise_id, workout_id) VALUES (?, ?)", (exercise_id, workout_id))
         elif request.method == 'DELETE':
             # Delete Exercise in Workout tuple
-            cursor.execute("DELETE FROM Exercise_In_Workout WHERE exercise_id = ? AND workout_id = ?", (exercise_id, workout_id))
-            connection.commit()
+            writer.execute("DELETE FROM Exercise_In_Workout WHERE exercise_id = ? AND workout_id = ?", (exercise_id, workout_id))
             return jsonify({'success': True, 'message': 'Exercise removed from workout successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
-    finally:
-        cursor.close()
-        connection.close()
 
-@app.route('/workout/<int:workout_id>/exercises')
+@bp.route('/workout/<int:workout_id>/exercises')
 def workout_exercises(workout_id):
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("""
-        SELECT e.*, ed.*
-        FROM Exercise e
-        JOIN Exercise_Detail ed ON e.exercise_detail_id = ed.exercise_detail_id
-        JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id
-        WHERE eiw.workout_id = ?
-    """, (workout_id,))
-    exercises = cur.fetchall()
+    exercises = repository.fetch_all(get_db(), 'detailed_exercises_in_workout', workout_id)
     return render_template('workout-exercises.html', exercises=exercises)
 
-@app.route('/api/exercise-to-workout/remove/<int:exercise_id>/<int:workout_id>', methods=['DELETE'])
-def unjoin_exercise_from_workout(exercise_id, workout_id):
-    # Code to unjoin the specified exercise from the specified workout in the database
-    return jsonify(success=True)
-
     
-@app.route('/api/exercises-with-workouts/<int:workout_id>')
+@bp.route('/api/exercises-with-workouts/<int:workout_id>')
 def exercises_with_workouts(workout_id):
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("""
-        SELECT e.name AS exercise_name, w.name AS workout_name
-        FROM Exercise e
-        JOIN Exercise_In_Workout eiw ON e.exercise_id = eiw.exercise_id
-        JOIN Workout w ON eiw.workout_id = w.workout_id
-        WHERE w.workout_id = ?
-    """, (workout_id,))
-    exercises = [{'exercise_name': row['exercise_name'], 'workout_name': row['workout_name']} for row in cur.fetchall()]
-    return jsonify(exercises)
+    return jsonify(repository.fetch_all(get_db(), 'exercise_workout_names', workout_id))
 
 
 
-@app.route('/api/workouts/<int:workout_id>', methods=['DELETE'])
+@bp.route('/api/workouts/<int:workout_id>', methods=['DELETE'])
+@cache.invalidates('Workout', 'Exercise_In_Workout', 'Workout_On_Day', 'Schedule_Rule', 'Schedule_Rule_Exception')
 def delete_workout(workout_id):
-    db = get_db()
+    def write(conn):
+        # Remove dependent rows first; foreign keys are enforced on pooled connections
+        conn.execute("DELETE FROM Exercise_In_Workout WHERE workout_id = ?", (workout_id,))
+        conn.execute("DELETE FROM Workout_On_Day WHERE workout_id = ?", (workout_id,))
+        # Exceptions go with their rules (ON DELETE CASCADE)
+        conn.execute("DELETE FROM Schedule_Rule WHERE workout_id = ?", (workout_id,))
+        conn.execute("DELETE FROM Workout WHERE workout_id = ?", (workout_id,))
     try:
-        db.execute("DELETE FROM Workout WHERE workout_id = ?", (workout_id,))
-        db.commit()
+        writer.run(write)
         return jsonify({'success': True}), 200
     except Exception as e:
-        db.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 
 
 
-@app.route('/edit-workout/<int:workout_id>', methods=['GET', 'POST'])
+@bp.route('/edit-workout/<int:workout_id>', methods=['GET', 'POST'])
+@cache.invalidates('Workout')
 def edit_workout(workout_id):
     db = get_db()
     if request.method == 'POST':
@@ -969,28 +1609,26 @@ def edit_workout(workout_id):
         description = request.form.get('description', '')
         intensity = request.form.get('intensity', '')
         focus = request.form.get('focus', '')
-        db.execute("UPDATE Workout SET name=?, description=?, intensity=?, focus=? WHERE workout_id=?",
-                   (name, description, intensity, focus, workout_id))
-        db.commit()
-        return redirect(url_for('workout_list'))
+        writer.execute("UPDATE Workout SET name=?, description=?, intensity=?, focus=? WHERE workout_id=?",
+                       (name, description, intensity, focus, workout_id))
+        return redirect(url_for('main.workout_list'))
     else:
-        cur = db.cursor()
-        cur.execute("SELECT * FROM Workout WHERE workout_id = ?", (workout_id,))
-        workout = cur.fetchone()
+        workout = repository.fetch_one(db, 'workout', workout_id)
         if workout:
             return render_template('edit-workout.html', workout=workout, workout_id=workout_id)
         else:
             flash("Workout not found", "error")
-            return redirect(url_for('workout_list'))
+            return redirect(url_for('main.workout_list'))
 
 
 # API endpoint to generate a workout ID
-@app.route('/api/generate-workout-id', methods=['GET'])
+@bp.route('/api/generate-workout-id', methods=['GET'])
 def generate_workout_id_endpoint():
     workout_id = generate_workout_id()
     return jsonify(workout_id=workout_id)
 
-@app.route('/api/workouts', methods=['POST'])
+@bp.route('/api/workouts', methods=['POST'])
+@cache.invalidates('Workout')
 def create_workout():
     # Extract data from JSON request
     data = request.get_json()
@@ -1009,56 +1647,447 @@ def create_workout():
     rating = data.get('rating', 5)  # Default rating if not provided
 
     try:
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('''
-            INSERT INTO Workout (name, description, intensity, focus, rating)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (name, description, intensity, focus, rating))
-        db.commit()
-        new_workout_id = cursor.lastrowid
+        new_workout_id = generate_workout_id()
+        writer.execute('''
+            INSERT INTO Workout (workout_id, name, description, intensity, focus, rating)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (new_workout_id, name, description, intensity, focus, rating))
         return jsonify({'success': True, 'workout_id': new_workout_id}), 201
     except sqlite3.IntegrityError as e:
-        db.rollback()
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        db.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        db.close()
 
 
 
 def generate_day_id():
-    day_uuid = uuid.uuid4()
-    return str(day_uuid)
+    """
+    Allocate a unique day ID from the in-memory block.
+    """
+    return ids.next_id('Day')
 
-@app.route('/api/generate-day-id', methods=['GET'])
+@bp.route('/api/generate-day-id', methods=['GET'])
 def generate_day_id_endpoint():
     day_id = generate_day_id()
     return jsonify(day_id=day_id)
 
-@app.route('/api/add-day', methods=['POST'])
+@bp.route('/api/add-day', methods=['POST'])
+@cache.invalidates('Day')
 def add_day():
     data = request.get_json()
     day_id = data.get('day_id')
     if day_id:
         try:
-            db = get_db()
-            db.execute("INSERT INTO Day (day_id) VALUES (?)", (day_id,))
-            db.commit()
+            writer.execute("INSERT INTO Day (day_id) VALUES (?)", (day_id,))
             return jsonify({'success': True}), 200
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
     else:
         return jsonify({'success': False, 'error': 'No day ID provided'}), 400
 
-@app.route('/select-workout/<int:dayId>')
+@bp.route('/select-workout/<int:dayId>')
 def select_workout(dayId):
     # Your logic to handle the request
     return render_template('select-workout.html', dayId=dayId)
 
+@bp.route('/api/sync', methods=['GET'])
+def api_sync():
+    """
+    Changes to the catalog and schedule tables since ?since=<version>, for clients that keep a local copy.
+    Rows changed after that version come back in 'upserts' with their current values and deleted rows in
+    'deletes' by primary key, grouped by table, at most ?limit= log entries per page; while 'more' is true,
+    ask again with since=<version>. On the first sync (no ?since), or with a version older than the
+    retained log, 'full' is true and the page is part of a complete download instead: drop local data, then follow
+    ?cursor=<cursor> until 'more' is false, and sync from the returned version afterwards.
+    """
+    try:
+        limit = sync.page_size(request.args.get('limit'))
+        page = sync.sync_page(get_db(), since=request.args.get('since'), cursor=request.args.get('cursor'),
+                              limit=limit)
+    except sync.SyncError as e:
+        return jsonify({'error': str(e)}), 400
+    services().compact_change_log_if_due()
+    return jsonify(page)
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+@bp.route('/api/export/<entity>', methods=['GET'])
+def export_entity(entity):
+    """
+    Stream every row of an entity as CSV (default) or NDJSON (?format=ndjson).
+    """
+    fmt = request.args.get('format', 'csv')
+    try:
+        chunks = bulk_io.iter_export(get_db(), entity, fmt)
+    except bulk_io.BulkIOError as e:
+        return jsonify({'error': str(e)}), 400
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{entity}.{fmt}"'
+    return response
+
+@bp.route('/api/import/<entity>', methods=['POST'])
+def import_entity(entity):
+    """
+    Upsert rows of an entity from a CSV (default) or NDJSON (?format=ndjson) request body.
+    Rows that violate a constraint are reported by line number without aborting the import. If the import
+    stops on a database error, the chunks committed so far stay and the error comes with their report.
+    """
+    fmt = request.args.get('format', 'csv')
+    try:
+        table = bulk_io.get_entity(entity)[0]
+        bulk_io.check_format(fmt)
+    except bulk_io.BulkIOError as e:
+        return jsonify({'error': str(e)}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    report = bulk_io.ImportReport()
+    try:
+        bulk_io.import_records(writer.run, entity, bulk_io.read_records(stream, fmt), next_id=ids.next_id,
+                               report=report)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify(dict(report.to_dict(), error=f'Could not read the request body: {e}')), 400
+    except WriteTimeoutError as e:
+        return jsonify(dict(report.to_dict(), error=str(e))), 503
+    except sqlite3.Error as e:
+        return jsonify(dict(report.to_dict(), error=str(e))), 500
+    finally:
+        cache.invalidate(table)
+        # Each chunk's rows were captured as it committed; a closing reset lets clients refetch once
+        event_hub.publish([{'table': table, 'op': 'reset'}])
+    return jsonify(report.to_dict()), 200
+
+# Background job types. CPU-heavy work runs in the process pool, away from the web workers; the rest in the thread pool.
+JOB_TYPES = {job_type.name: job_type for job_type in (
+    jobs.JobType('export', jobs.export_job, kind='process', concurrency=2, check=jobs.check_export),
+    jobs.JobType('analytics-rebuild', jobs.analytics_rebuild_job, kind='process', invalidates=VOLUME_TAGS),
+    jobs.JobType('search-rebuild', jobs.search_rebuild_job, kind='process', check=jobs.check_search_rebuild,
+                 invalidates=('Exercise', 'Exercise_Detail')),
+    jobs.JobType('replace-exercise', jobs.replace_exercise_job, check=jobs.check_replace_exercise,
+                 invalidates=('Exercise_In_Workout',)),
+    jobs.JobType('vacuum', jobs.vacuum_job, max_attempts=1),
+)}
+
+@bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a background job: {"type", "params", "max_attempts"}. Answers 202 with the job; poll
+    GET /api/jobs/<id> for its status and progress, and fetch GET /api/jobs/<id>/result once it has succeeded.
+    """
+    try:
+        job_type, params, max_attempts = jobs.parse_submission(request.get_json(silent=True), JOB_TYPES)
+    except jobs.JobError as e:
+        return jsonify({'error': str(e)}), 400
+    job_id = writer.run(jobs.enqueue, job_type.name, params, max_attempts)
+    services().jobs.wake()
+    response = jsonify(jobs.get_job(get_db(), job_id))
+    response.status_code = 202
+    response.headers['Location'] = url_for('main.job_status', job_id=job_id)
+    return response
+
+@bp.route('/api/jobs', methods=['GET'])
+def job_list():
+    """
+    Jobs, newest first. Query parameters: status, type, limit.
+    """
+    try:
+        return jsonify(jobs.list_jobs(get_db(), status=request.args.get('status'),
+                                      job_type=request.args.get('type'), limit=request.args.get('limit')))
+    except jobs.JobError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/api/jobs/types', methods=['GET'])
+def job_types():
+    return jsonify([job_type.to_dict() for job_type in JOB_TYPES.values()])
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get_job(get_db(), job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@bp.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """
+    Result of a succeeded job: its output file as a download, or its JSON result.
+    """
+    job = jobs.get_job(get_db(), job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    result = job['result']
+    if isinstance(result, dict) and result.get('file'):
+        return send_from_directory(jobs.output_dir(services().database), result['file'], as_attachment=True,
+                                   download_name=result.get('filename'))
+    return jsonify(result)
+
+@bp.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a queued job, or ask a running one to stop at its next progress report.
+    """
+    status = writer.run(jobs.cancel, job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status in jobs.FINISHED:
+        return jsonify({'error': f"Job already {status}", 'status': status}), 409
+    return jsonify(jobs.get_job(get_db(), job_id)), 202
+
+@bp.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(dict(services().jobs.stats(), queue=jobs.count_by_status(get_db()),
+                        pools=current_app.extensions['workoutdb_job_pools'].stats()))
+
+@bp.cli.command('export')
+@click.argument('entity', type=click.Choice(list(bulk_io.ENTITIES)))
+@click.option('--format', 'fmt', type=click.Choice(bulk_io.FORMATS), default='csv')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-')
+def export_command(entity, fmt, output):
+    """Stream an entity to a file (or stdout) as CSV or NDJSON."""
+    ensure_schema()
+    with pool.connection() as conn:
+        for chunk in bulk_io.iter_export(conn, entity, fmt):
+            output.write(chunk)
+
+@bp.cli.command('import')
+@click.argument('entity', type=click.Choice(list(bulk_io.ENTITIES)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(bulk_io.FORMATS), default=None,
+              help='Defaults to the file extension.')
+@click.option('--chunk-size', type=int, default=bulk_io.DEFAULT_CHUNK_SIZE)
+def import_command(entity, source, fmt, chunk_size):
+    """Upsert an entity from a CSV or NDJSON file, reporting rejected rows."""
+    if fmt is None:
+        fmt = 'ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+    ensure_schema()
+    report = bulk_io.import_records(writer.run, entity, bulk_io.read_records(source, fmt), chunk_size,
+                                    next_id=ids.next_id)
+    result = report.to_dict()
+    print(f"Imported {result['imported']} of {result['processed']} rows, {result['skipped']} already present, "
+          f"{result['failed']} failed")
+    for error in result['errors']:
+        print(f"  line {error['line']}: {error['error']}")
+
+@bp.cli.command('search-rebuild')
+@click.option('--check', is_flag=True, help="Verify the index against the tables after rebuilding.")
+def search_rebuild_command(check):
+    """Rebuild the exercise full-text search index from the Exercise and Exercise_Detail tables."""
+    ensure_schema()
+    with pool.connection() as conn:
+        count = search.rebuild_index(conn, check=check)
+    print(f"Indexed {count} exercises" + (" (integrity check passed)" if check else ""))
+
+
+@bp.cli.command('analytics-rebuild')
+def analytics_rebuild_command():
+    """Recompute the training-volume summary tables from scratch."""
+    ensure_schema()
+    with pool.connection() as conn:
+        counts = analytics.rebuild_aggregates(conn)
+    for table, count in counts.items():
+        print(f"{table:<22} {count:>10,}")
+    cache.clear()
+
+
+@bp.cli.command('sync-compact')
+@click.option('--retention-days', type=float, default=None,
+              help='Keep deleted rows this many days (defaults to SYNC_RETENTION_DAYS).')
+def sync_compact_command(retention_days):
+    """Compact the /api/sync change log now."""
+    if retention_days is None:
+        retention_days = float(current_app.config['SYNC_RETENTION_DAYS'])
+    result = writer.run(sync.compact, retention_days)
+    print(f"Removed {result['superseded']:,} superseded entries and {result['tombstones']:,} expired tombstones; "
+          f"cursors before version {result['compacted_through']} need a full resync")
+
+
+@bp.cli.command('assets-build')
+def assets_build_command():
+    """Fingerprint and precompress static files into static/dist; restart the app to pick them up."""
+    manifest = assets.build(current_app.static_folder)
+    print(f"Built {len(manifest)} assets into {os.path.join(current_app.static_folder, assets.BUILD_DIR)}"
+          f" (gzip{', brotli' if assets.brotli is not None else ''})")
+
+
+@bp.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations and refresh planner statistics."""
+    with pool.connection() as conn:
+        applied = migrate(conn, current_app.config['SCHEMA_FILE'])
+        print(f"Applied migrations: {applied or 'none'}; schema version {get_version(conn)}")
+
+
+@bp.cli.command('tenant-migrate')
+@click.argument('names', nargs=-1)
+def tenant_migrate_command(names):
+    """Create or migrate tenant databases: the given tenants, or every one in TENANT_DIR."""
+    tenant_dir = current_app.config['TENANT_DIR']
+    if not tenant_dir:
+        raise click.UsageError('TENANT_DIR is not set')
+    try:
+        names = [tenancy.check_name(name) for name in names] or tenancy.list_tenants(tenant_dir)
+    except tenancy.TenantError as e:
+        raise click.BadParameter(str(e))
+    for name in names:
+        path = tenancy.database_path(tenant_dir, name)
+        if tenancy.create_database(path, current_app.config['SCHEMA_FILE']):
+            print(f"{name}: created")
+        tenant = Services(current_app, path, name)
+        with tenant.pool.connection() as conn:
+            applied = migrate(conn, current_app.config['SCHEMA_FILE'])
+            print(f"{name}: applied migrations {applied or 'none'}; schema version {get_version(conn)}")
+        tenant.close()
+
+
+@bp.cli.command('jobs-worker')
+@click.argument('tenants', nargs=-1)
+def jobs_worker_command(tenants):
+    """Run queued background jobs until interrupted: those of DATABASE, or of the given tenants."""
+    if tenants:
+        tenant_dir = current_app.config['TENANT_DIR']
+        if not tenant_dir:
+            raise click.UsageError('TENANT_DIR is not set')
+        try:
+            names = [tenancy.check_name(name) for name in tenants]
+        except tenancy.TenantError as e:
+            raise click.BadParameter(str(e))
+        served = [Services(current_app, tenancy.database_path(tenant_dir, name), name) for name in names]
+    else:
+        served = [services()]
+    for database in served:
+        database.jobs.start()
+    stop = threading.Event()
+    # Service managers stop it with SIGTERM; treat that like Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    print(f"Running jobs as {', '.join(database.jobs.worker for database in served)}; Ctrl+C to stop")
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print("Stopping once the running jobs are done")
+    for database in served:
+        database.jobs.close(wait=True)
+
+
+@bp.route('/api/db-pool-stats', methods=['GET'])
+def db_pool_stats():
+    # Checkout wait time and exhaustion counters for the shared connection pool
+    return jsonify(pool.stats())
+
+
+@bp.route('/api/writer-stats', methods=['GET'])
+def writer_stats():
+    # Group-commit batch sizes and queue depth for the single writer thread
+    return jsonify(writer.stats())
+
+
+@bp.route('/api/events', methods=['GET'])
+def event_stream():
+    """
+    Server-Sent Events feed of row changes, so open pages can patch themselves instead of refetching.
+    ?topics=Workout,Day limits it to those tables (all published tables by default). Each `change`
+    event carries {"table", "op": "insert"|"update"|"delete", "key", "row"}; op "reset" means too much
+    changed at once and the table should be reloaded. A `reset` event without a table asks the client
+    to reload everything, and `dropped` ends the stream of a client that fell too far behind.
+    """
+    topics = [topic for topic in request.args.get('topics', '').split(',') if topic]
+    hub = services().events
+    try:
+        subscription = hub.subscribe(topics, request.headers.get('Last-Event-ID'))
+    except events.HubFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except events.EventError as e:
+        return jsonify({'error': str(e)}), 400
+    response = Response(stream_with_context(hub.stream(subscription)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@bp.route('/api/events/stats', methods=['GET'])
+def event_stats():
+    return jsonify(event_hub.stats())
+
+
+@bp.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(dict(cache.stats(), fragments=fragments.stats()))
+
+
+@bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint: per-endpoint latency and SQL histograms plus pool and cache stats.
+    """
+    pool_stats = pool.stats()
+    cache_stats = cache.stats()
+    fragment_stats = fragments.stats()
+    writer_stats = writer.stats()
+    event_stats = event_hub.stats()
+    job_stats = services().jobs.stats()
+    # Not through catalog_features, which would build the cache and import NumPy just to report zero
+    features = services()._catalog_features
+    gauges = {
+        'workoutdb_pool_max_size': ("Maximum connections the pool will open.", 'gauge', pool_stats['max_size']),
+        'workoutdb_pool_open': ("Open pooled connections.", 'gauge', pool_stats['open']),
+        'workoutdb_pool_idle': ("Idle pooled connections.", 'gauge', pool_stats['idle']),
+        'workoutdb_pool_in_use': ("Checked-out pooled connections.", 'gauge', pool_stats['in_use']),
+        'workoutdb_pool_checkouts_total': ("Connection checkouts.", 'counter', pool_stats['checkouts']),
+        'workoutdb_pool_waits_total': ("Checkouts that had to wait for a connection.", 'counter',
+                                       pool_stats['waits']),
+        'workoutdb_pool_exhausted_total': ("Checkouts that timed out.", 'counter', pool_stats['exhausted']),
+        'workoutdb_pool_wait_seconds_total': ("Total time spent waiting for a connection.", 'counter',
+                                              pool_stats['wait_time_total']),
+        'workoutdb_pool_wait_seconds_max': ("Longest wait for a connection.", 'gauge', pool_stats['wait_time_max']),
+        'workoutdb_writer_queued': ("Writes waiting for the writer thread.", 'gauge', writer_stats['queued']),
+        'workoutdb_writer_batches_total': ("Committed write batches.", 'counter', writer_stats['batches']),
+        'workoutdb_writer_operations_total': ("Writes applied by the writer thread.", 'counter',
+                                              writer_stats['operations']),
+        'workoutdb_writer_busy_retries_total': ("Batches replayed because the database was locked.", 'counter',
+                                                writer_stats['busy_retries']),
+        'workoutdb_cache_entries': ("Cached responses.", 'gauge', cache_stats['entries']),
+        'workoutdb_cache_bytes': ("Bytes of cached response bodies.", 'gauge', cache_stats['bytes']),
+        'workoutdb_cache_hits_total': ("Response cache hits.", 'counter', cache_stats['hits']),
+        'workoutdb_cache_misses_total': ("Response cache misses.", 'counter', cache_stats['misses']),
+        'workoutdb_fragment_cache_entries': ("Cached page fragments.", 'gauge', fragment_stats['entries']),
+        'workoutdb_fragment_cache_bytes': ("Characters of cached page fragments.", 'gauge', fragment_stats['bytes']),
+        'workoutdb_fragment_cache_hits_total': ("Fragment cache hits.", 'counter', fragment_stats['hits']),
+        'workoutdb_fragment_cache_misses_total': ("Fragment cache misses.", 'counter', fragment_stats['misses']),
+        'workoutdb_id_block_reservations_total': ("Id blocks reserved from Id_Sequence.", 'counter',
+                                                  ids.stats()['reservations']),
+        'workoutdb_generator_catalog_loads_total': ("Exercise catalog loads by the workout generator.", 'counter',
+                                                    features.loads if features else 0),
+        'workoutdb_event_subscribers': ("Open /api/events streams.", 'gauge', event_stats['subscribers']),
+        'workoutdb_events_published_total': ("Row change events published.", 'counter', event_stats['published']),
+        'workoutdb_event_subscribers_dropped_total': ("Event streams dropped as slow consumers.", 'counter',
+                                                      event_stats['dropped']),
+        'workoutdb_schedule_rule_loads_total': ("Schedule rule reloads.", 'counter', schedule_rules.loads),
+        'workoutdb_schedule_rule_expansions_total': ("Schedule rule expansions of a date range.", 'counter',
+                                                     schedule_rules.expansions),
+        'workoutdb_jobs_running': ("Background jobs running in this process.", 'gauge', job_stats['running']),
+        'workoutdb_jobs_succeeded_total': ("Background jobs that succeeded.", 'counter', job_stats['succeeded']),
+        'workoutdb_jobs_failed_total': ("Background jobs that failed for good.", 'counter', job_stats['failed']),
+        'workoutdb_jobs_retried_total': ("Background job attempts that failed and were queued again.", 'counter',
+                                         job_stats['retried']),
+        'workoutdb_jobs_cancelled_total': ("Background jobs cancelled while running.", 'counter',
+                                           job_stats['cancelled']),
+        'workoutdb_jobs_lost_total': ("Jobs taken back from workers that stopped responding.", 'counter',
+                                      job_stats['lost']),
+    }
+    tenants = current_app.extensions.get('workoutdb_tenants')
+    if tenants is not None:
+        tenant_stats = tenants.stats()
+        gauges.update({
+            'workoutdb_tenants_open': ("Tenants with an open pool and writer thread.", 'gauge', tenant_stats['open']),
+            'workoutdb_tenant_opens_total': ("Tenant databases opened.", 'counter', tenant_stats['opened']),
+            'workoutdb_tenant_evictions_total': ("Tenants closed to stay within TENANT_MAX_OPEN.", 'counter',
+                                                 tenant_stats['evictions']),
+        })
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
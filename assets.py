@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are built
+    brotli = None
+
+# Build output inside the static folder, and the manifest mapping source names to hashed names
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Files below this size are not worth a compressed variant
+MIN_COMPRESS_BYTES = 256
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# Hashed names never change content, so clients may keep them for a year without revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Preferred first; each maps an Accept-Encoding token to the file suffix of its variant
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def hashed_name(path, digest):
+    """
+    :param path: Source path relative to the static folder, e.g. 'js/app.js'
+    :param digest: Content hash
+    :return: e.g. 'js/app.3f2a9c1b7d4e.js'
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest[:12]}{ext}"
+
+
+def _compressible(path):
+    mimetype = mimetypes.guess_type(path)[0] or ''
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _write_variants(target, data):
+    # gzip with mtime 0 so rebuilding unchanged sources gives byte-identical output
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    written = []
+    for suffix, compressed in variants.items():
+        # A variant that does not shrink the file is useless; serve the original instead
+        if len(compressed) < len(data):
+            with open(target + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(suffix)
+    return written
+
+
+def build(static_folder):
+    """
+    Copy every static file to static/dist under a content-hashed name, precompress it, and write
+    the manifest that asset URLs are resolved through. The previous build is replaced.
+    :param static_folder: Path of the Flask static folder
+    :return: Manifest dictionary {source path: hashed path}
+    """
+    out_dir = os.path.join(static_folder, BUILD_DIR)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    manifest = {}
+    for directory, subdirs, files in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(static_folder):
+            subdirs[:] = [d for d in subdirs if d != BUILD_DIR]
+        subdirs.sort()
+        for name in sorted(files):
+            source = os.path.join(directory, name)
+            path = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            hashed = hashed_name(path, hashlib.sha256(data).hexdigest())
+            target = os.path.join(out_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            if len(data) >= MIN_COMPRESS_BYTES and _compressible(path):
+                _write_variants(target, data)
+            manifest[path] = hashed
+
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """
+    :return: Manifest of the last build, or an empty dictionary if assets were never built
+    """
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app):
+    """
+    Resolve url_for('static', filename=...) to the hashed build output when a build exists, and
+    serve that output with its precompressed variants and a year-long immutable Cache-Control.
+    Without a build, static files are served as before.
+    """
+    manifest = load_manifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed is not None:
+                values['filename'] = f"{BUILD_DIR}/{hashed}"
+
+    default_static = app.view_functions['static']
+    build_dir = os.path.join(app.static_folder, BUILD_DIR)
+
+    def static(filename):
+        if not filename.startswith(BUILD_DIR + '/'):
+            return default_static(filename=filename)
+        filename = filename[len(BUILD_DIR) + 1:]
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding in request.accept_encodings and os.path.isfile(os.path.join(build_dir, filename + suffix)):
+                response = send_from_directory(build_dir, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(build_dir, filename, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = static
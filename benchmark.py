@@ -0,0 +1,335 @@
+"""
+Per-route benchmark harness using the Flask test client.
+
+Every GET route in app.py is discovered from the URL map and filled in with ids
+sampled from the database; --writes adds scenarios for the mutating routes
+(they modify the database, so point it at a generated copy).
+
+    python datagen.py bench.db --scale medium
+    python benchmark.py bench.db --output before.json
+    python benchmark.py bench.db --output after.json --compare before.json
+
+Each run also times `import app` and create_app() in fresh interpreters and fails if the import
+exceeds --import-budget-ms.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+# Path parameters that cannot be sampled from the database
+STATIC_VALUES = {
+    'entity': 'exercises',
+    'action': 'add',
+}
+
+# Longest `import app` may take in a fresh interpreter (median); most of it is Flask itself
+DEFAULT_IMPORT_BUDGET_MS = 500
+
+# Extra GET variants worth tracking on their own (label -> URL builder)
+EXTRA_GET_CASES = {
+    'GET /api/exercises filtered': lambda s: '/api/exercises?muscle_group=Chest&intensity=Vigorous&sort=rating&direction=desc',
+    'GET /api/exercises min_rating+limit': lambda s: '/api/exercises?min_rating=8&limit=200',
+    'GET /api/workouts page': lambda s: '/api/workouts?limit=50',
+    'GET /api/workouts stream': lambda s: '/api/workouts?stream=1&limit=500',
+    'GET /api/schedule month': lambda s: f"/api/schedule?from={s['month_start']}&to={s['month_end']}",
+    'GET /api/schedule year': lambda s: f"/api/schedule?from={s['year_start']}&to={s['year_end']}",
+    'GET /api/export/exercises ndjson': lambda s: '/api/export/exercises?format=ndjson',
+}
+
+# Routes skipped by default because they return the whole table on every call
+SLOW_ENDPOINTS = {'main.export_entity'}
+
+
+def _write_cases(sample, rng):
+    """
+    Scenarios for mutating routes: label -> function(i) returning (method, url, request kwargs).
+    """
+    workout_ids = sample['workout_ids']
+    exercise_ids = sample['exercise_ids']
+    detail_ids = sample['detail_ids']
+    day_ids = sample['day_ids']
+    return {
+        'POST /api/workouts': lambda i: ('POST', '/api/workouts', {'json': {
+            'name': f'Bench workout {i}', 'intensity': 'Moderate', 'focus': 'Strength Training'}}),
+        'PUT /api/workouts/<id>': lambda i: ('PUT', f'/api/workouts/{rng.choice(workout_ids)}', {'json': {
+            'name': f'Renamed {i}', 'focus': 'Bodybuilding', 'intensity': 'Vigorous', 'rating': 7}}),
+        'POST /api/workouts/<id>/exercises': lambda i: ('POST', f'/api/workouts/{rng.choice(workout_ids)}/exercises', {
+            'json': {'add': rng.sample(exercise_ids, min(5, len(exercise_ids))),
+                     'remove': rng.sample(exercise_ids, min(5, len(exercise_ids)))}}),
+        'POST /api/workout-to-day/<day>/<workout>': lambda i: (
+            'POST', f'/api/workout-to-day/{rng.choice(day_ids)}/{rng.choice(workout_ids)}', {}),
+        'POST /update-exercise/<id>': lambda i: ('POST', f'/update-exercise/{rng.choice(detail_ids)}', {'data': {
+            'description': f'Updated {i}', 'equipment_needed': 'Dumbbells', 'weight': 20, 'intensity': 'Moderate',
+            'rating': 6, 'sets': 3, 'reps': 10}}),
+        'POST /add-exercise': lambda i: ('POST', '/add-exercise', {'data': {
+            'name': f'Bench exercise {i}', 'muscle_group': 'Arms', 'intensity': 'Light', 'rating': 5}}),
+        'POST /api/days': lambda i: ('POST', '/api/days', {'json': {
+            'date': (datetime.date(2000, 1, 1) + datetime.timedelta(days=i)).isoformat()}}),
+    }
+
+
+def sample_database(db_path, size=200, seed=7):
+    """
+    Pick existing ids and date ranges to fill in route parameters.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+
+    def ids(sql):
+        values = [row[0] for row in conn.execute(sql)]
+        return rng.sample(values, min(size, len(values))) if values else [1]
+
+    sample = {
+        'workout_ids': ids("SELECT workout_id FROM Workout"),
+        'exercise_ids': ids("SELECT exercise_id FROM Exercise"),
+        'detail_ids': ids("SELECT exercise_detail_id FROM Exercise_Detail"),
+        'day_ids': ids("SELECT day_id FROM Day"),
+    }
+    last_date = conn.execute("SELECT MAX(date) FROM Day").fetchone()[0]
+    end = datetime.date.fromisoformat(last_date) if last_date else datetime.date.today()
+    sample['month_start'] = end.replace(day=1).isoformat()
+    sample['month_end'] = end.isoformat()
+    sample['year_start'] = (end - datetime.timedelta(days=364)).isoformat()
+    sample['year_end'] = end.isoformat()
+    sample['table_sizes'] = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('Exercise', 'Exercise_Detail', 'Workout', 'Exercise_In_Workout', 'Day', 'Workout_On_Day')
+    }
+    conn.close()
+    return sample
+
+
+def discover_get_cases(flask_app, sample, rng, include_slow=False):
+    """
+    One case per GET route; path parameters are drawn from the sample on every call.
+    :return: (cases, skipped) where cases maps label -> function(i) returning (method, url, kwargs)
+    """
+    pools = {
+        'workout_id': sample['workout_ids'],
+        'exercise_id': sample['exercise_ids'],
+        'day_id': sample['day_ids'],
+        'dayId': sample['day_ids'],
+    }
+    cases = {}
+    skipped = []
+    for rule in flask_app.url_map.iter_rules():
+        if rule.endpoint == 'static' or 'GET' not in rule.methods:
+            continue
+        if rule.endpoint in SLOW_ENDPOINTS and not include_slow:
+            skipped.append(f"{rule.rule} (slow, use --include-slow)")
+            continue
+        missing = [arg for arg in rule.arguments if arg not in pools and arg not in STATIC_VALUES]
+        if missing:
+            skipped.append(f"{rule.rule} (no value for {', '.join(missing)})")
+            continue
+
+        def build(i, rule=rule):
+            values = {arg: STATIC_VALUES[arg] if arg in STATIC_VALUES else rng.choice(pools[arg])
+                      for arg in rule.arguments}
+            with flask_app.test_request_context():
+                path = flask_app.url_map.bind('localhost').build(rule.endpoint, values, method='GET')
+            return 'GET', path, {}
+        cases[f"GET {rule.rule}"] = build
+
+    for label, make_url in EXTRA_GET_CASES.items():
+        cases[label] = lambda i, make_url=make_url: ('GET', make_url(sample), {})
+    return cases, skipped
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_case(client, build, iterations, warmup):
+    for i in range(warmup):
+        method, url, kwargs = build(i)
+        client.open(url, method=method, **kwargs).get_data()
+
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    for i in range(iterations):
+        method, url, kwargs = build(warmup + i)
+        t0 = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()  # include streamed bodies in the timing
+        latencies.append(time.perf_counter() - t0)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda v: round(v * 1000, 3)
+    return {
+        'iterations': iterations,
+        'throughput_rps': round(iterations / total, 2) if total else None,
+        'mean_ms': to_ms(sum(latencies) / len(latencies)),
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'max_ms': to_ms(latencies[-1]),
+        'statuses': statuses,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Print p50/p95 changes against a baseline run.
+    :return: List of case labels whose p95 regressed by more than the threshold
+    """
+    regressions = []
+    print(f"\n{'case':<60} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} {'p95 after':>10}")
+    for label, result in current['results'].items():
+        before = baseline.get('results', {}).get(label)
+        if before is None:
+            continue
+        flag = ''
+        if before['p95_ms'] and result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            flag = '  REGRESSION'
+            regressions.append(label)
+        print(f"{label[:60]:<60} {before['p50_ms']:>11} {result['p50_ms']:>10} "
+              f"{before['p95_ms']:>11} {result['p95_ms']:>10}{flag}")
+    return regressions
+
+
+# Run in a fresh interpreter, as a worker process starts: import the app module, then build an app
+STARTUP_SNIPPET = '''
+import sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app({'DATABASE': sys.argv[1]})
+print(imported - start, time.perf_counter() - imported)
+'''
+
+
+def measure_startup(database, runs):
+    """
+    Time `import app` and create_app() in fresh interpreters. Neither may touch the database or start
+    threads, so both should stay flat as the data grows.
+    :return: {'import_ms': median, 'create_app_ms': median}
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    imports, creates = [], []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', STARTUP_SNIPPET, database], cwd=here, text=True)
+        imported, created = map(float, output.split())
+        imports.append(imported)
+        creates.append(created)
+    to_ms = lambda v: round(v * 1000, 3)
+    return {'import_ms': to_ms(percentile(sorted(imports), 50)),
+            'create_app_ms': to_ms(percentile(sorted(creates), 50))}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every route of the workout app.")
+    parser.add_argument('database', help="SQLite database to run against (see datagen.py)")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--routes', help="Only run cases whose label contains this text")
+    parser.add_argument('--cache', action='store_true', help="Keep the response cache on (off by default)")
+    parser.add_argument('--writes', action='store_true', help="Also run write scenarios (modifies the database)")
+    parser.add_argument('--include-slow', action='store_true', help="Include full-table export routes")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Allowed p95 slowdown against the baseline before failing (default 0.2 = 20%%)")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--verbose', action='store_true', help="Show the app's error log while running")
+    parser.add_argument('--startup-runs', type=int, default=5, help="Fresh interpreters timed for startup")
+    parser.add_argument('--import-budget-ms', type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        help="Fail if the median `import app` takes longer (default %(default)s ms; 0 disables)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        parser.error(f"{args.database} does not exist; create it with datagen.py")
+
+    startup = measure_startup(args.database, args.startup_runs)
+    print(f"startup: import app {startup['import_ms']}ms, create_app() {startup['create_app_ms']}ms")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+
+    flask_app = app_module.create_app({'DATABASE': args.database, 'RESPONSE_CACHE': args.cache})
+    if not args.verbose:
+        # Routes that fail on every call would otherwise flood the output with tracebacks
+        flask_app.logger.setLevel(logging.CRITICAL)
+    client = flask_app.test_client()
+    client.get('/api/db-pool-stats')  # run pending migrations before timing anything
+
+    rng = random.Random(args.seed)
+    sample = sample_database(args.database, seed=args.seed)
+    cases, skipped = discover_get_cases(flask_app, sample, rng, args.include_slow)
+    if args.writes:
+        cases.update(_write_cases(sample, rng))
+    if args.routes:
+        cases = {label: build for label, build in cases.items() if args.routes in label}
+
+    results = {}
+    for label, build in cases.items():
+        results[label] = run_case(client, build, args.iterations, args.warmup)
+        r = results[label]
+        print(f"{label[:60]:<60} p50 {r['p50_ms']:>9.3f}ms  p95 {r['p95_ms']:>9.3f}ms  "
+              f"p99 {r['p99_ms']:>9.3f}ms  {r['throughput_rps']:>9.1f} req/s  {r['statuses']}")
+    for note in skipped:
+        print(f"skipped {note}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'database': os.path.abspath(args.database),
+            'table_sizes': sample['table_sizes'],
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'cache': args.cache,
+            'pool': flask_app.extensions['workoutdb'].pool.stats(),
+            'startup': startup,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    failed = False
+    if args.import_budget_ms and startup['import_ms'] > args.import_budget_ms:
+        print(f"\nimport app took {startup['import_ms']}ms, over the {args.import_budget_ms:g}ms budget")
+        failed = True
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+import csv
+import io
+import json
+import sqlite3
+
+from id_allocator import SEQUENCES
+
+# Importable/exportable entities: name -> (table, columns, primary key columns)
+ENTITIES = {
+    'exercises': ('Exercise', ('exercise_id', 'name', 'exercise_detail_id', 'rating', 'intensity',
+                               'muscle_group', 'description'), ('exercise_id',)),
+    'exercise-details': ('Exercise_Detail', ('exercise_detail_id', 'description', 'equipment_needed', 'weight',
+                                             'intensity', 'rating', 'sets', 'reps'), ('exercise_detail_id',)),
+    'workouts': ('Workout', ('workout_id', 'name', 'description', 'rating', 'focus', 'intensity'), ('workout_id',)),
+    'workout-exercises': ('Exercise_In_Workout', ('exercise_id', 'workout_id'), ('exercise_id', 'workout_id')),
+    'days': ('Day', ('day_id', 'date', 'note'), ('day_id',)),
+    'schedule': ('Workout_On_Day', ('workout_on_day_id', 'workout_id', 'day_id'), ('workout_on_day_id',)),
+}
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 500
+# Per-row errors kept in an import report; the failed count is always exact
+MAX_REPORTED_ERRORS = 1000
+
+
+class BulkIOError(ValueError):
+    """
+    Raised for an unknown entity or format, or an unreadable input stream.
+    """
+
+
+def get_entity(name):
+    if name not in ENTITIES:
+        raise BulkIOError(f"Unknown entity '{name}'; expected one of {', '.join(ENTITIES)}")
+    return ENTITIES[name]
+
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise BulkIOError(f"Unknown format '{fmt}'; expected one of {', '.join(FORMATS)}")
+    return fmt
+
+
+# -- export ------------------------------------------------------------------
+
+def iter_export(conn, entity, fmt):
+    """
+    Stream an entity as CSV or NDJSON straight from a cursor.
+    :param conn: Open SQLite connection
+    :param entity: Key of ENTITIES
+    :param fmt: 'csv' or 'ndjson'
+    :return: Generator of text chunks
+    """
+    table, columns, pk = get_entity(entity)
+    check_format(fmt)
+    cur = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {', '.join(pk)}")
+    if fmt == 'csv':
+        return _iter_csv(columns, cur)
+    return _iter_ndjson(columns, cur)
+
+
+def _iter_csv(columns, rows, rows_per_chunk=256):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(tuple(row))
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _iter_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, tuple(row)))) + '\n'
+
+
+# -- import ------------------------------------------------------------------
+
+def read_records(stream, fmt):
+    """
+    Parse CSV (with a header row) or NDJSON from a text stream, one record at a time.
+    :param stream: Text file-like object
+    :param fmt: 'csv' or 'ndjson'
+    :return: Generator of (line_number, dict) pairs; malformed NDJSON lines yield (line_number, error)
+    """
+    check_format(fmt)
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # Empty cells become NULL rather than empty strings
+            yield reader.line_num, {k: (v if v != '' else None) for k, v in record.items() if k is not None}
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, BulkIOError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, BulkIOError("Each line must be a JSON object")
+                continue
+            yield line_number, record
+
+
+def _upsert_sql(table, columns, pk):
+    placeholders = ', '.join(f':{c}' for c in columns)
+    updates = [c for c in columns if c not in pk]
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT ({', '.join(pk)}) DO "
+    if updates:
+        sql += "UPDATE SET " + ', '.join(f"{c} = excluded.{c}" for c in updates)
+    else:
+        sql += "NOTHING"
+    return sql
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def import_records(run, entity, records, chunk_size=DEFAULT_CHUNK_SIZE, next_id=None, report=None):
+    """
+    Upsert records in chunks, one transaction per chunk.
+    Each chunk is tried with a single executemany; if a row violates a constraint the chunk is
+    replayed row by row so only the offending rows are rejected and reported.
+    Rows whose primary key already exists are updated, or skipped when the entity has no other columns
+    (workout-exercises); columns missing from a record are stored as NULL.
+    For tables whose ids come from the id allocator (workouts, days), a new row must either leave its id
+    empty or use one above every id reserved so far; the reservation is then moved past it.
+    :param run: Callable run(fn, *args) that applies fn(conn, *args) in a transaction and returns its
+                result, e.g. WriteQueue.run
+    :param entity: Key of ENTITIES
+    :param records: Iterable of (line_number, dict) pairs as produced by read_records()
+    :param chunk_size: Rows per transaction
+    :param next_id: Callable (sequence name) -> new id, e.g. IdAllocator.next_id, for allocator-backed rows
+                    without an id; without it SQLite assigns one, which may collide with reserved ids
+    :param report: Optional ImportReport to fill in, so the caller still has the committed chunks' counts
+                   if the import stops with an error
+    :return: ImportReport
+    """
+    table, columns, pk = get_entity(entity)
+    sql = _upsert_sql(table, columns, pk)
+    sequence = SEQUENCES.get(table)
+    if report is None:
+        report = ImportReport()
+
+    def flush(chunk):
+        # The chunk may be replayed (e.g. on a busy retry), so it reports its outcome rather than
+        # updating the shared report itself
+        imported, errors = run(_import_chunk, sql, chunk, table if sequence else None, assigned)
+        report.imported += imported
+        report.skipped += len(chunk) - imported - len(errors)
+        for line_number, message in errors:
+            report.add_error(line_number, message)
+
+    chunk = []
+    assigned = set()  # Lines of the chunk whose id came from next_id
+    for line_number, record in records:
+        report.processed += 1
+        if isinstance(record, Exception):
+            report.add_error(line_number, str(record))
+            continue
+        params = {c: record.get(c) for c in columns}
+        if sequence and next_id is not None and params[sequence] is None:
+            params[sequence] = next_id(table)
+            assigned.add(line_number)
+        chunk.append((line_number, params))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+            assigned = set()
+    if chunk:
+        flush(chunk)
+    return report
+
+
+def _reserved_id_errors(conn, table, chunk, assigned):
+    # New rows with an id below Id_Sequence.next_id could take one the allocator has already handed out
+    column = SEQUENCES[table]
+    reserved = conn.execute("SELECT next_id FROM Id_Sequence WHERE name = ?", (table,)).fetchone()[0]
+    below = {}
+    for line_number, params in chunk:
+        if line_number in assigned:
+            continue
+        try:
+            value = int(params[column])
+        except (TypeError, ValueError):
+            continue
+        if value < reserved:
+            below.setdefault(value, []).append(line_number)
+    if not below:
+        return {}
+    existing = set()
+    values = list(below)
+    for i in range(0, len(values), 500):
+        part = values[i:i + 500]
+        existing.update(row[0] for row in conn.execute(
+            f"SELECT {column} FROM {table} WHERE {column} IN ({', '.join('?' * len(part))})", part))
+    return {line_number: f"{column} {value} is reserved for new rows; leave it empty to be assigned an id"
+            for value, lines in below.items() if value not in existing for line_number in lines}
+
+
+def _import_chunk(conn, sql, chunk, sequence_table=None, assigned=frozenset()):
+    errors = []
+    if sequence_table is not None:
+        rejected = _reserved_id_errors(conn, sequence_table, chunk, assigned)
+        if rejected:
+            errors.extend(sorted(rejected.items()))
+            chunk = [(line_number, params) for line_number, params in chunk if line_number not in rejected]
+    imported, row_errors = _write_chunk(conn, sql, chunk)
+    if sequence_table is not None:
+        # Ids imported above the reservation move it, so later blocks start past them
+        column = SEQUENCES[sequence_table]
+        conn.execute(
+            f"UPDATE Id_Sequence SET next_id = MAX(next_id, (SELECT COALESCE(MAX({column}), 0) + 1 "
+            f"FROM {sequence_table})) WHERE name = ?", (sequence_table,)
+        )
+    return imported, sorted(errors + row_errors)
+
+
+def _write_chunk(conn, sql, chunk):
+    conn.execute("SAVEPOINT bulk_chunk")
+    try:
+        # rowcount leaves out the rows an ON CONFLICT DO NOTHING skipped
+        imported = conn.executemany(sql, [params for _, params in chunk]).rowcount
+        conn.execute("RELEASE bulk_chunk")
+        return imported, []
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO bulk_chunk")
+        conn.execute("RELEASE bulk_chunk")
+
+    imported, errors = 0, []
+    for line_number, params in chunk:
+        conn.execute("SAVEPOINT bulk_row")
+        try:
+            imported += conn.execute(sql, params).rowcount
+            conn.execute("RELEASE bulk_row")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK TO bulk_row")
+            conn.execute("RELEASE bulk_row")
+            errors.append((line_number, str(e)))
+    return imported, errors
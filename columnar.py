@@ -0,0 +1,123 @@
+import sqlite3
+from operator import attrgetter, itemgetter
+
+from repository import Record
+
+# Accept header value (or ?format=columnar) selecting this encoding
+MEDIA_TYPE = 'application/vnd.workoutdb.columnar+json'
+
+# Low-cardinality string columns sent as a dictionary plus integer codes
+DICTIONARY_COLUMNS = frozenset({
+    'muscle_group', 'intensity', 'focus', 'equipment_needed', 'detail_intensity',
+    'details.intensity', 'details.equipment_needed',
+})
+
+
+class ColumnarError(ValueError):
+    """
+    Raised for an unknown ?format= value.
+    """
+
+
+def requested(req):
+    """
+    Whether a request asked for the columnar encoding, by ?format= or by Accept.
+    :param req: flask.Request
+    :return: bool
+    """
+    fmt = req.args.get('format')
+    if fmt is not None:
+        if fmt not in ('json', 'columnar'):
+            raise ColumnarError(f"Invalid format '{fmt}'; expected json or columnar")
+        return fmt == 'columnar'
+    # Only an explicit mention counts; browsers send */* and must keep getting plain JSON
+    accept = req.accept_mimetypes
+    quality = max((q for value, q in accept if value == MEDIA_TYPE), default=0)
+    return quality > 0 and quality >= accept.quality('application/json')
+
+
+def _paths(row, nested, prefix=()):
+    # Leaf key paths of a dict row in key order; nested dicts are flattened, child lists skipped
+    paths = []
+    for key, value in row.items():
+        if not prefix and key in nested:
+            continue
+        if isinstance(value, dict):
+            paths.extend(_paths(value, nested, prefix + (key,)))
+        else:
+            paths.append(prefix + (key,))
+    return paths
+
+
+def _dict_getter(paths):
+    if all(len(path) == 1 for path in paths):
+        keys = [path[0] for path in paths]
+        getter = itemgetter(*keys)
+        return getter if len(keys) > 1 else (lambda row: (getter(row),))
+
+    def get(row):
+        values = []
+        for path in paths:
+            value = row
+            for key in path:
+                value = value.get(key) if value is not None else None
+            values.append(value)
+        return values
+    return get
+
+
+def _reader(first, nested):
+    """
+    :return: (column names, function returning a row's values in column order)
+    """
+    if isinstance(first, Record):
+        columns = list(first.keys())
+        getter = attrgetter(*columns)
+        return columns, getter if len(columns) > 1 else (lambda row: (getter(row),))
+    if isinstance(first, sqlite3.Row):
+        return list(first.keys()), tuple
+    paths = _paths(first, nested)
+    return ['.'.join(path) for path in paths], _dict_getter(paths)
+
+
+def _dictionary_encode(values):
+    index = {}
+    codes = [None if value is None else index.setdefault(value, len(index)) for value in values]
+    return list(index), codes
+
+
+def encode(rows, nested=()):
+    """
+    Encode a list of rows column by column:
+      {"count": n, "columns": [name, ...], "values": [[column 0 values], ...],
+       "dictionaries": {name: [distinct values]}, "children": {key: {..., "offsets": [...]}}}
+    Columns named in DICTIONARY_COLUMNS carry integer codes into their dictionary instead of strings.
+    Nested dicts are flattened into dotted column names. Each key in `nested` holds a list of child
+    rows, encoded the same way; the children of row i are entries offsets[i] to offsets[i + 1].
+    :param rows: Iterable of dicts, sqlite3.Row or repository records, all with the same columns
+    :param nested: Keys of dict rows holding child lists, e.g. ('exercises',)
+    :return: JSON-serializable dict
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    result = {'count': len(rows), 'columns': [], 'values': [], 'dictionaries': {}}
+    if rows:
+        columns, get = _reader(rows[0], nested)
+        values = [list(column) for column in zip(*map(get, rows))] or [[] for _ in columns]
+        for i, name in enumerate(columns):
+            if name in DICTIONARY_COLUMNS:
+                result['dictionaries'][name], values[i] = _dictionary_encode(values[i])
+        result['columns'] = columns
+        result['values'] = values
+
+    if nested:
+        result['children'] = {}
+        for key in nested:
+            offsets = [0]
+            children = []
+            for row in rows:
+                children.extend(row[key])
+                offsets.append(len(children))
+            child = encode(children)
+            child['offsets'] = offsets
+            result['children'][key] = child
+    return result
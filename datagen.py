@@ -0,0 +1,214 @@
+"""
+Synthetic data generator for load testing.
+
+Builds a database from create-tables.sql plus the migrations, then adds
+generated exercises, details, workouts, links, days and schedule entries.
+
+    python datagen.py bench.db --scale large
+    python datagen.py bench.db --exercises 20000 --workouts 5000 --links 200000 --years 2
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import time
+
+from id_allocator import reserve_block
+from migrations import migrate
+from analytics import rebuild_aggregates
+from search import rebuild_index
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create-tables.sql')
+
+MUSCLE_GROUPS = ('Chest', 'Back', 'Shoulders', 'Arms', 'Abdominals', 'Lower Back', 'Hips', 'Thighs', 'Legs',
+                 'Adductors and Abductors')
+INTENSITIES = ('Light', 'Moderate', 'Vigorous')
+FOCUSES = ('Strength Training', 'Cardiovascular Health', 'Weight Loss', 'Flexibility', 'Balance and Coordination',
+           'Endurance Training', 'High-Intensity Interval Training (HIIT)', 'Muscle Toning', 'Core Strengthening',
+           'Functional Fitness', 'Rehabilitation and Recovery', 'Sports Specific Training', 'Bodybuilding',
+           'Circuit Training', 'Mind-Body Wellness')
+EQUIPMENT = ('None', 'Barbell', 'Dumbbells', 'Kettlebell', 'Cable machine', 'Bench and barbell', 'Leg press machine',
+             'Parallel bars', 'Resistance band', 'Pull-up bar', 'Medicine ball', 'Rowing machine')
+MOVEMENTS = ('Press', 'Curl', 'Row', 'Squat', 'Lunge', 'Raise', 'Pulldown', 'Extension', 'Fly', 'Deadlift',
+             'Bridge', 'Plank', 'Crunch', 'Twist', 'Step-up', 'Swing', 'Dip', 'Shrug')
+MODIFIERS = ('Incline', 'Decline', 'Seated', 'Standing', 'Single-arm', 'Wide-grip', 'Close-grip', 'Paused',
+             'Tempo', 'Alternating', 'Reverse', 'Sumo', 'Bulgarian', 'Isometric')
+
+# Named sizes; "large" is the target production-scale catalog
+SCALES = {
+    'small': {'exercises': 1000, 'workouts': 500, 'links': 10000, 'years': 1},
+    'medium': {'exercises': 10000, 'workouts': 5000, 'links': 100000, 'years': 3},
+    'large': {'exercises': 100000, 'workouts': 50000, 'links': 1000000, 'years': 10},
+}
+
+CHUNK_SIZE = 10000
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(conn, sql, rows):
+    count = 0
+    for chunk in _chunks(rows):
+        conn.executemany(sql, chunk)
+        count += len(chunk)
+    return count
+
+
+def _next_id(conn, table, column):
+    return (conn.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}").fetchone()[0] or 0) + 1
+
+
+def generate(db_path, exercises, workouts, links, years, seed=42, start_date=None):
+    """
+    Populate a database with synthetic rows.
+    :param db_path: SQLite file to create or extend
+    :param exercises: Number of exercises (each gets its own Exercise_Detail)
+    :param workouts: Number of workouts
+    :param links: Number of Exercise_In_Workout rows, spread evenly over the workouts
+    :param years: Years of consecutive Day rows ending at start_date + years
+    :param seed: Random seed, so runs are reproducible
+    :param start_date: First generated day (defaults to `years` years before today)
+    :return: Dictionary of row counts inserted per table
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    migrate(conn, SCHEMA_FILE)
+
+    # Bulk load settings; the connection pool restores WAL/NORMAL on its own connections
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA foreign_keys=OFF")
+
+    derived_triggers = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND (name LIKE 'trg_%_fts' OR name LIKE 'trg_%_agg')"
+    ).fetchall()
+
+    counts = {}
+    with conn:
+        # Per-row maintenance of the full-text index and the volume aggregates dominates a bulk load;
+        # drop those triggers and rebuild both once at the end instead. The drop happens inside the
+        # load transaction, so a failed load rolls it back and the triggers are never lost.
+        conn.execute("BEGIN")
+        for name, _ in derived_triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+
+        first_detail = _next_id(conn, 'Exercise_Detail', 'exercise_detail_id')
+        first_exercise = _next_id(conn, 'Exercise', 'exercise_id')
+        # Workout and Day ids are reserved from Id_Sequence like the app's, so a running app never hands them out
+        days = int(round(years * 365.25))
+        first_workout = reserve_block(conn, 'Workout', workouts)
+        first_day = reserve_block(conn, 'Day', days)
+
+        def details():
+            for i in range(exercises):
+                intensity = rng.choice(INTENSITIES)
+                yield (first_detail + i, f"Generated detail {i}", rng.choice(EQUIPMENT),
+                       rng.choice((None, rng.randint(2, 150))), intensity, rng.randint(1, 10),
+                       rng.randint(1, 6), rng.randint(1, 20))
+        counts['Exercise_Detail'] = _insert(conn, """
+            INSERT INTO Exercise_Detail (exercise_detail_id, description, equipment_needed, weight, intensity,
+                                         rating, sets, reps)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, details())
+
+        def exercise_rows():
+            for i in range(exercises):
+                name = f"{rng.choice(MODIFIERS)} {rng.choice(MOVEMENTS)} {i}"
+                group = rng.choice(MUSCLE_GROUPS)
+                yield (first_exercise + i, name, first_detail + i, rng.randint(1, 10), rng.choice(INTENSITIES),
+                       group, f"{name} targeting the {group.lower()}")
+        counts['Exercise'] = _insert(conn, """
+            INSERT INTO Exercise (exercise_id, name, exercise_detail_id, rating, intensity, muscle_group, description)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, exercise_rows())
+
+        def workout_rows():
+            for i in range(workouts):
+                focus = rng.choice(FOCUSES)
+                yield (first_workout + i, f"{focus} #{i}", f"Generated {focus.lower()} session",
+                       rng.randint(1, 10), focus, rng.choice(INTENSITIES))
+        counts['Workout'] = _insert(conn, """
+            INSERT INTO Workout (workout_id, name, description, rating, focus, intensity)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, workout_rows())
+
+        def link_rows():
+            if not workouts or not exercises:
+                return
+            per_workout, extra = divmod(links, workouts)
+            for i in range(workouts):
+                k = min(exercises, per_workout + (1 if i < extra else 0))
+                for offset in rng.sample(range(exercises), k):
+                    yield (first_exercise + offset, first_workout + i)
+        counts['Exercise_In_Workout'] = _insert(conn, """
+            INSERT OR IGNORE INTO Exercise_In_Workout (exercise_id, workout_id) VALUES (?, ?)
+        """, link_rows())
+
+        if start_date is None:
+            start_date = datetime.date.today() - datetime.timedelta(days=days)
+
+        def day_rows():
+            for i in range(days):
+                yield (first_day + i, (start_date + datetime.timedelta(days=i)).isoformat(),
+                       rng.choice((None, None, None, 'Rest day', 'Felt strong', 'Deload')))
+        counts['Day'] = _insert(conn, "INSERT INTO Day (day_id, date, note) VALUES (?, ?, ?)", day_rows())
+
+        def schedule_rows():
+            if not workouts:
+                return
+            for i in range(days):
+                # Most days have one workout, some none, some two
+                for _ in range(rng.choice((0, 1, 1, 1, 2))):
+                    yield (first_workout + rng.randrange(workouts), first_day + i)
+        counts['Workout_On_Day'] = _insert(conn, """
+            INSERT INTO Workout_On_Day (workout_id, day_id) VALUES (?, ?)
+        """, schedule_rows())
+
+        for _, sql in derived_triggers:
+            conn.execute(sql)
+    if derived_triggers:
+        rebuild_index(conn)
+        rebuild_aggregates(conn)
+
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic workout database for benchmarking.")
+    parser.add_argument('database', help="SQLite file to create or extend")
+    parser.add_argument('--scale', choices=SCALES, default='small', help="Preset sizes (default: small)")
+    parser.add_argument('--exercises', type=int, help="Override the number of exercises")
+    parser.add_argument('--workouts', type=int, help="Override the number of workouts")
+    parser.add_argument('--links', type=int, help="Override the number of exercise-to-workout links")
+    parser.add_argument('--years', type=float, help="Override the years of Day rows")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+
+    started = time.perf_counter()
+    counts = generate(args.database, seed=args.seed, **sizes)
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f"{table:<22} {count:>10,}")
+    print(f"Generated in {elapsed:.1f}s -> {args.database}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolExhaustedError(sqlite3.OperationalError):
+    """
+    Raised when no connection could be checked out of the pool before the timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections with per-thread affinity.
+
+    Every connection is configured once when it is opened (WAL, synchronous,
+    busy timeout, foreign keys, mmap and page cache) and is then reused across
+    requests instead of reconnecting each time.
+    """
+
+    def __init__(self, database, max_size=8, timeout=5.0, busy_timeout_ms=5000,
+                 mmap_size=256 * 1024 * 1024, cache_size_kib=16 * 1024, factory=sqlite3.Connection,
+                 cached_statements=256):
+        """
+        :param database: Path to the SQLite database file
+        :param max_size: Maximum number of connections the pool will open
+        :param timeout: Seconds to wait for a free connection before giving up
+        :param busy_timeout_ms: SQLite busy_timeout applied to every connection
+        :param mmap_size: Bytes of the database file to memory-map
+        :param cache_size_kib: Page cache size per connection, in KiB
+        :param factory: sqlite3.Connection subclass used for new connections
+        :param cached_statements: Compiled statements kept per connection; large enough that the
+                                  repository's named statements are never recompiled
+        """
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.factory = factory
+        self.cached_statements = cached_statements
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []
+        self._all = set()
+        self._local = threading.local()
+        self._closed = False
+
+        # Counters exposed through stats()
+        self._checkouts = 0
+        self._affinity_hits = 0
+        self._waits = 0
+        self._exhausted = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def connect(self):
+        """
+        Open a new connection configured like the pooled ones; the pool does not track it.
+        """
+        # Connections may be handed to another thread once released, so the
+        # same-thread check is disabled; the pool guarantees exclusive use.
+        conn = sqlite3.connect(self.database, timeout=self.busy_timeout_ms / 1000.0,
+                               check_same_thread=False, factory=self.factory,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        # A negative cache_size is interpreted by SQLite as KiB rather than pages
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        return conn
+
+    def _take_idle(self):
+        # Prefer the connection this thread used last so its page cache stays warm
+        preferred = getattr(self._local, 'conn', None)
+        if preferred is not None and preferred in self._idle:
+            self._idle.remove(preferred)
+            self._affinity_hits += 1
+            return preferred
+        if self._idle:
+            return self._idle.pop()
+        return None
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, opening a new one if the pool is not full.
+        :return: A configured sqlite3.Connection owned by the caller until release()
+        """
+        start = time.perf_counter()
+        waited = False
+        with self._available:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Cannot check out of a closed pool")
+                conn = self._take_idle()
+                if conn is not None:
+                    break
+                if len(self._all) < self.max_size:
+                    conn = self.connect()
+                    self._all.add(conn)
+                    break
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._available.wait(remaining):
+                    if not self._idle:
+                        self._exhausted += 1
+                        raise PoolExhaustedError(
+                            f"No database connection available after {self.timeout}s")
+
+            elapsed = time.perf_counter() - start
+            self._checkouts += 1
+            self._wait_time_total += elapsed
+            self._wait_time_max = max(self._wait_time_max, elapsed)
+
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn):
+        """
+        Return a connection to the pool, rolling back anything left uncommitted.
+        :param conn: Connection previously returned by acquire()
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped rather than handed to the next caller
+            with self._available:
+                self._all.discard(conn)
+                self._available.notify()
+            conn.close()
+            return
+
+        with self._available:
+            keep = not self._closed and conn in self._all
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._all.discard(conn)
+            self._available.notify()
+        if not keep:
+            # The pool was closed while this connection was checked out
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager wrapping acquire()/release().
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """
+        Snapshot of the pool counters.
+        :return: Dictionary of pool size, checkout and wait statistics
+        """
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open': len(self._all),
+                'idle': len(self._idle),
+                'in_use': len(self._all) - len(self._idle),
+                'checkouts': self._checkouts,
+                'affinity_hits': self._affinity_hits,
+                'waits': self._waits,
+                'exhausted': self._exhausted,
+                'wait_time_total': self._wait_time_total,
+                'wait_time_max': self._wait_time_max,
+            }
+
+    def close_all(self):
+        """
+        Close every idle connection and mark the pool closed; connections still checked out
+        are closed when they are released.
+        """
+        with self._available:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+            self._all.difference_update(self._idle)
+            self._idle.clear()
+            # Wake waiting acquirers so they fail instead of opening new connections
+            self._available.notify_all()
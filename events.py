@@ -0,0 +1,285 @@
+import json
+import secrets
+import threading
+from collections import deque
+
+# Tables whose row changes are published; each is also the topic clients subscribe to
+PUBLISHED_TABLES = (
+    'Exercise', 'Exercise_Detail', 'Exercise_In_Workout', 'Exercise_With_Detail',
+    'Workout', 'Day', 'Workout_On_Day', 'Schedule_Rule', 'Schedule_Rule_Exception',
+)
+
+# A transaction changing more rows than this publishes one 'reset' event per table instead of every row
+MAX_ROWS_PER_COMMIT = 1000
+
+# Seconds between keep-alive comments on an idle stream; they also reveal disconnected clients
+HEARTBEAT_SECONDS = 15
+
+
+class EventError(ValueError):
+    """
+    Raised for an invalid subscription.
+    """
+
+
+class HubFullError(EventError):
+    """
+    Raised when the hub already has as many subscribers as it accepts.
+    """
+
+
+def format_event(event, data, event_id=None):
+    """
+    One Server-Sent Events message.
+    :param event: Event type
+    :param data: JSON-serializable payload
+    :param event_id: Optional id the client sends back as Last-Event-ID when it reconnects
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class ChangeCapture:
+    """
+    Records row changes made on the writer connection. TEMP triggers on every published table copy the
+    key and new values of each changed row into a temporary table, so a change is captured whichever
+    route made it, and a write rolled back to its savepoint takes its captured rows with it. collect()
+    reads and clears them just before the batch commits.
+    The triggers only record while `active()` is true, i.e. while someone is subscribed.
+    """
+
+    def __init__(self, active, tables=PUBLISHED_TABLES, max_rows=MAX_ROWS_PER_COMMIT):
+        """
+        :param active: Callable telling whether changes should be recorded
+        :param tables: Tables to capture
+        :param max_rows: Rows returned by collect() before it reports the tables as reset instead
+        """
+        self.active = active
+        self.tables = tables
+        self.max_rows = max_rows
+
+    def install(self, conn):
+        """
+        Create the capture table and triggers on a connection; they live as long as the connection.
+        """
+        conn.create_function('workoutdb_capture_active', 0, lambda: 1 if self.active() else 0)
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS Row_Change (
+                seq INTEGER PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                op TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                row_values TEXT
+            )
+        """)
+        for table in self.tables:
+            columns = [(row[1], row[5]) for row in conn.execute(f'PRAGMA main.table_info("{table}")')]
+            if not columns:
+                continue
+            key_columns = [name for name, pk in sorted(columns, key=lambda c: c[1]) if pk] or ['rowid']
+            names = [name for name, _ in columns]
+            for op, event, ref in (('insert', 'INSERT', 'NEW'), ('update', 'UPDATE', 'NEW'), ('delete', 'DELETE', 'OLD')):
+                key = ', '.join(f"'{name}', {ref}.\"{name}\"" for name in key_columns)
+                values = 'NULL' if op == 'delete' else 'json_object(' + ', '.join(f"'{name}', NEW.\"{name}\"" for name in names) + ')'
+                conn.execute(f"""
+                    CREATE TEMP TRIGGER IF NOT EXISTS "capture_{table}_{op}" AFTER {event} ON main."{table}"
+                    WHEN workoutdb_capture_active()
+                    BEGIN
+                        INSERT INTO Row_Change (table_name, op, row_key, row_values)
+                        VALUES ('{table}', '{op}', json_object({key}), {values});
+                    END
+                """)
+
+    def collect(self, conn):
+        """
+        Changes recorded since the last call, in order; the capture table is emptied.
+        Called inside the writer's transaction, so a batch that is replayed is captured once.
+        :return: List of event payloads {'table', 'op', 'key', 'row'}; for a large transaction one
+                 {'table', 'op': 'reset'} per changed table instead
+        """
+        rows = conn.execute(
+            "SELECT table_name, op, row_key, row_values FROM temp.Row_Change ORDER BY seq LIMIT ?",
+            (self.max_rows + 1,)
+        ).fetchall()
+        if not rows:
+            return []
+        if len(rows) > self.max_rows:
+            tables = [row[0] for row in conn.execute("SELECT DISTINCT table_name FROM temp.Row_Change")]
+            changes = [{'table': table, 'op': 'reset'} for table in sorted(tables)]
+        else:
+            changes = [{
+                'table': table,
+                'op': op,
+                'key': json.loads(key),
+                'row': json.loads(values) if values is not None else None,
+            } for table, op, key, values in rows]
+        conn.execute("DELETE FROM temp.Row_Change")
+        return changes
+
+
+class Subscription:
+    """
+    One client's stream: the topics it follows and a bounded buffer of formatted messages.
+    """
+
+    def __init__(self, topics, max_buffer):
+        self.topics = topics
+        self.max_buffer = max_buffer
+        self.dropped = False
+        self.holds_slot = False
+        self._buffer = deque()
+        self._ready = threading.Event()
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def _push(self, message):
+        # Called with the hub's lock held; returns False when the client has fallen too far behind
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped = True
+            self._ready.set()
+            return False
+        self._buffer.append(message)
+        self._ready.set()
+        return True
+
+    def get(self, timeout):
+        """
+        Wait for messages.
+        :param timeout: Seconds to wait
+        :return: Messages buffered so far, oldest first; empty after a timeout
+        """
+        self._ready.wait(timeout)
+        self._ready.clear()
+        messages = []
+        while self._buffer:
+            messages.append(self._buffer.popleft())
+        return messages
+
+
+class EventHub:
+    """
+    In-process publish/subscribe of row changes. publish() never blocks: each message is formatted once
+    and appended to the buffer of every subscription following its table, and a subscription whose
+    buffer is full is dropped instead of slowing the writer down. Recent messages are kept so a client
+    reconnecting with Last-Event-ID resumes where it stopped.
+    Hubs are per process: under several worker processes a client sees the writes of the worker it
+    is connected to.
+    """
+
+    def __init__(self, max_buffer=256, max_subscribers=100, history=1024, slots=None):
+        """
+        :param max_buffer: Messages buffered per subscription before it is dropped as a slow consumer
+        :param max_subscribers: Concurrent subscriptions accepted
+        :param history: Recent messages kept for resuming
+        :param slots: Optional threading.BoundedSemaphore shared by several hubs (e.g. every tenant's in one
+                      process) so their streams are capped together; replaces max_subscribers
+        """
+        self.max_buffer = max_buffer
+        # Each open stream holds a server thread until the client goes away
+        self._slots = slots if slots is not None else threading.BoundedSemaphore(max_subscribers)
+        # Event ids are only meaningful to the hub that issued them
+        self.stream_id = secrets.token_hex(4)
+
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._history = deque(maxlen=history)
+        self._seq = 0
+
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def active(self):
+        return bool(self._subscriptions)
+
+    def _parse_event_id(self, event_id):
+        stream_id, _, seq = (event_id or '').partition('-')
+        if stream_id != self.stream_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, topics=None, last_event_id=None):
+        """
+        :param topics: Tables to follow, or None for all
+        :param last_event_id: Last-Event-ID of a reconnecting client; missed messages are replayed, or a
+                              'reset' message is queued first when they are no longer available
+        :return: Subscription
+        """
+        topics = frozenset(topics) if topics else None
+        unknown = sorted((topics or frozenset()) - set(PUBLISHED_TABLES))
+        if unknown:
+            raise EventError(f"Unknown topics: {', '.join(unknown)}")
+        if not self._slots.acquire(blocking=False):
+            raise HubFullError('Too many event subscribers')
+        subscription = Subscription(topics, self.max_buffer)
+        subscription.holds_slot = True
+        with self._lock:
+            if last_event_id:
+                seq = self._parse_event_id(last_event_id)
+                oldest = self._history[0][0] if self._history else self._seq + 1
+                if seq is None or seq < oldest - 1:
+                    subscription._push(format_event('reset', {'reason': 'missed events'}))
+                else:
+                    for message_seq, topic, message in self._history:
+                        if message_seq > seq and subscription.wants(topic):
+                            subscription._push(message)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            # A subscription dropped by publish() keeps its slot until its stream ends
+            release, subscription.holds_slot = subscription.holds_slot, False
+        if release:
+            self._slots.release()
+
+    def publish(self, changes):
+        """
+        :param changes: Event payloads from ChangeCapture.collect()
+        """
+        if not changes:
+            return
+        with self._lock:
+            for change in changes:
+                self._seq += 1
+                message = format_event('change', change, f"{self.stream_id}-{self._seq}")
+                self._history.append((self._seq, change['table'], message))
+                self.published += 1
+                for subscription in list(self._subscriptions):
+                    if subscription.wants(change['table']) and not subscription._push(message):
+                        self._subscriptions.discard(subscription)
+                        self.dropped += 1
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_SECONDS):
+        """
+        Server-Sent Events body for a subscription; unsubscribes when the client goes away.
+        A dropped subscription ends with a 'dropped' message; the client reconnects and resumes.
+        """
+        try:
+            yield f"retry: 3000\n: connected {self.stream_id}\n\n"
+            while True:
+                messages = subscription.get(heartbeat)
+                if messages:
+                    yield ''.join(messages)
+                if subscription.dropped:
+                    yield format_event('dropped', {'reason': 'slow consumer'})
+                    return
+                if not messages:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscriptions),
+                'published': self.published,
+                'dropped': self.dropped,
+                'history': len(self._history),
+            }
@@ -0,0 +1,202 @@
+MUSCLE_GROUPS = ('Chest', 'Back', 'Shoulders', 'Arms', 'Abdominals', 'Lower Back', 'Hips',
+                 'Thighs', 'Legs', 'Adductors and Abductors')
+INTENSITIES = ('Light', 'Moderate', 'Vigorous')
+
+# Sortable columns; exercise_id is always appended as the tie-breaker
+SORT_KEYS = {
+    'exercise_id': 'e.exercise_id',
+    'rating': 'e.rating',
+    'name': 'e.name',
+}
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# The old single-choice ?filter= values from the exercise list dropdown
+LEGACY_FILTERS = {
+    'rating_high_low': {'sort': 'rating', 'direction': 'desc'},
+    'rating_low_high': {'sort': 'rating', 'direction': 'asc'},
+    'intensity_light': {'intensity': ['Light']},
+    'intensity_moderate': {'intensity': ['Moderate']},
+    'intensity_vigorous': {'intensity': ['Vigorous']},
+    'muscle_chest': {'muscle_group': ['Chest']},
+    'muscle_back': {'muscle_group': ['Back']},
+    'muscle_shoulders': {'muscle_group': ['Shoulders']},
+    'muscle_arms': {'muscle_group': ['Arms']},
+    'muscle_abdominals': {'muscle_group': ['Abdominals']},
+    'muscle_lower_back': {'muscle_group': ['Lower Back']},
+    'muscle_hips': {'muscle_group': ['Hips']},
+    'muscle_thighs': {'muscle_group': ['Thighs']},
+    'muscle_legs': {'muscle_group': ['Legs']},
+    'muscle_adductors_abductors': {'muscle_group': ['Adductors and Abductors']},
+}
+
+
+class QueryError(ValueError):
+    """
+    Raised for invalid filter, sort or cursor parameters.
+    """
+
+
+def _int_arg(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"'{name}' must be an integer")
+
+
+class ExerciseQuery:
+    """
+    Composable filters for the exercise catalog, compiled into a single SQL statement
+    with keyset pagination on (sort key, exercise_id).
+    """
+
+    def __init__(self, muscle_groups=None, intensities=None, min_rating=None, max_rating=None,
+                 equipment=None, sort='exercise_id', direction='asc', limit=DEFAULT_LIMIT, after=None):
+        if sort not in SORT_KEYS:
+            raise QueryError(f"Invalid sort key '{sort}'")
+        if direction not in ('asc', 'desc'):
+            raise QueryError(f"Invalid sort direction '{direction}'")
+        for group in muscle_groups or []:
+            if group not in MUSCLE_GROUPS:
+                raise QueryError(f"Invalid muscle group '{group}'")
+        for intensity in intensities or []:
+            if intensity not in INTENSITIES:
+                raise QueryError(f"Invalid intensity '{intensity}'")
+        if limit < 1 or limit > MAX_LIMIT:
+            raise QueryError(f"'limit' must be between 1 and {MAX_LIMIT}")
+
+        self.muscle_groups = list(muscle_groups or [])
+        self.intensities = list(intensities or [])
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+        self.equipment = list(equipment or [])
+        self.sort = sort
+        self.direction = direction
+        self.limit = limit
+        self.after = self._parse_cursor(after) if after else None
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Build a query from request arguments.
+        :param args: werkzeug MultiDict (request.args); list parameters may be repeated
+        :return: ExerciseQuery
+        """
+        params = {
+            'muscle_groups': args.getlist('muscle_group'),
+            'intensities': args.getlist('intensity'),
+            'equipment': args.getlist('equipment'),
+            'sort': args.get('sort', 'exercise_id'),
+            'direction': args.get('direction', 'asc').lower(),
+            'after': args.get('after'),
+        }
+        if args.get('min_rating'):
+            params['min_rating'] = _int_arg(args['min_rating'], 'min_rating')
+        if args.get('max_rating'):
+            params['max_rating'] = _int_arg(args['max_rating'], 'max_rating')
+        if args.get('limit'):
+            params['limit'] = _int_arg(args['limit'], 'limit')
+
+        legacy = args.get('filter')
+        if legacy:
+            if legacy not in LEGACY_FILTERS:
+                raise QueryError('Invalid filter option')
+            for key, value in LEGACY_FILTERS[legacy].items():
+                key = {'muscle_group': 'muscle_groups', 'intensity': 'intensities'}.get(key, key)
+                params[key] = value
+        return cls(**params)
+
+    def _parse_cursor(self, cursor):
+        # Cursor is "<exercise_id>" when sorting by id, otherwise "<sort value>,<exercise_id>".
+        # An empty sort value stands for NULL.
+        if self.sort == 'exercise_id':
+            return None, _int_arg(cursor, 'after')
+        if ',' not in cursor:
+            raise QueryError("'after' must look like '<value>,<exercise_id>'")
+        value, exercise_id = cursor.rsplit(',', 1)
+        if value == '':
+            value = None
+        elif self.sort == 'rating':
+            value = _int_arg(value, 'after')
+        return value, _int_arg(exercise_id, 'after')
+
+    def cursor_for(self, row):
+        """
+        Cursor pointing just past the given row.
+        :param row: Last row of the current page
+        :return: Cursor string for the 'after' parameter
+        """
+        if self.sort == 'exercise_id':
+            return str(row['exercise_id'])
+        value = row[self.sort]
+        return f"{'' if value is None else value},{row['exercise_id']}"
+
+    def to_sql(self):
+        """
+        Compile the filters into SQL.
+        :return: (sql, params) tuple; the statement fetches limit + 1 rows so the caller can tell
+                 whether another page exists
+        """
+        joins = []
+        where = []
+        params = []
+
+        if self.muscle_groups:
+            where.append(f"e.muscle_group IN ({', '.join('?' * len(self.muscle_groups))})")
+            params.extend(self.muscle_groups)
+        if self.intensities:
+            where.append(f"e.intensity IN ({', '.join('?' * len(self.intensities))})")
+            params.extend(self.intensities)
+        if self.min_rating is not None:
+            where.append("e.rating >= ?")
+            params.append(self.min_rating)
+        if self.max_rating is not None:
+            where.append("e.rating <= ?")
+            params.append(self.max_rating)
+        if self.equipment:
+            joins.append("JOIN Exercise_Detail ed ON ed.exercise_detail_id = e.exercise_detail_id")
+            where.append(f"ed.equipment_needed IN ({', '.join('?' * len(self.equipment))})")
+            params.extend(self.equipment)
+
+        column = SORT_KEYS[self.sort]
+        op = '>' if self.direction == 'asc' else '<'
+        if self.after is not None:
+            value, exercise_id = self.after
+            if self.sort == 'exercise_id':
+                where.append(f"e.exercise_id {op} ?")
+                params.append(exercise_id)
+            elif value is None:
+                # Already inside the trailing block of NULL sort values
+                where.append(f"{column} IS NULL AND e.exercise_id {op} ?")
+                params.append(exercise_id)
+            else:
+                where.append(f"(({column}, e.exercise_id) {op} (?, ?) OR {column} IS NULL)")
+                params.extend([value, exercise_id])
+
+        if self.sort == 'exercise_id':
+            order = f"e.exercise_id {self.direction.upper()}"
+        else:
+            order = f"{column} {self.direction.upper()} NULLS LAST, e.exercise_id {self.direction.upper()}"
+
+        sql = "SELECT e.* FROM Exercise e"
+        if joins:
+            sql += " " + " ".join(joins)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(self.limit + 1)
+        return sql, params
+
+    def fetch_page(self, conn):
+        """
+        Run the query and return one page.
+        :param conn: Open SQLite connection with sqlite3.Row rows
+        :return: (rows, next_cursor); next_cursor is None on the last page
+        """
+        sql, params = self.to_sql()
+        rows = conn.execute(sql, params).fetchall()
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            return rows, self.cursor_for(rows[-1])
+        return rows, None
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from markupsafe import Markup
+
+from repository import Record
+
+
+def row_version(value):
+    """
+    Hashable snapshot of a row's values, used as its version: any changed column, or any change to a
+    nested child list, gives a different version.
+    :param value: Record, sqlite3.Row, dict, list or scalar
+    """
+    if isinstance(value, Record):
+        return tuple(getattr(value, name) for name in value.__slots__)
+    if isinstance(value, sqlite3.Row):
+        return tuple(value)
+    if isinstance(value, dict):
+        return tuple((key, row_version(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(row_version(item) for item in value)
+    return value
+
+
+class FragmentCache:
+    """
+    Size-bounded LRU of rendered per-row template partials.
+
+    A fragment is keyed on (template, row identity, row version), so an edited row is rendered again
+    even before its tables are invalidated. Fragments are also tagged with the tables they read and
+    dropped when those tables are invalidated (see ResponseCache.add_listener), which frees stale
+    entries right away instead of leaving them to the LRU.
+
+    Partials are rendered from the row alone, without the request context, so they must not use
+    request-dependent state such as flashed messages.
+    """
+
+    def __init__(self, max_entries=20000, max_bytes=32 * 1024 * 1024):
+        """
+        :param max_entries: Maximum number of cached fragments
+        :param max_bytes: Maximum total length of cached fragments
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._tag_generations = {}
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, template_name, row, identity, *tags):
+        """
+        Render a partial for one row, or reuse the cached result.
+        Registered as the `fragment` template global:
+            {{ fragment('exercise-row.html', exercise, exercise.exercise_id, 'Exercise') }}
+        :param template_name: Partial template; the row is available in it as `row`
+        :param row: Row the partial renders
+        :param identity: Primary key (or other stable identity) of the row
+        :param tags: Tables the row was read from
+        :return: Markup
+        """
+        key = (template_name, identity, row_version(row))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generations = {tag: self._tag_generations.get(tag, 0) for tag in tags}
+
+        html = Markup(current_app.jinja_env.get_template(template_name).render(row=row))
+        self._put(key, html, tags, generations)
+        return html
+
+    def _put(self, key, html, tags, generations):
+        with self._lock:
+            # Skip the store if one of the tables changed while the partial was rendering
+            for tag, generation in generations.items():
+                if self._tag_generations.get(tag, 0) != generation:
+                    return
+            if key in self._entries:
+                return
+            self._entries[key] = (html, tags)
+            self._size += len(html)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        html, tags = self._entries.pop(key)
+        self._size -= len(html)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, *tags):
+        """
+        Drop every fragment tagged with any of the given tables; with no tables, drop everything.
+        :param tags: Table names
+        """
+        with self._lock:
+            if not tags:
+                tags = list(self._keys_by_tag)
+            for tag in tags:
+                self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+                for key in list(self._keys_by_tag.pop(tag, ())):
+                    if key in self._entries:
+                        self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
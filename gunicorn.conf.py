@@ -0,0 +1,40 @@
+# Production serving profile: several worker processes on one host sharing the SQLite database in WAL mode.
+#
+#     WORKOUT_DATABASE=/srv/workout/workoutdatabase.db gunicorn -c gunicorn.conf.py
+#
+# Every worker builds its own app with create_app(), so each has its own connection pool and writer
+# thread. Writers from different workers serialize on SQLite's write lock (busy_timeout plus the
+# writer's retries), while reads run concurrently under WAL. Response caches are per worker and notice
+# each other's writes through the Table_Version counters. With WORKOUT_TENANT_DIR set, each worker keeps
+# its own LRU of open tenant databases (WORKOUT_TENANT_MAX_OPEN).
+# Every worker also runs background jobs in its own pools; with many workers, set WORKOUT_JOB_RUNNER=false
+# and run `flask --app app jobs-worker` next to gunicorn instead.
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+
+# Threads share one pool per worker; keep WORKOUT_POOL_SIZE at least as large as `threads`
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 8))
+os.environ.setdefault('WORKOUT_POOL_SIZE', str(threads))
+# Every open /api/events stream occupies one of the worker's threads for as long as the client stays
+# connected. Cap streams per worker (across all its tenants) at a quarter of `threads` so the rest always
+# serve ordinary requests; past the cap /api/events answers 503 and the browser retries later. Deployments
+# with many live clients should serve /api/events from a separate gunicorn with more threads instead.
+os.environ.setdefault('WORKOUT_EVENT_MAX_SUBSCRIBERS', str(max(1, threads // 4)))
+
+# Workers must not inherit an app from the master: a forked writer thread or open connection would be unusable
+preload_app = False
+
+# Recycle workers now and then so caches and connection state start fresh
+max_requests = 5000
+max_requests_jitter = 500
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,80 @@
+import threading
+
+# Sequences handed out by the allocator and the primary key each one feeds
+SEQUENCES = {
+    'Workout': 'workout_id',
+    'Day': 'day_id',
+}
+
+DEFAULT_BLOCK_SIZE = 100
+
+
+def reserve_block(conn, name, size):
+    """
+    Writer operation reserving the next `size` ids of a sequence.
+    Rows inserted with explicit ids by other tools (datagen, imports) are skipped over,
+    so a block never starts at or below the table's current maximum key.
+    :param conn: Connection inside the writer's transaction
+    :param name: Sequence name, a key of SEQUENCES
+    :param size: Number of ids to reserve
+    :return: First id of the block; the block is [first, first + size)
+    """
+    column = SEQUENCES[name]
+    first = conn.execute(f"""
+        SELECT MAX(s.next_id, (SELECT COALESCE(MAX({column}), 0) + 1 FROM {name}))
+        FROM Id_Sequence s WHERE s.name = ?
+    """, (name,)).fetchone()[0]
+    conn.execute("UPDATE Id_Sequence SET next_id = ? WHERE name = ?", (first + size, name))
+    return first
+
+
+class _Block:
+    __slots__ = ('lock', 'next', 'end')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next = 0
+        self.end = 0
+
+
+class IdAllocator:
+    """
+    Hi/lo id allocation: each process reserves a block of ids from Id_Sequence with one write
+    and then hands them out from memory, so concurrent creates in any number of processes
+    never pick the same primary key. Ids of a block that is never used are simply skipped.
+    """
+
+    def __init__(self, reserve, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        :param reserve: Callable (name, size) -> first id of a newly reserved block, e.g. running
+                        reserve_block on the writer thread
+        :param block_size: Ids reserved per write
+        """
+        self.reserve = reserve
+        self.block_size = block_size
+        self._blocks = {name: _Block() for name in SEQUENCES}
+        self._reservations = 0
+        self._allocated = 0
+
+    def next_id(self, name):
+        """
+        :param name: Sequence name, 'Workout' or 'Day'
+        :return: An id no other caller has been or will be given
+        """
+        block = self._blocks[name]
+        with block.lock:
+            if block.next >= block.end:
+                first = self.reserve(name, self.block_size)
+                block.next, block.end = first, first + self.block_size
+                self._reservations += 1
+            value = block.next
+            block.next += 1
+            self._allocated += 1
+            return value
+
+    def stats(self):
+        return {
+            'reservations': self._reservations,
+            'allocated': self._allocated,
+            'remaining': {name: block.end - block.next for name, block in self._blocks.items()},
+        }
@@ -0,0 +1,281 @@
+import bisect
+import contextlib
+import contextvars
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from flask import g, request, before_render_template, template_rendered
+
+slow_query_logger = logging.getLogger('workoutdb.slow_query')
+
+# Statements slower than this many seconds are written to the slow-query log
+SLOW_QUERY_SECONDS = 0.1
+
+# Query statistics for the request currently running on this thread/context
+_current = contextvars.ContextVar('sql_stats', default=None)
+
+
+class SQLStats:
+    __slots__ = ('statements', 'seconds', 'rows')
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.rows = 0
+
+
+@contextlib.contextmanager
+def unrecorded():
+    """
+    Leave the SQL run in the block out of the current request's statistics, e.g. one-time setup that
+    happens to run during the first request.
+    """
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def normalize_sql(sql):
+    """
+    Collapse whitespace and replace literals with ? so equivalent statements group together.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _record(sql, params, elapsed, rows=0, statement=True):
+    stats = _current.get()
+    if stats is not None:
+        if statement:
+            stats.statements += 1
+        stats.seconds += elapsed
+        stats.rows += rows
+    if statement and elapsed >= SLOW_QUERY_SECONDS:
+        slow_query_logger.warning("%.1fms %s params=%r", elapsed * 1000, normalize_sql(sql), params)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that times execute and fetch calls and counts rows for the current request.
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(sql, '<many>', time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _record(sql_script, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        _record(None, None, time.perf_counter() - start, 1 if row is not None else 0, statement=False)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _record(None, None, time.perf_counter() - start, len(rows), statement=False)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        _record(None, None, time.perf_counter() - start, len(rows), statement=False)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        _record(None, None, time.perf_counter() - start, 1, statement=False)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection factory whose cursors are instrumented; pass it to ConnectionPool(factory=...).
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these shortcuts bypass cursor().execute, so route them through it
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+class RequestMetrics:
+    """
+    Per-endpoint request metrics, collected by init_app() hooks and rendered in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._sql_latency = {}
+        self._rows = {}
+        self._requests = {}
+        self._statements = {}
+
+    def observe(self, endpoint, method, status, seconds, stats):
+        with self._lock:
+            key = (endpoint, method)
+            self._latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self._sql_latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(stats.seconds)
+            self._rows.setdefault(key, Histogram(ROW_BUCKETS)).observe(stats.rows)
+            self._statements[key] = self._statements.get(key, 0) + stats.statements
+            status_key = (endpoint, method, status)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+
+    def _render_histogram(self, lines, name, help_text, histograms):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (endpoint, method), hist in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(endpoint=endpoint, method=method, le=bound)} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(endpoint=endpoint, method=method, le='+Inf')} {hist.count}")
+            lines.append(f"{name}_sum{_labels(endpoint=endpoint, method=method)} {hist.total}")
+            lines.append(f"{name}_count{_labels(endpoint=endpoint, method=method)} {hist.count}")
+
+    def render(self, gauges=None):
+        """
+        Prometheus text exposition of all metrics.
+        :param gauges: Extra {metric_name: (help, type, value)} entries, e.g. connection pool stats
+        :return: str
+        """
+        lines = []
+        with self._lock:
+            lines.append("# HELP workoutdb_requests_total Requests handled, by endpoint, method and status.")
+            lines.append("# TYPE workoutdb_requests_total counter")
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f"workoutdb_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+            self._render_histogram(lines, 'workoutdb_request_duration_seconds',
+                                   'Request latency by endpoint.', self._latency)
+            self._render_histogram(lines, 'workoutdb_request_sql_seconds',
+                                   'Time spent executing and fetching SQL per request.', self._sql_latency)
+            self._render_histogram(lines, 'workoutdb_request_sql_rows',
+                                   'Rows fetched from SQLite per request.', self._rows)
+
+            lines.append("# HELP workoutdb_sql_statements_total SQL statements executed, by endpoint.")
+            lines.append("# TYPE workoutdb_sql_statements_total counter")
+            for (endpoint, method), count in sorted(self._statements.items()):
+                lines.append(f"workoutdb_sql_statements_total{_labels(endpoint=endpoint, method=method)} {count}")
+
+        for name, (help_text, metric_type, value) in (gauges or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def init_app(app, metrics):
+    """
+    Collect SQL statistics per request, add a Server-Timing header and feed the metrics registry.
+    Server-Timing splits the request into db (SQL execute + fetch), render (Jinja) and app (everything else,
+    e.g. row conversion and JSON serialization).
+    """
+
+    @app.before_request
+    def _start_request_timing():
+        g._timing_start = time.perf_counter()
+        g._render_seconds = 0.0
+        g._sql_token = _current.set(SQLStats())
+
+    def _before_render(sender, template, context, **extra):
+        if hasattr(g, '_timing_start'):
+            g._render_start = time.perf_counter()
+
+    def _after_render(sender, template, context, **extra):
+        start = g.pop('_render_start', None)
+        if start is not None:
+            g._render_seconds += time.perf_counter() - start
+
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_after_render, app, weak=False)
+
+    @app.after_request
+    def _finish_request_timing(response):
+        start = g.pop('_timing_start', None)
+        if start is None:
+            return response
+        stats = _current.get() or SQLStats()
+        total = time.perf_counter() - start
+        render = g.pop('_render_seconds', 0.0)
+        other = max(total - stats.seconds - render, 0.0)
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.seconds * 1000:.2f};desc="{stats.statements} queries, {stats.rows} rows", '
+            f'render;dur={render * 1000:.2f}, '
+            f'app;dur={other * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe(endpoint, request.method, response.status_code, total, stats)
+        return response
+
+    @app.teardown_request
+    def _reset_request_stats(exception=None):
+        token = g.pop('_sql_token', None)
+        if token is not None:
+            _current.reset(token)
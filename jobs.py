@@ -0,0 +1,857 @@
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import analytics
+import bulk_io
+import search
+from db_pool import ConnectionPool
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+# Where a job type runs: 'process' for CPU-bound work, 'thread' for I/O-bound work
+KINDS = ('process', 'thread')
+
+DEFAULT_MAX_ATTEMPTS = 3
+MAX_ATTEMPTS = 10
+# Seconds before the first retry of a failed job, doubled for every further attempt
+RETRY_DELAY_SECONDS = 5
+# A running job whose heartbeat is older than this is presumed lost with its process and queued again
+LEASE_SECONDS = 60
+# Jobs write their progress, and find out they were cancelled, at most this often
+PROGRESS_INTERVAL = 0.5
+# Finished jobs and their output files are deleted after this many days
+DEFAULT_RETENTION_DAYS = 7
+PRUNE_INTERVAL = 3600
+
+DEFAULT_LIST_LIMIT = 50
+MAX_LIST_LIMIT = 500
+
+# Workouts whose links replace_exercise_job rewrites per transaction
+_REPLACE_CHUNK = 500
+
+# Timestamps are UTC ISO 8601 text, so they compare correctly as strings
+_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+
+class JobError(ValueError):
+    """
+    Raised for an invalid job submission. Raised by a running job, it fails the job without a retry.
+    """
+
+
+class JobCancelled(Exception):
+    """
+    Raised by JobContext.progress() once the job has been cancelled; the job stops where it is.
+    """
+
+
+def _check_keys(params, allowed):
+    unknown = sorted(set(params) - set(allowed))
+    if unknown:
+        raise JobError(f"Unknown params: {', '.join(unknown)}")
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise JobError(f"'{name}' must be an integer")
+    return value
+
+
+class JobType:
+    """
+    A kind of background job: the function doing the work, where it runs and how many may run at once.
+    """
+
+    def __init__(self, name, run, kind='thread', concurrency=1, max_attempts=DEFAULT_MAX_ATTEMPTS, check=None,
+                 invalidates=(), changes=()):
+        """
+        :param name: Type name clients submit
+        :param run: Module-level function run(context, params) returning a JSON-serializable result;
+                    process jobs pickle it by name
+        :param kind: 'process' or 'thread'
+        :param concurrency: Jobs of this type running at once, across every process using the database
+        :param max_attempts: Default number of tries before the job fails
+        :param check: Optional check(params) returning the validated params or raising JobError; without it
+                      the type takes no params
+        :param invalidates: Tables whose cached responses are dropped when a job of this type succeeds
+        :param changes: Published tables the job writes; /api/events subscribers get a 'reset' event for
+                        each when a job of this type succeeds
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Job kind must be one of {', '.join(KINDS)}")
+        self.name = name
+        self.run = run
+        self.kind = kind
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.check = check
+        self.invalidates = tuple(invalidates)
+        self.changes = tuple(changes)
+
+    def check_params(self, params):
+        if self.check is None:
+            _check_keys(params, ())
+            return {}
+        return self.check(params)
+
+    def to_dict(self):
+        return {'type': self.name, 'kind': self.kind, 'concurrency': self.concurrency,
+                'max_attempts': self.max_attempts}
+
+
+def output_dir(database):
+    """
+    :return: Directory the jobs of a database write their output files to, next to the database
+    """
+    return os.path.splitext(os.path.abspath(database))[0] + '-jobs'
+
+
+class JobContext:
+    """
+    Handed to a running job: its database, where to write output files, and progress reporting.
+    It is built by the runner and pickled into the pool process for process jobs, so connections are
+    opened where the job runs, on first use. Thread jobs also get the process's writer, if it has one.
+    """
+
+    def __init__(self, database, job_id, worker, write=None):
+        self.database = database
+        self.job_id = job_id
+        self.worker = worker
+        self._write = write
+        self._conn = None
+        self._status_conn = None
+        self._reported = None
+
+    def __getstate__(self):
+        return {'database': self.database, 'job_id': self.job_id, 'worker': self.worker}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def connection(self):
+        """
+        :return: Connection for the job's own reads and writes, configured like the app's pooled ones
+        """
+        if self._conn is None:
+            self._conn = ConnectionPool(self.database).connect()
+        return self._conn
+
+    def write(self, fn, *args):
+        """
+        Run fn(conn, *args) in a write transaction: through the process's writer for thread jobs, so the
+        write queues with the requests' writes and is captured for event subscribers; otherwise on the
+        job's own connection.
+        :return: What fn returned
+        """
+        if self._write is not None:
+            return self._write(fn, *args)
+        conn = self.connection()
+        with conn:
+            return fn(conn, *args)
+
+    def output_path(self, extension):
+        """
+        :return: Path of the job's output file; the directory is created if needed
+        """
+        directory = output_dir(self.database)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{self.job_id}.{extension}")
+
+    def progress(self, fraction, message=None):
+        """
+        Record how far the job has got, at most every PROGRESS_INTERVAL seconds; this also renews the
+        job's lease. Long jobs should call it regularly: it is where they find out they were cancelled.
+        :param fraction: Share of the work done, from 0 to 1
+        :param message: Optional description of the current step
+        :raises JobCancelled: The job was cancelled, or was handed to another worker after its lease expired
+        """
+        now = time.monotonic()
+        if self._reported is not None and now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        if self._status_conn is None:
+            # Separate from connection(), which may be inside a long read transaction
+            self._status_conn = sqlite3.connect(self.database, timeout=5.0, isolation_level=None)
+        try:
+            rows = self._status_conn.execute(
+                f"UPDATE Job SET progress = ?, message = COALESCE(?, message), heartbeat_at = {_NOW} "
+                "WHERE job_id = ? AND worker = ? AND status = 'running' RETURNING cancel_requested",
+                (max(0.0, min(float(fraction), 1.0)), message, self.job_id, self.worker)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # A busy database only delays the report
+            return
+        if not rows or rows[0][0]:
+            raise JobCancelled()
+
+    def close(self):
+        for conn in (self._conn, self._status_conn):
+            if conn is not None:
+                conn.close()
+        self._conn = self._status_conn = None
+
+
+def _watch_parent(parent_pid):
+    # Initializer of pool processes: exit once the process that started the pool is gone (killed, say),
+    # instead of waiting forever for work
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(1)
+    threading.Thread(target=watch, name='parent-watch', daemon=True).start()
+
+
+def _execute(run, context, params):
+    # Entry point in the pool's thread or process
+    try:
+        return run(context, params)
+    finally:
+        context.close()
+
+
+# -- queue -------------------------------------------------------------------
+
+def _job_dict(row):
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+def parse_submission(data, types):
+    """
+    :param data: Request body {"type", "params", "max_attempts"}
+    :param types: Registered JobTypes by name
+    :return: (JobType, validated params, max_attempts)
+    """
+    if not isinstance(data, dict):
+        raise JobError('Expected a JSON object')
+    job_type = types.get(data.get('type'))
+    if job_type is None:
+        raise JobError(f"'type' must be one of {', '.join(sorted(types))}")
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        raise JobError("'params' must be an object")
+    params = job_type.check_params(params)
+    max_attempts = data.get('max_attempts', job_type.max_attempts)
+    if not isinstance(max_attempts, int) or isinstance(max_attempts, bool) or not 1 <= max_attempts <= MAX_ATTEMPTS:
+        raise JobError(f"'max_attempts' must be an integer between 1 and {MAX_ATTEMPTS}")
+    return job_type, params, max_attempts
+
+
+def enqueue(conn, job_type, params, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Writer operation queueing a job.
+    :return: Id of the new job
+    """
+    return conn.execute(
+        "INSERT INTO Job (type, params, max_attempts) VALUES (?, ?, ?)",
+        (job_type, json.dumps(params), max_attempts)
+    ).lastrowid
+
+
+def get_job(conn, job_id):
+    """
+    :return: Job dict, or None if there is no such job
+    """
+    row = conn.execute("SELECT * FROM Job WHERE job_id = ?", (job_id,)).fetchone()
+    return _job_dict(row) if row is not None else None
+
+
+def list_jobs(conn, status=None, job_type=None, limit=None):
+    """
+    Jobs for GET /api/jobs, newest first.
+    :param status: Optional ?status= filter
+    :param job_type: Optional ?type= filter
+    :param limit: ?limit= argument, or None for the default
+    """
+    if status is not None and status not in STATUSES:
+        raise JobError(f"'status' must be one of {', '.join(STATUSES)}")
+    if limit is None:
+        limit = DEFAULT_LIST_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise JobError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_LIST_LIMIT:
+        raise JobError(f"'limit' must be between 1 and {MAX_LIST_LIMIT}")
+    clauses, args = [], []
+    if status is not None:
+        clauses.append("status = ?")
+        args.append(status)
+    if job_type is not None:
+        clauses.append("type = ?")
+        args.append(job_type)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+    rows = conn.execute(f"SELECT * FROM Job {where}ORDER BY job_id DESC LIMIT ?", (*args, limit))
+    return [_job_dict(row) for row in rows]
+
+
+def count_by_status(conn):
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(conn.execute("SELECT status, COUNT(*) FROM Job GROUP BY status").fetchall())
+    return counts
+
+
+def cancel(conn, job_id):
+    """
+    Writer operation cancelling a job. A queued job is cancelled at once; a running one is asked to stop
+    and is cancelled at its next progress report, or finishes normally if it never reports again.
+    :return: Status the job had, or None if there is no such job
+    """
+    row = conn.execute("SELECT status FROM Job WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    if row[0] == 'queued':
+        conn.execute(f"UPDATE Job SET status = 'cancelled', finished_at = {_NOW} WHERE job_id = ?", (job_id,))
+    elif row[0] == 'running':
+        conn.execute("UPDATE Job SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+    return row[0]
+
+
+def claim(conn, worker, types, free):
+    """
+    Mark the oldest due jobs running for a worker, within each type's concurrency and the free pool slots.
+    It all happens in one BEGIN IMMEDIATE transaction, so workers in other processes can neither take the
+    same job nor exceed a type's concurrency together. A plain read looks for a due job first, so polling
+    an empty queue never takes the write lock.
+    :param worker: Id of the claiming runner
+    :param types: JobTypes the runner can run, by name
+    :param free: Free pool slots per kind
+    :return: Claimed Job rows
+    """
+    if conn.in_transaction:
+        conn.commit()
+    names = [name for name, job_type in types.items() if free.get(job_type.kind, 0) > 0]
+    if not names or conn.execute(
+        f"SELECT 1 FROM Job WHERE status = 'queued' AND type IN ({', '.join('?' * len(names))}) "
+        f"AND run_after <= {_NOW} LIMIT 1",
+        names
+    ).fetchone() is None:
+        return []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        running = dict(conn.execute("SELECT type, COUNT(*) FROM Job WHERE status = 'running' GROUP BY type").fetchall())
+        free = dict(free)
+        candidates = []
+        for name, job_type in types.items():
+            slots = min(job_type.concurrency - running.get(name, 0), free.get(job_type.kind, 0))
+            if slots > 0:
+                candidates.extend(tuple(row) for row in conn.execute(
+                    f"SELECT job_id, type FROM Job WHERE status = 'queued' AND type = ? AND run_after <= {_NOW} "
+                    "ORDER BY job_id LIMIT ?",
+                    (name, slots)
+                ))
+        claimed = []
+        # Oldest first across types, until the pools are full
+        for job_id, name in sorted(candidates):
+            job_type = types[name]
+            if free[job_type.kind] <= 0:
+                continue
+            conn.execute(
+                f"UPDATE Job SET status = 'running', attempts = attempts + 1, worker = ?, progress = 0, "
+                f"started_at = {_NOW}, heartbeat_at = {_NOW} WHERE job_id = ?",
+                (worker, job_id)
+            )
+            free[job_type.kind] -= 1
+            claimed.append(job_id)
+        rows = conn.execute(
+            f"SELECT * FROM Job WHERE job_id IN ({', '.join('?' * len(claimed))})", claimed
+        ).fetchall() if claimed else []
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return rows
+
+
+def finish(conn, job_id, worker, status, result=None, error=None):
+    """
+    Record the outcome of a job this worker still owns.
+    :param status: 'succeeded', 'failed' or 'cancelled'
+    :return: False if the job was meanwhile handed to another worker
+    """
+    with conn:
+        return conn.execute(
+            f"UPDATE Job SET status = ?, result = ?, error = ?, progress = CASE WHEN ? = 'succeeded' THEN 1 "
+            f"ELSE progress END, finished_at = {_NOW} WHERE job_id = ? AND worker = ? AND status = 'running'",
+            (status, json.dumps(result) if result is not None else None, error, status, job_id, worker)
+        ).rowcount > 0
+
+
+def retry_or_fail(conn, job_id, worker, error):
+    """
+    Queue a failed job again after a backoff, or fail it once it has used all its attempts.
+    :return: True if the job will be retried
+    """
+    with conn:
+        row = conn.execute(
+            "SELECT attempts, max_attempts FROM Job WHERE job_id = ? AND worker = ? AND status = 'running'",
+            (job_id, worker)
+        ).fetchone()
+        if row is None:
+            return False
+        attempts, max_attempts = row[0], row[1]
+        if attempts >= max_attempts:
+            conn.execute(f"UPDATE Job SET status = 'failed', error = ?, finished_at = {_NOW} WHERE job_id = ?",
+                         (error, job_id))
+            return False
+        delay = RETRY_DELAY_SECONDS * 2 ** (attempts - 1)
+        conn.execute(
+            "UPDATE Job SET status = 'queued', worker = NULL, heartbeat_at = NULL, error = ?, "
+            "run_after = strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?) WHERE job_id = ?",
+            (error, f"+{delay} seconds", job_id)
+        )
+        return True
+
+
+def heartbeat(conn, worker):
+    """
+    Renew the leases of every job a worker is running.
+    """
+    with conn:
+        conn.execute(f"UPDATE Job SET heartbeat_at = {_NOW} WHERE worker = ? AND status = 'running'", (worker,))
+
+
+def requeue_expired(conn, lease=LEASE_SECONDS):
+    """
+    Jobs whose worker stopped renewing their lease (its process died) are queued again, or failed if that
+    was their last attempt, or cancelled if that had been asked for.
+    :return: Number of jobs taken back
+    """
+    with conn:
+        return conn.execute(f"""
+            UPDATE Job SET
+                status = CASE WHEN cancel_requested THEN 'cancelled'
+                              WHEN attempts >= max_attempts THEN 'failed'
+                              ELSE 'queued' END,
+                finished_at = CASE WHEN cancel_requested OR attempts >= max_attempts THEN {_NOW} END,
+                error = 'The worker running the job stopped responding',
+                worker = NULL,
+                heartbeat_at = NULL
+            WHERE status = 'running' AND heartbeat_at < strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)
+        """, (f"-{int(lease)} seconds",)).rowcount
+
+
+def prune(conn, database, retention_days=DEFAULT_RETENTION_DAYS):
+    """
+    Delete finished jobs older than the retention window, with their output files.
+    :return: Number of jobs deleted
+    """
+    rows = conn.execute(
+        f"SELECT job_id, result FROM Job WHERE status IN ({', '.join('?' * len(FINISHED))}) "
+        "AND finished_at < strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)",
+        (*FINISHED, f"-{float(retention_days)} days")
+    ).fetchall()
+    for row in rows:
+        result = json.loads(row[1]) if row[1] is not None else None
+        if isinstance(result, dict) and result.get('file'):
+            path = os.path.join(output_dir(database), result['file'])
+            if os.path.exists(path):
+                os.remove(path)
+    with conn:
+        conn.executemany("DELETE FROM Job WHERE job_id = ?", [(row[0],) for row in rows])
+    return len(rows)
+
+
+# -- runner ------------------------------------------------------------------
+
+class JobPools:
+    """
+    The process and thread pools jobs run in, shared by the runners of every database an app serves.
+    Pool processes are started with 'spawn', on first use: forking a process that runs writer and runner
+    threads could copy a lock one of them holds.
+    """
+
+    def __init__(self, processes=2, threads=4):
+        """
+        :param processes: Worker processes for 'process' jobs
+        :param threads: Worker threads for 'thread' jobs
+        """
+        self.sizes = {'process': processes, 'thread': threads}
+        self._lock = threading.Lock()
+        self._busy = dict.fromkeys(KINDS, 0)
+        self._executors = {}
+
+    def _executor(self, kind):
+        executor = self._executors.get(kind)
+        if executor is None:
+            if kind == 'process':
+                executor = ProcessPoolExecutor(self.sizes[kind], mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=_watch_parent, initargs=(os.getpid(),))
+            else:
+                executor = ThreadPoolExecutor(self.sizes[kind], thread_name_prefix='job')
+            self._executors[kind] = executor
+        return executor
+
+    def free(self):
+        """
+        :return: Idle workers per kind
+        """
+        with self._lock:
+            return {kind: self.sizes[kind] - self._busy[kind] for kind in KINDS}
+
+    def submit(self, kind, fn, *args):
+        """
+        :return: concurrent.futures.Future of fn(*args) in the pool of that kind
+        """
+        with self._lock:
+            try:
+                future = self._executor(kind).submit(fn, *args)
+            except BrokenProcessPool:
+                # A pool process died (killed, out of memory); its jobs failed and a new pool takes over
+                self._executors.pop(kind).shutdown(wait=False)
+                future = self._executor(kind).submit(fn, *args)
+            self._busy[kind] += 1
+        future.add_done_callback(functools.partial(self._done, kind))
+        return future
+
+    def _done(self, kind, future):
+        with self._lock:
+            self._busy[kind] -= 1
+
+    def close(self):
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {kind: {'size': self.sizes[kind], 'busy': self._busy[kind]} for kind in KINDS}
+
+
+class JobRunner:
+    """
+    Runs the queued jobs of one database. Its thread claims due jobs within the free pool slots and each
+    type's concurrency, hands them to the process or thread pool, renews the leases of those still running
+    and records each outcome: the result, a retry after a backoff, a failure once the attempts are used
+    up, or a cancellation.
+    Every process serving the database may run one; the queue table keeps them from taking the same job,
+    and the jobs of a process that died are queued again once their lease expires.
+    """
+
+    def __init__(self, connect, database, types, pools, poll_interval=1.0, lease=LEASE_SECONDS,
+                 retention_days=DEFAULT_RETENTION_DAYS, on_success=None, write=None, logger=None):
+        """
+        :param connect: Callable returning a new sqlite3 connection for the runner thread
+        :param database: Path of the database, for the jobs' own connections
+        :param types: JobTypes by name
+        :param pools: JobPools the jobs run in
+        :param poll_interval: Seconds between looks at the queue when nothing wakes the runner up
+        :param lease: Seconds a running job may go without a heartbeat before it is presumed lost
+        :param retention_days: Days finished jobs are kept
+        :param on_success: Optional on_success(job_type) called on the runner thread after a job succeeded
+        :param write: Optional write(fn, *args) running fn(conn, *args) through the process's writer,
+            handed to thread jobs
+        """
+        self.connect = connect
+        self.database = database
+        self.types = types
+        self.pools = pools
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retention_days = retention_days
+        self.on_success = on_success
+        self.write = write
+        self.logger = logger or logging.getLogger(__name__)
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+        self._wake = threading.Event()
+        self._done = queue.SimpleQueue()
+        self._running = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closing = False
+
+        # Counters exposed through stats()
+        self.claimed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.cancelled = 0
+        self.lost = 0
+
+    def start(self):
+        """
+        Start the runner thread if it is not running yet.
+        """
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None and not self._closing:
+                self._thread = threading.Thread(target=self._run, name='job-runner', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """
+        Look at the queue now, e.g. because a job was just submitted.
+        """
+        self._wake.set()
+
+    def close(self, wait=False):
+        """
+        Stop claiming jobs. The thread records the outcome of the jobs still running, then exits.
+        :param wait: Wait for that rather than return at once
+        """
+        self._closing = True
+        self._wake.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    # -- runner thread -------------------------------------------------------
+
+    def _run(self):
+        conn = None
+        maintained = pruned = 0.0
+        while True:
+            try:
+                if conn is None:
+                    conn = self.connect()
+                self._record_finished(conn)
+                if self._closing and not self._running:
+                    break
+                now = time.monotonic()
+                if now - maintained >= self.lease / 4:
+                    maintained = now
+                    if self._running:
+                        heartbeat(conn, self.worker)
+                    self.lost += requeue_expired(conn, self.lease)
+                    if now - pruned >= PRUNE_INTERVAL:
+                        pruned = now
+                        prune(conn, self.database, self.retention_days)
+                if not self._closing:
+                    self._claim(conn)
+            except sqlite3.Error as e:
+                # Typically a lock held by another process for longer than the busy timeout; try again later
+                self.logger.warning(f"Job runner for {self.database}: {e}")
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                self.logger.exception(f"Job runner for {self.database} failed")
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        if conn is not None:
+            conn.close()
+
+    def _claim(self, conn):
+        free = self.pools.free()
+        if not any(slots > 0 for slots in free.values()):
+            return
+        for row in claim(conn, self.worker, self.types, free):
+            job_type = self.types[row['type']]
+            context = JobContext(self.database, row['job_id'], self.worker,
+                                 self.write if job_type.kind == 'thread' else None)
+            self.claimed += 1
+            try:
+                future = self.pools.submit(job_type.kind, _execute, job_type.run, context, json.loads(row['params']))
+            except Exception as e:
+                # The pool is shut down or cannot start a process; the attempt counts as failed
+                if retry_or_fail(conn, row['job_id'], self.worker, f"{type(e).__name__}: {e}"):
+                    self.retried += 1
+                else:
+                    self.failed += 1
+                continue
+            self._running[row['job_id']] = job_type
+            future.add_done_callback(functools.partial(self._finished, row['job_id']))
+
+    def _finished(self, job_id, future):
+        # Called on a pool thread; the outcome is recorded on the runner thread
+        self._done.put((job_id, future))
+        self._wake.set()
+
+    def _record_finished(self, conn):
+        while True:
+            try:
+                job_id, future = self._done.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._record(conn, job_id, future)
+            except BaseException:
+                # Recorded on the next pass
+                self._done.put((job_id, future))
+                raise
+            del self._running[job_id]
+
+    def _record(self, conn, job_id, future):
+        job_type = self._running[job_id]
+        try:
+            result = future.result()
+            json.dumps(result)
+        except JobCancelled:
+            finish(conn, job_id, self.worker, 'cancelled')
+            self.cancelled += 1
+        except (JobError, TypeError, ValueError) as e:
+            # Invalid params or an unserializable result: another attempt would fail the same way
+            finish(conn, job_id, self.worker, 'failed', error=str(e))
+            self.failed += 1
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            self.logger.warning(f"Job {job_id} ({job_type.name}) failed: {error}")
+            if retry_or_fail(conn, job_id, self.worker, error):
+                self.retried += 1
+            else:
+                self.failed += 1
+        else:
+            if finish(conn, job_id, self.worker, 'succeeded', result=result):
+                self.succeeded += 1
+                if self.on_success is not None:
+                    self.on_success(job_type)
+
+    def stats(self):
+        return {
+            'worker': self.worker,
+            'started': self._thread is not None,
+            'running': len(self._running),
+            'claimed': self.claimed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'retried': self.retried,
+            'cancelled': self.cancelled,
+            'lost': self.lost,
+        }
+
+
+# -- job types ---------------------------------------------------------------
+
+def check_export(params):
+    _check_keys(params, ('entity', 'format'))
+    params = {'entity': params.get('entity'), 'format': params.get('format', 'csv')}
+    try:
+        bulk_io.get_entity(params['entity'])
+        bulk_io.check_format(params['format'])
+    except bulk_io.BulkIOError as e:
+        raise JobError(str(e))
+    return params
+
+
+def export_job(context, params):
+    """
+    Write every row of an entity to a CSV or NDJSON file, like GET /api/export/<entity> but off the request.
+    :return: {'file', 'filename', 'rows', 'bytes'}
+    """
+    entity, fmt = params['entity'], params['format']
+    table = bulk_io.get_entity(entity)[0]
+    conn = context.connection()
+    path = context.output_path(fmt)
+    partial = path + '.part'
+    # One read transaction, so the row count matches the file
+    conn.execute("BEGIN")
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        lines = 0
+        with open(partial, 'w', encoding='utf-8', newline='') as f:
+            for chunk in bulk_io.iter_export(conn, entity, fmt):
+                f.write(chunk)
+                lines += chunk.count('\n')
+                context.progress(lines / (total + 1), f"Exported {lines:,} of {total:,} rows")
+        os.replace(partial, path)
+    finally:
+        conn.rollback()
+        if os.path.exists(partial):
+            os.remove(partial)
+    return {'file': os.path.basename(path), 'filename': f"{entity}.{fmt}", 'rows': total,
+            'bytes': os.path.getsize(path)}
+
+
+def analytics_rebuild_job(context, params):
+    """
+    Recompute the training-volume summary tables from scratch.
+    :return: {'rows': {table: count}}
+    """
+    context.progress(0, 'Recomputing training volume')
+    return {'rows': analytics.rebuild_aggregates(context.connection())}
+
+
+def check_search_rebuild(params):
+    _check_keys(params, ('check',))
+    if not isinstance(params.get('check', False), bool):
+        raise JobError("'check' must be true or false")
+    return {'check': params.get('check', False)}
+
+
+def search_rebuild_job(context, params):
+    """
+    Rebuild the exercise full-text search index, optionally verifying it afterwards.
+    :return: {'exercises', 'checked'}
+    """
+    context.progress(0, 'Rebuilding the search index')
+    count = search.rebuild_index(context.connection(), check=params['check'])
+    return {'exercises': count, 'checked': params['check']}
+
+
+def check_replace_exercise(params):
+    _check_keys(params, ('from_exercise_id', 'to_exercise_id'))
+    params = {name: _int_param(params, name) for name in ('from_exercise_id', 'to_exercise_id')}
+    if params['from_exercise_id'] == params['to_exercise_id']:
+        raise JobError("'from_exercise_id' and 'to_exercise_id' must differ")
+    return params
+
+
+def replace_exercise_job(context, params):
+    """
+    Replace an exercise by another in every workout that has it, a chunk of workouts per transaction.
+    Workouts that already had the replacement just lose the old exercise. A cancelled or failed job leaves
+    the rewritten chunks in place; running it again finishes the rest.
+    :return: {'workouts'}
+    """
+    source, target = params['from_exercise_id'], params['to_exercise_id']
+    conn = context.connection()
+    if conn.execute("SELECT 1 FROM Exercise WHERE exercise_id = ?", (target,)).fetchone() is None:
+        raise JobError(f"Exercise {target} not found")
+    workout_ids = [row[0] for row in conn.execute(
+        "SELECT workout_id FROM Exercise_In_Workout WHERE exercise_id = ? ORDER BY workout_id", (source,)
+    )]
+    for start in range(0, len(workout_ids), _REPLACE_CHUNK):
+        context.progress(start / len(workout_ids), f"Rewrote {start:,} of {len(workout_ids):,} workouts")
+        chunk = workout_ids[start:start + _REPLACE_CHUNK]
+        context.write(_replace_links, chunk, source, target)
+    return {'workouts': len(workout_ids)}
+
+
+def _replace_links(conn, workout_ids, source, target):
+    conn.executemany(
+        "INSERT INTO Exercise_In_Workout (workout_id, exercise_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+        [(workout_id, target) for workout_id in workout_ids]
+    )
+    conn.executemany(
+        "DELETE FROM Exercise_In_Workout WHERE workout_id = ? AND exercise_id = ?",
+        [(workout_id, source) for workout_id in workout_ids]
+    )
+
+
+def vacuum_job(context, params):
+    """
+    Rebuild the database file to return free pages to the file system, then checkpoint and truncate the WAL.
+    Writes from other connections wait while it runs.
+    :return: {'bytes_before', 'bytes_after'}
+    """
+    conn = context.connection()
+
+    def size():
+        return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    before = size()
+    context.progress(0, 'Vacuuming')
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA optimize")
+    return {'bytes_before': before, 'bytes_after': size()}
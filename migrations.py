@@ -0,0 +1,577 @@
+import os
+import sqlite3
+
+def _table_version_sql(tables):
+    # One counter row per table, bumped by triggers on every insert, update and delete
+    sql = """
+        CREATE TABLE IF NOT EXISTS Table_Version (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+    """
+    for table in tables:
+        sql += f"INSERT OR IGNORE INTO Table_Version (table_name, version) VALUES ('{table}', 0);\n"
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            sql += f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{op.lower()}_version
+        AFTER {op} ON {table}
+        BEGIN
+            UPDATE Table_Version SET version = version + 1 WHERE table_name = '{table}';
+        END;
+            """
+    return sql
+
+
+def _change_log_sql(keys):
+    # One Change_Log entry per inserted, updated or deleted row, numbered by an AUTOINCREMENT version
+    # that never goes back or repeats, even after entries are compacted away. The entry names the row by
+    # rowid (to read its current values) and by primary key (what a deleted row is reported as).
+    sql = """
+        CREATE TABLE IF NOT EXISTS Change_Log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            row_key TEXT NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_change_log_row
+            ON Change_Log (table_name, row_key, version);
+        CREATE TABLE IF NOT EXISTS Sync_State (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO Sync_State (name, value) VALUES ('compacted_through', 0);
+    """
+    for table, columns in keys.items():
+        def key(ref):
+            return 'json_object(' + ', '.join(f"'{column}', {ref}.{column}" for column in columns) + ')'
+        sql += f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_insert_changelog
+        AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO Change_Log (table_name, row_id, row_key) VALUES ('{table}', NEW.rowid, {key('NEW')});
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_update_changelog
+        AFTER UPDATE ON {table}
+        BEGIN
+            INSERT INTO Change_Log (table_name, row_id, row_key, deleted)
+                SELECT '{table}', OLD.rowid, {key('OLD')}, 1 WHERE {key('OLD')} <> {key('NEW')};
+            INSERT INTO Change_Log (table_name, row_id, row_key) VALUES ('{table}', NEW.rowid, {key('NEW')});
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_delete_changelog
+        AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO Change_Log (table_name, row_id, row_key, deleted) VALUES ('{table}', OLD.rowid, {key('OLD')}, 1);
+        END;
+        """
+    return sql
+
+
+def _exercise_fts_sql():
+    # Exercise_FTS is an external-content FTS5 index over a view joining each exercise to its detail,
+    # so the text is stored once and snippet()/highlight() read it back from the base tables.
+    # An external-content 'delete' must be given exactly the values that were indexed, so every
+    # trigger removes the old entry using the row as it was before the change.
+    columns = "name, description, detail_description, equipment_needed"
+    delete_exercise = f"""
+            INSERT INTO Exercise_FTS (Exercise_FTS, rowid, {columns})
+            SELECT 'delete', old.exercise_id, old.name, old.description, d.description, d.equipment_needed
+            FROM (SELECT 1) LEFT JOIN Exercise_Detail d ON d.exercise_detail_id = old.exercise_detail_id;"""
+    insert_exercise = f"""
+            INSERT INTO Exercise_FTS (rowid, {columns})
+            SELECT exercise_id, {columns} FROM Exercise_Search_Source WHERE exercise_id = new.exercise_id;"""
+    # Detail rows are shared by reference, so a detail change re-indexes every exercise pointing at it
+    delete_linked = f"""
+            INSERT INTO Exercise_FTS (Exercise_FTS, rowid, {columns})
+            SELECT 'delete', e.exercise_id, e.name, e.description, {{description}}, {{equipment_needed}}
+            FROM Exercise e WHERE e.exercise_detail_id = {{detail_id}};"""
+    insert_linked = f"""
+            INSERT INTO Exercise_FTS (rowid, {columns})
+            SELECT s.exercise_id, s.name, s.description, s.detail_description, s.equipment_needed
+            FROM Exercise e JOIN Exercise_Search_Source s ON s.exercise_id = e.exercise_id
+            WHERE e.exercise_detail_id = {{detail_id}};"""
+    return f"""
+        CREATE INDEX IF NOT EXISTS idx_exercise_exercise_detail
+            ON Exercise (exercise_detail_id);
+
+        CREATE VIEW IF NOT EXISTS Exercise_Search_Source AS
+            SELECT e.exercise_id, e.name, e.description,
+                   d.description AS detail_description, d.equipment_needed
+            FROM Exercise e
+            LEFT JOIN Exercise_Detail d ON d.exercise_detail_id = e.exercise_detail_id;
+
+        CREATE VIRTUAL TABLE IF NOT EXISTS Exercise_FTS USING fts5(
+            {columns},
+            content = 'Exercise_Search_Source',
+            content_rowid = 'exercise_id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_insert_fts AFTER INSERT ON Exercise
+        BEGIN{insert_exercise}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_delete_fts AFTER DELETE ON Exercise
+        BEGIN{delete_exercise}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_update_fts
+        AFTER UPDATE OF exercise_id, name, description, exercise_detail_id ON Exercise
+        BEGIN{delete_exercise}{insert_exercise}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_detail_insert_fts AFTER INSERT ON Exercise_Detail
+        BEGIN{delete_linked.format(description='NULL', equipment_needed='NULL', detail_id='new.exercise_detail_id')}{
+            insert_linked.format(detail_id='new.exercise_detail_id')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_detail_update_fts
+        AFTER UPDATE OF description, equipment_needed ON Exercise_Detail
+        BEGIN{delete_linked.format(description='old.description', equipment_needed='old.equipment_needed',
+                                   detail_id='old.exercise_detail_id')}{
+            insert_linked.format(detail_id='old.exercise_detail_id')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_detail_delete_fts AFTER DELETE ON Exercise_Detail
+        BEGIN{delete_linked.format(description='old.description', equipment_needed='old.equipment_needed',
+                                   detail_id='old.exercise_detail_id')}{
+            insert_linked.format(detail_id='old.exercise_detail_id')}
+        END;
+
+        INSERT INTO Exercise_FTS (Exercise_FTS) VALUES ('rebuild');
+    """
+
+
+# Training volume is sets x reps x weight from Exercise_Detail; bodyweight exercises (no weight) add none
+_VOLUME = "COALESCE(SUM(d.sets * d.reps * d.weight), 0)"
+
+# Monday of the week containing a date, the key of Weekly_Volume
+_WEEK_START = "date({0}, 'weekday 0', '-6 days')"
+
+
+def _recompute_workouts_sql(workout_ids):
+    # Recompute the per-workout and per-muscle-group rows of the given workouts from their links.
+    # Changes to Workout_Volume and Workout_Muscle_Volume cascade into Weekly_Volume and
+    # Muscle_Group_Volume through their own triggers.
+    return f"""
+            UPDATE Workout_Volume SET (exercise_count, total_sets, total_reps, total_volume) = (
+                SELECT COUNT(*), COALESCE(SUM(d.sets), 0), COALESCE(SUM(d.sets * d.reps), 0), {_VOLUME}
+                FROM Exercise_In_Workout eiw
+                LEFT JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+                LEFT JOIN Exercise_Detail d ON d.exercise_detail_id = e.exercise_detail_id
+                WHERE eiw.workout_id = Workout_Volume.workout_id
+            )
+            WHERE workout_id IN ({workout_ids});
+            DELETE FROM Workout_Muscle_Volume WHERE workout_id IN ({workout_ids});
+            INSERT INTO Workout_Muscle_Volume (workout_id, muscle_group, exercise_count, volume)
+            SELECT eiw.workout_id, e.muscle_group, COUNT(*), {_VOLUME}
+            FROM Exercise_In_Workout eiw
+            JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+            LEFT JOIN Exercise_Detail d ON d.exercise_detail_id = e.exercise_detail_id
+            WHERE eiw.workout_id IN ({workout_ids}) AND e.muscle_group IS NOT NULL
+            GROUP BY eiw.workout_id, e.muscle_group;"""
+
+
+def _add_week_sql(sign, date, day_filter):
+    # Add (sign=1) or remove (sign=-1) the sessions scheduled on matching days, at their current volume
+    week = _WEEK_START.format(date)
+    return f"""
+            INSERT INTO Weekly_Volume (week_start, sessions, volume)
+            SELECT {week}, {sign} * COUNT(*), {sign} * COALESCE(SUM(v.total_volume), 0)
+            FROM Workout_On_Day wod
+            LEFT JOIN Workout_Volume v ON v.workout_id = wod.workout_id
+            WHERE {day_filter} AND {date} IS NOT NULL
+            HAVING COUNT(*) > 0
+            ON CONFLICT (week_start) DO UPDATE SET
+                sessions = sessions + excluded.sessions, volume = volume + excluded.volume;
+            DELETE FROM Weekly_Volume WHERE week_start = {week} AND sessions <= 0;"""
+
+
+def _add_session_sql(sign, row):
+    # Add or remove one scheduled workout (a Workout_On_Day row) in its week
+    return f"""
+            INSERT INTO Weekly_Volume (week_start, sessions, volume)
+            SELECT {_WEEK_START.format('d.date')}, {sign},
+                   {sign} * COALESCE((SELECT total_volume FROM Workout_Volume WHERE workout_id = {row}.workout_id), 0)
+            FROM Day d
+            WHERE d.day_id = {row}.day_id AND d.date IS NOT NULL
+            ON CONFLICT (week_start) DO UPDATE SET
+                sessions = sessions + excluded.sessions, volume = volume + excluded.volume;
+            DELETE FROM Weekly_Volume
+            WHERE sessions <= 0 AND week_start = (
+                SELECT {_WEEK_START.format('date')} FROM Day WHERE day_id = {row}.day_id
+            );"""
+
+
+# Recomputes every training-volume aggregate from the base tables; also used by `flask analytics-rebuild`
+TRAINING_VOLUME_REBUILD_SQL = f"""
+    DELETE FROM Workout_Muscle_Volume;
+    DELETE FROM Muscle_Group_Volume;
+    DELETE FROM Weekly_Volume;
+    DELETE FROM Workout_Volume;
+    INSERT INTO Workout_Volume (workout_id, exercise_count, total_sets, total_reps, total_volume)
+    SELECT w.workout_id, COUNT(eiw.exercise_id), COALESCE(SUM(d.sets), 0), COALESCE(SUM(d.sets * d.reps), 0),
+           {_VOLUME}
+    FROM Workout w
+    LEFT JOIN Exercise_In_Workout eiw ON eiw.workout_id = w.workout_id
+    LEFT JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+    LEFT JOIN Exercise_Detail d ON d.exercise_detail_id = e.exercise_detail_id
+    GROUP BY w.workout_id;
+    INSERT INTO Workout_Muscle_Volume (workout_id, muscle_group, exercise_count, volume)
+    SELECT eiw.workout_id, e.muscle_group, COUNT(*), {_VOLUME}
+    FROM Exercise_In_Workout eiw
+    JOIN Workout_Volume w ON w.workout_id = eiw.workout_id
+    JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+    LEFT JOIN Exercise_Detail d ON d.exercise_detail_id = e.exercise_detail_id
+    WHERE e.muscle_group IS NOT NULL
+    GROUP BY eiw.workout_id, e.muscle_group;
+    INSERT INTO Weekly_Volume (week_start, sessions, volume)
+    SELECT {_WEEK_START.format('d.date')} AS week_start, COUNT(*), COALESCE(SUM(v.total_volume), 0)
+    FROM Workout_On_Day wod
+    JOIN Day d ON d.day_id = wod.day_id
+    LEFT JOIN Workout_Volume v ON v.workout_id = wod.workout_id
+    WHERE d.date IS NOT NULL
+    GROUP BY week_start;
+"""
+
+
+def _training_volume_sql():
+    # Summary tables kept current by triggers (suffix _agg), so analytics reads are O(result)
+    linked_workouts = "SELECT eiw.workout_id FROM Exercise e JOIN Exercise_In_Workout eiw " \
+                      "ON eiw.exercise_id = e.exercise_id WHERE e.exercise_detail_id = {0}.exercise_detail_id"
+    sql = f"""
+        CREATE TABLE IF NOT EXISTS Workout_Volume (
+            workout_id INTEGER PRIMARY KEY,
+            exercise_count INTEGER NOT NULL DEFAULT 0,
+            total_sets INTEGER NOT NULL DEFAULT 0,
+            total_reps INTEGER NOT NULL DEFAULT 0,
+            total_volume INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_workout_volume_total
+            ON Workout_Volume (total_volume, workout_id);
+
+        CREATE TABLE IF NOT EXISTS Workout_Muscle_Volume (
+            workout_id INTEGER NOT NULL,
+            muscle_group TEXT NOT NULL,
+            exercise_count INTEGER NOT NULL,
+            volume INTEGER NOT NULL,
+            PRIMARY KEY (workout_id, muscle_group)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS Muscle_Group_Volume (
+            muscle_group TEXT PRIMARY KEY,
+            workout_count INTEGER NOT NULL,
+            exercise_count INTEGER NOT NULL,
+            volume INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS Weekly_Volume (
+            week_start DATE PRIMARY KEY,
+            sessions INTEGER NOT NULL,
+            volume INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_insert_agg AFTER INSERT ON Workout
+        BEGIN
+            INSERT OR IGNORE INTO Workout_Volume (workout_id) VALUES (new.workout_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_delete_agg AFTER DELETE ON Workout
+        BEGIN
+            DELETE FROM Workout_Muscle_Volume WHERE workout_id = old.workout_id;
+            DELETE FROM Workout_Volume WHERE workout_id = old.workout_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_in_workout_insert_agg AFTER INSERT ON Exercise_In_Workout
+        BEGIN
+            INSERT OR IGNORE INTO Workout_Volume (workout_id) VALUES (new.workout_id);{
+            _recompute_workouts_sql('new.workout_id')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_in_workout_delete_agg AFTER DELETE ON Exercise_In_Workout
+        BEGIN{_recompute_workouts_sql('old.workout_id')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_in_workout_update_agg AFTER UPDATE ON Exercise_In_Workout
+        BEGIN
+            INSERT OR IGNORE INTO Workout_Volume (workout_id) VALUES (new.workout_id);{
+            _recompute_workouts_sql('old.workout_id, new.workout_id')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_update_agg
+        AFTER UPDATE OF exercise_id, exercise_detail_id, muscle_group ON Exercise
+        BEGIN{_recompute_workouts_sql(
+            'SELECT workout_id FROM Exercise_In_Workout WHERE exercise_id IN (old.exercise_id, new.exercise_id)')}
+        END;
+"""
+    for op, row in (('insert', 'new'), ('delete', 'old')):
+        sql += f"""
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_detail_{op}_agg AFTER {op.upper()} ON Exercise_Detail
+        BEGIN{_recompute_workouts_sql(linked_workouts.format(row))}
+        END;
+"""
+    sql += f"""
+        CREATE TRIGGER IF NOT EXISTS trg_exercise_detail_update_agg
+        AFTER UPDATE OF sets, reps, weight ON Exercise_Detail
+        BEGIN{_recompute_workouts_sql(linked_workouts.format('old'))}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_volume_update_agg
+        AFTER UPDATE OF total_volume ON Workout_Volume
+        WHEN new.total_volume IS NOT old.total_volume
+        BEGIN
+            INSERT INTO Weekly_Volume (week_start, sessions, volume)
+            SELECT {_WEEK_START.format('d.date')} AS week_start, 0, (new.total_volume - old.total_volume) * COUNT(*)
+            FROM Workout_On_Day wod
+            JOIN Day d ON d.day_id = wod.day_id
+            WHERE wod.workout_id = new.workout_id AND d.date IS NOT NULL
+            GROUP BY week_start
+            ON CONFLICT (week_start) DO UPDATE SET volume = volume + excluded.volume;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_on_day_insert_agg AFTER INSERT ON Workout_On_Day
+        BEGIN{_add_session_sql(1, 'new')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_on_day_delete_agg AFTER DELETE ON Workout_On_Day
+        BEGIN{_add_session_sql(-1, 'old')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_on_day_update_agg AFTER UPDATE ON Workout_On_Day
+        BEGIN{_add_session_sql(-1, 'old')}{_add_session_sql(1, 'new')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_day_update_agg AFTER UPDATE OF date ON Day
+        WHEN new.date IS NOT old.date
+        BEGIN{_add_week_sql(-1, 'old.date', 'wod.day_id = old.day_id')}{
+            _add_week_sql(1, 'new.date', 'wod.day_id = new.day_id')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_muscle_volume_insert_agg AFTER INSERT ON Workout_Muscle_Volume
+        BEGIN
+            INSERT INTO Muscle_Group_Volume (muscle_group, workout_count, exercise_count, volume)
+            VALUES (new.muscle_group, 1, new.exercise_count, new.volume)
+            ON CONFLICT (muscle_group) DO UPDATE SET
+                workout_count = workout_count + 1,
+                exercise_count = exercise_count + excluded.exercise_count,
+                volume = volume + excluded.volume;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_workout_muscle_volume_delete_agg AFTER DELETE ON Workout_Muscle_Volume
+        BEGIN
+            UPDATE Muscle_Group_Volume SET
+                workout_count = workout_count - 1,
+                exercise_count = exercise_count - old.exercise_count,
+                volume = volume - old.volume
+            WHERE muscle_group = old.muscle_group;
+            DELETE FROM Muscle_Group_Volume WHERE muscle_group = old.muscle_group AND workout_count <= 0;
+        END;
+"""
+    return sql + TRAINING_VOLUME_REBUILD_SQL
+
+
+VERSIONED_TABLES = ('Exercise', 'Exercise_Detail', 'Workout', 'Exercise_In_Workout', 'Day', 'Workout_On_Day')
+
+# Tables recorded in Change_Log for /api/sync, with the primary key columns clients identify rows by
+CHANGE_LOG_KEYS = {
+    'Exercise': ('exercise_id',),
+    'Exercise_Detail': ('exercise_detail_id',),
+    'Workout': ('workout_id',),
+    'Exercise_In_Workout': ('exercise_id', 'workout_id'),
+    'Day': ('day_id',),
+    'Workout_On_Day': ('workout_on_day_id',),
+}
+
+# Numbered schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each entry is (version, description, sql). Append new migrations to the end;
+# never edit or renumber one that has already shipped.
+MIGRATIONS = [
+    (1, "Index Exercise_In_Workout by workout", """
+        CREATE INDEX IF NOT EXISTS idx_exercise_in_workout_workout
+            ON Exercise_In_Workout (workout_id, exercise_id);
+    """),
+    (2, "Index Workout_On_Day by day and by workout", """
+        CREATE INDEX IF NOT EXISTS idx_workout_on_day_day
+            ON Workout_On_Day (day_id, workout_id);
+        CREATE INDEX IF NOT EXISTS idx_workout_on_day_workout
+            ON Workout_On_Day (workout_id);
+    """),
+    (3, "Index Exercise filter columns", """
+        CREATE INDEX IF NOT EXISTS idx_exercise_muscle_intensity_rating
+            ON Exercise (muscle_group, intensity, rating);
+    """),
+    (4, "Index Day by date", """
+        CREATE INDEX IF NOT EXISTS idx_day_date
+            ON Day (date);
+    """),
+    (5, "Index Exercise sort keys and equipment lookups", """
+        CREATE INDEX IF NOT EXISTS idx_exercise_rating
+            ON Exercise (rating);
+        CREATE INDEX IF NOT EXISTS idx_exercise_name
+            ON Exercise (name);
+        CREATE INDEX IF NOT EXISTS idx_exercise_detail_equipment
+            ON Exercise_Detail (equipment_needed);
+    """),
+    (6, "Per-table change counters for cross-process cache invalidation",
+     _table_version_sql(VERSIONED_TABLES)),
+    (7, "Full-text search over exercises and their details", _exercise_fts_sql()),
+    (8, "Training volume aggregates per workout, muscle group and week", _training_volume_sql()),
+    (9, "Id sequences for block-allocated workout and day ids", """
+        CREATE TABLE IF NOT EXISTS Id_Sequence (
+            name TEXT PRIMARY KEY,
+            next_id INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO Id_Sequence (name, next_id)
+            SELECT 'Workout', COALESCE(MAX(workout_id), 0) + 1 FROM Workout;
+        INSERT OR IGNORE INTO Id_Sequence (name, next_id)
+            SELECT 'Day', COALESCE(MAX(day_id), 0) + 1 FROM Day;
+    """),
+    (10, "Recurring schedule rules with per-date exceptions", """
+        CREATE TABLE IF NOT EXISTS Schedule_Rule (
+            rule_id INTEGER PRIMARY KEY,
+            workout_id INTEGER NOT NULL REFERENCES Workout(workout_id) ON DELETE CASCADE,
+            freq TEXT NOT NULL CHECK (freq IN ('DAILY', 'WEEKLY')),
+            interval INTEGER NOT NULL DEFAULT 1 CHECK (interval >= 1),
+            by_weekday TEXT,
+            start_date DATE NOT NULL,
+            end_date DATE,
+            CHECK (end_date IS NULL OR end_date >= start_date)
+        );
+        CREATE INDEX IF NOT EXISTS idx_schedule_rule_workout
+            ON Schedule_Rule (workout_id);
+        CREATE TABLE IF NOT EXISTS Schedule_Rule_Exception (
+            rule_id INTEGER NOT NULL REFERENCES Schedule_Rule(rule_id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            PRIMARY KEY (rule_id, date)
+        ) WITHOUT ROWID;
+    """ + _table_version_sql(('Schedule_Rule', 'Schedule_Rule_Exception'))),
+    (11, "Change log with a monotonic version for delta sync", _change_log_sql(CHANGE_LOG_KEYS)),
+    (12, "Durable queue of background jobs", """
+        CREATE TABLE IF NOT EXISTS Job (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            params TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3 CHECK (max_attempts >= 1),
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            run_after TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            heartbeat_at TEXT,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            started_at TEXT,
+            finished_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_job_status_type
+            ON Job (status, type);
+    """),
+]
+
+
+class MigrationError(sqlite3.DatabaseError):
+    """
+    Raised when a migration fails; the database is left at the previous version.
+    """
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _has_base_schema(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Exercise'"
+    ).fetchone()
+    return row is not None
+
+
+def split_statements(script):
+    """
+    Split an SQL script into complete statements (trigger bodies stay intact).
+    :param script: SQL text containing one or more statements
+    :return: List of statement strings
+    """
+    statements = []
+    current = ''
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ''
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+def _apply(conn, version, sql):
+    """
+    Run one migration script and bump user_version in a single transaction.
+    :param conn: Open SQLite connection
+    :param version: Version number the database will be at afterwards
+    :param sql: SQL script for the migration
+    :return: True if the migration ran, False if another process already applied it
+    """
+    if conn.in_transaction:
+        conn.commit()
+    # BEGIN IMMEDIATE takes the write lock up front so concurrent workers serialize here
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-check under the lock: another process may have migrated in between
+        done = _has_base_schema(conn) if version == 0 else get_version(conn) >= version
+        if done:
+            conn.rollback()
+            return False
+        for statement in split_statements(sql):
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        raise MigrationError(f"Migration {version} failed: {e}") from e
+
+
+def migrate(conn, schema_file=None, target=None):
+    """
+    Bring the database up to date.
+    A database without tables is first created from the schema file (version 0),
+    then every migration newer than PRAGMA user_version is applied in order.
+    :param conn: Open SQLite connection
+    :param schema_file: SQL file with the base schema and seed data
+    :param target: Stop after this version (defaults to the latest)
+    :return: List of migration versions that were applied
+    """
+    target = latest_version() if target is None else target
+
+    if not _has_base_schema(conn):
+        if schema_file is None or not os.path.exists(schema_file):
+            raise MigrationError("Database has no schema and no schema file was given")
+        with open(schema_file, 'r') as f:
+            _apply(conn, 0, f.read())
+
+    applied = []
+    for version, description, sql in MIGRATIONS:
+        if version > target:
+            break
+        if version <= get_version(conn):
+            continue
+        if _apply(conn, version, sql):
+            applied.append(version)
+
+    if applied:
+        # Refresh planner statistics so the new indexes are actually chosen
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+    return applied
@@ -0,0 +1,286 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+# RRULE weekday codes in datetime.weekday() order
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+FREQUENCIES = ('DAILY', 'WEEKLY')
+
+# Longest interval accepted, in days or weeks
+MAX_INTERVAL = 366
+
+
+class RuleError(ValueError):
+    """
+    Raised for an invalid rule definition.
+    """
+
+
+def _date(value, name):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RuleError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+
+def parse_rrule(text):
+    """
+    Read the subset of an iCalendar RRULE this module supports: FREQ (DAILY or WEEKLY), INTERVAL,
+    BYDAY (plain weekday codes) and UNTIL (a date, YYYYMMDD or YYYY-MM-DD).
+    :param text: e.g. 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20251231'
+    :return: Dict of Rule.from_json() fields
+    """
+    fields = {}
+    for part in filter(None, text.strip().removeprefix('RRULE:').split(';')):
+        key, sep, value = part.partition('=')
+        if not sep:
+            raise RuleError(f"Malformed RRULE part '{part}'")
+        key = key.upper()
+        if key == 'FREQ':
+            fields['freq'] = value
+        elif key == 'INTERVAL':
+            fields['interval'] = value
+        elif key == 'BYDAY':
+            fields['weekdays'] = value.split(',')
+        elif key == 'UNTIL':
+            value = value[:10] if '-' in value else f"{value[:4]}-{value[4:6]}-{value[6:8]}"
+            fields['until'] = value
+        else:
+            raise RuleError(f"Unsupported RRULE part '{key}'")
+    return fields
+
+
+class Rule:
+    """
+    A workout repeating every `interval` days (DAILY) or every `interval` weeks on the given weekdays
+    (WEEKLY), from `start` through `until` (inclusive, or open-ended), minus the dates in `exceptions`.
+    """
+
+    def __init__(self, workout_id, freq, start, interval=1, weekdays=(), until=None, exceptions=(), rule_id=None):
+        """
+        :param weekdays: datetime.weekday() numbers; a WEEKLY rule without them repeats on start's weekday
+        """
+        if freq not in FREQUENCIES:
+            raise RuleError(f"'freq' must be one of {', '.join(FREQUENCIES)}")
+        if not 1 <= interval <= MAX_INTERVAL:
+            raise RuleError(f"'interval' must be between 1 and {MAX_INTERVAL}")
+        if until is not None and until < start:
+            raise RuleError("'until' must not be before 'start'")
+        if freq == 'DAILY' and weekdays:
+            raise RuleError("'weekdays' only applies to WEEKLY rules")
+        self.rule_id = rule_id
+        self.workout_id = workout_id
+        self.freq = freq
+        self.interval = interval
+        self.start = start
+        self.until = until
+        self.weekdays = tuple(sorted(set(weekdays))) or ((start.weekday(),) if freq == 'WEEKLY' else ())
+        self.exceptions = frozenset(exceptions)
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Build a rule from a request body: {"workout_id", "freq", "interval", "weekdays": ["MO", ...],
+        "start", "until", "exceptions": [dates]}, or {"workout_id", "start", "rrule": "FREQ=...;..."}.
+        """
+        if not isinstance(data, dict):
+            raise RuleError('Expected a JSON object')
+        fields = dict(data)
+        if fields.get('rrule'):
+            fields.update(parse_rrule(fields['rrule']))
+        workout_id = fields.get('workout_id')
+        if not isinstance(workout_id, int):
+            raise RuleError("'workout_id' must be an integer")
+        try:
+            interval = int(fields.get('interval', 1))
+        except (TypeError, ValueError):
+            raise RuleError("'interval' must be an integer")
+        weekdays = []
+        for code in fields.get('weekdays') or []:
+            if not isinstance(code, str) or code.upper() not in WEEKDAYS:
+                raise RuleError(f"Invalid weekday {code!r}; expected one of {', '.join(WEEKDAYS)}")
+            weekdays.append(WEEKDAYS.index(code.upper()))
+        return cls(
+            workout_id,
+            str(fields.get('freq', 'WEEKLY')).upper(),
+            _date(fields.get('start'), 'start'),
+            interval=interval,
+            weekdays=weekdays,
+            until=_date(fields['until'], 'until') if fields.get('until') else None,
+            exceptions=[_date(value, 'exceptions') for value in fields.get('exceptions') or []],
+        )
+
+    @classmethod
+    def from_row(cls, row, exceptions=()):
+        """
+        :param row: Schedule_Rule row
+        """
+        weekdays = [WEEKDAYS.index(code) for code in row['by_weekday'].split(',')] if row['by_weekday'] else ()
+        return cls(row['workout_id'], row['freq'], datetime.date.fromisoformat(row['start_date']),
+                   interval=row['interval'], weekdays=weekdays,
+                   until=datetime.date.fromisoformat(row['end_date']) if row['end_date'] else None,
+                   exceptions=exceptions, rule_id=row['rule_id'])
+
+    def by_weekday(self):
+        """
+        :return: Weekdays as stored in Schedule_Rule.by_weekday, e.g. 'MO,TH'
+        """
+        return ','.join(WEEKDAYS[day] for day in self.weekdays) or None
+
+    def rrule(self):
+        parts = [f"FREQ={self.freq}", f"INTERVAL={self.interval}"]
+        if self.freq == 'WEEKLY':
+            parts.append(f"BYDAY={self.by_weekday()}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%d')}")
+        return ';'.join(parts)
+
+    def to_dict(self):
+        return {
+            'rule_id': self.rule_id,
+            'workout_id': self.workout_id,
+            'freq': self.freq,
+            'interval': self.interval,
+            'weekdays': [WEEKDAYS[day] for day in self.weekdays],
+            'start': self.start.isoformat(),
+            'until': self.until.isoformat() if self.until else None,
+            'exceptions': sorted(date.isoformat() for date in self.exceptions),
+            'rrule': self.rrule(),
+        }
+
+    def occurrences(self, start, end):
+        """
+        Dates the rule falls on between start and end (inclusive), in order, without exceptions.
+        The first occurrence in the range is computed directly, so the cost is proportional to the
+        number of occurrences returned, not to how long ago the rule started.
+        :param start: datetime.date
+        :param end: datetime.date
+        """
+        first = max(start, self.start)
+        last = min(end, self.until) if self.until is not None else end
+        if first > last:
+            return
+        if self.freq == 'DAILY':
+            # Round up to the next date that is a whole number of intervals after the rule's start
+            offset = -(-(first - self.start).days // self.interval) * self.interval
+            step = datetime.timedelta(days=self.interval)
+            date = self.start + datetime.timedelta(days=offset)
+            while date <= last:
+                if date not in self.exceptions:
+                    yield date
+                date += step
+            return
+
+        # WEEKLY: weeks are counted from the Monday of the week the rule starts in
+        anchor = self.start - datetime.timedelta(days=self.start.weekday())
+        week = (first - anchor).days // 7
+        week = -(-week // self.interval) * self.interval
+        step = datetime.timedelta(weeks=self.interval)
+        monday = anchor + datetime.timedelta(weeks=week)
+        while monday <= last:
+            for day in self.weekdays:
+                date = monday + datetime.timedelta(days=day)
+                if first <= date <= last and date not in self.exceptions:
+                    yield date
+            monday += step
+
+
+class RuleCache:
+    """
+    Schedule rules with their workouts and exceptions, reloaded only when Table_Version shows one of
+    the tables changed, plus an LRU of their expansions per date range.
+    """
+
+    TABLES = ('Schedule_Rule', 'Schedule_Rule_Exception', 'Workout')
+
+    def __init__(self, max_ranges=64):
+        """
+        :param max_ranges: Number of expanded date ranges kept
+        """
+        self.max_ranges = max_ranges
+        self._lock = threading.Lock()
+        self._rules = None
+        self._workouts = None
+        self._versions = None
+        self._expansions = OrderedDict()
+        self.loads = 0
+        self.expansions = 0
+
+    def _table_versions(self, conn):
+        rows = conn.execute(
+            f"SELECT table_name, version FROM Table_Version WHERE table_name IN ({', '.join('?' * len(self.TABLES))})",
+            self.TABLES
+        ).fetchall()
+        return tuple(sorted(tuple(row) for row in rows))
+
+    def _load(self, conn):
+        exceptions = {}
+        for row in conn.execute("SELECT rule_id, date FROM Schedule_Rule_Exception"):
+            exceptions.setdefault(row['rule_id'], []).append(datetime.date.fromisoformat(row['date']))
+        rules = []
+        workouts = {}
+        for row in conn.execute("""
+            SELECT r.*, w.name, w.description, w.focus, w.intensity
+            FROM Schedule_Rule r
+            JOIN Workout w ON w.workout_id = r.workout_id
+            ORDER BY r.rule_id
+        """):
+            rules.append(Rule.from_row(row, exceptions.get(row['rule_id'], ())))
+            workouts[row['workout_id']] = {
+                'workout_id': row['workout_id'],
+                'name': row['name'],
+                'description': row['description'],
+                'focus': row['focus'],
+                'intensity': row['intensity'],
+            }
+        return rules, workouts
+
+    def rules(self, conn):
+        """
+        :param conn: Open SQLite connection
+        :return: Every Rule, current as of the last write
+        """
+        versions = self._table_versions(conn)
+        with self._lock:
+            if self._rules is None or versions != self._versions:
+                self._rules, self._workouts = self._load(conn)
+                self._versions = versions
+                self._expansions.clear()
+                self.loads += 1
+            return self._rules
+
+    def expand(self, conn, start, end):
+        """
+        Occurrences of every rule between start and end (inclusive).
+        :return: Dict of ISO date -> list of workout dicts, each with the 'rule_id' it comes from;
+                 shared with other callers, so it must not be modified
+        """
+        rules = self.rules(conn)
+        key = (start, end)
+        with self._lock:
+            if self._rules is rules:
+                occurrences = self._expansions.get(key)
+                if occurrences is not None:
+                    self._expansions.move_to_end(key)
+                    return occurrences
+            workouts = self._workouts
+
+        occurrences = {}
+        for rule in rules:
+            workout = dict(workouts[rule.workout_id], rule_id=rule.rule_id)
+            for date in rule.occurrences(start, end):
+                occurrences.setdefault(date.isoformat(), []).append(workout)
+        with self._lock:
+            self.expansions += 1
+            if self._rules is rules:
+                self._expansions[key] = occurrences
+                while len(self._expansions) > self.max_ranges:
+                    self._expansions.popitem(last=False)
+        return occurrences
+
+    def stats(self):
+        with self._lock:
+            return {'rules': len(self._rules or ()), 'loads': self.loads, 'expansions': self.expansions,
+                    'cached_ranges': len(self._expansions)}
@@ -0,0 +1,161 @@
+import sqlite3
+
+
+class Record:
+    """
+    Base for compact row objects: one attribute per column, no per-row dict.
+    Subclasses only declare __slots__; rows are built positionally in __slots__ order.
+    """
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Generate a plain positional __init__, as dataclasses do, instead of looping over setattr per row
+        namespace = {}
+        body = ''.join(f"\n    self.{name} = {name}" for name in cls.__slots__) or "\n    pass"
+        exec(f"def __init__(self, {', '.join(cls.__slots__)}):{body}", namespace)
+        cls.__init__ = namespace['__init__']
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(*row)
+
+    def __getitem__(self, key):
+        # Lets templates and older code keep using row['column']
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{n}={getattr(self, n)!r}' for n in self.__slots__)})"
+
+
+class Workout(Record):
+    __slots__ = ('workout_id', 'name', 'description', 'rating', 'focus', 'intensity')
+
+
+class Exercise(Record):
+    __slots__ = ('exercise_id', 'name', 'exercise_detail_id', 'rating', 'intensity', 'muscle_group', 'description')
+
+
+class ExerciseDetail(Record):
+    __slots__ = ('exercise_detail_id', 'description', 'equipment_needed', 'weight', 'intensity', 'rating',
+                 'sets', 'reps')
+
+
+class LinkedExercise(Record):
+    __slots__ = Exercise.__slots__ + ('workout_id',)
+
+
+class DetailedExercise(Record):
+    __slots__ = Exercise.__slots__ + ('detail_description', 'equipment_needed', 'weight', 'detail_intensity',
+                                      'detail_rating', 'sets', 'reps')
+
+
+class ExerciseWorkoutName(Record):
+    __slots__ = ('exercise_name', 'workout_name')
+
+
+def _columns(record, alias):
+    return ', '.join(f'{alias}.{name}' for name in record.__slots__)
+
+
+# Every statement the repository runs, by name. The SQL text never changes between calls, so each
+# connection compiles it once and reuses it from its statement cache (see ConnectionPool).
+STATEMENTS = {
+    'workout': (Workout, f"""
+        SELECT {_columns(Workout, 'w')} FROM Workout w WHERE w.workout_id = ?"""),
+    'workouts': (Workout, f"""
+        SELECT {_columns(Workout, 'w')} FROM Workout w ORDER BY w.workout_id"""),
+    'workouts_on_day': (Workout, f"""
+        SELECT {_columns(Workout, 'w')}
+        FROM Workout w
+        JOIN Workout_On_Day wd ON w.workout_id = wd.workout_id
+        WHERE wd.day_id = ?
+        ORDER BY w.workout_id"""),
+    'exercise': (Exercise, f"""
+        SELECT {_columns(Exercise, 'e')} FROM Exercise e WHERE e.exercise_id = ?"""),
+    'exercises': (Exercise, f"""
+        SELECT {_columns(Exercise, 'e')} FROM Exercise e ORDER BY e.exercise_id"""),
+    'exercise_details': (ExerciseDetail, f"""
+        SELECT {_columns(ExerciseDetail, 'd')} FROM Exercise_Detail d ORDER BY d.exercise_detail_id"""),
+    'exercises_in_workout': (Exercise, f"""
+        SELECT {_columns(Exercise, 'e')}
+        FROM Exercise_In_Workout eiw
+        JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+        WHERE eiw.workout_id = ?
+        ORDER BY e.exercise_id"""),
+    'exercise_in_workout': (LinkedExercise, f"""
+        SELECT {_columns(Exercise, 'e')}, eiw.workout_id
+        FROM Exercise_In_Workout eiw
+        JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+        WHERE eiw.workout_id = ? AND eiw.exercise_id = ?"""),
+    'detailed_exercises_in_workout': (DetailedExercise, f"""
+        SELECT {_columns(Exercise, 'e')}, d.description, d.equipment_needed, d.weight, d.intensity,
+               d.rating, d.sets, d.reps
+        FROM Exercise_In_Workout eiw
+        JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+        JOIN Exercise_Detail d ON d.exercise_detail_id = e.exercise_detail_id
+        WHERE eiw.workout_id = ?
+        ORDER BY e.exercise_id"""),
+    'exercise_workout_names': (ExerciseWorkoutName, """
+        SELECT e.name, w.name
+        FROM Exercise_In_Workout eiw
+        JOIN Exercise e ON e.exercise_id = eiw.exercise_id
+        JOIN Workout w ON w.workout_id = eiw.workout_id
+        WHERE eiw.workout_id = ?
+        ORDER BY e.exercise_id"""),
+}
+
+
+def _cursor(conn, name, params):
+    record, sql = STATEMENTS[name]
+    cur = conn.cursor()
+    cur.row_factory = record.row_factory
+    return cur.execute(sql, params)
+
+
+def fetch_all(conn, name, *params):
+    """
+    Run a named statement.
+    :param conn: Open SQLite connection
+    :param name: Key of STATEMENTS
+    :return: List of the statement's Record type
+    """
+    return _cursor(conn, name, params).fetchall()
+
+
+def fetch_one(conn, name, *params):
+    """
+    Run a named statement expected to match at most one row.
+    :return: Record, or None if nothing matched
+    """
+    return _cursor(conn, name, params).fetchone()
+
+
+def iter_all(conn, name, *params):
+    """
+    Run a named statement and yield its records as they are stepped.
+    """
+    return iter(_cursor(conn, name, params))
+
+
+def json_default(value):
+    """
+    `default` hook for JSON encoders: records serialize as objects keyed by column.
+    """
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
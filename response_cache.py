@@ -0,0 +1,300 @@
+import functools
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+
+class CachedResponse:
+    __slots__ = ('body', 'headers', 'etag', 'tags')
+
+    def __init__(self, body, headers, etag, tags):
+        self.body = body
+        self.headers = headers
+        self.etag = etag
+        self.tags = tags
+
+
+class _Watch:
+    # Outside-write detection state of one database
+    __slots__ = ('database', 'conn', 'data_version', 'table_versions', 'last_check')
+
+    def __init__(self, database):
+        self.database = database
+        self.conn = None
+        self.data_version = None
+        self.table_versions = {}
+        self.last_check = 0.0
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# Default of invalidate(scope=...): the scope of the current request
+_CURRENT = object()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of rendered GET responses, invalidated by table tags.
+
+    Views are cached with @cache.cached('Table', ...) and mutating views declare the
+    tables they write with @cache.invalidates('Table', ...). Writes made by other
+    processes are noticed through PRAGMA data_version and the per-table counters in
+    Table_Version, which triggers keep up to date (see migrations.py).
+
+    One cache can serve several databases (one per tenant) through `scope`: entries and tags
+    are kept apart per database while all of them share the same size bounds.
+    """
+
+    def __init__(self, database=None, max_entries=256, max_bytes=32 * 1024 * 1024, check_interval=0.5, enabled=True,
+                 vary=None, scope=None, max_watched=64):
+        """
+        :param database: Path to the SQLite database file watched for outside writes; may be set later with bind()
+        :param max_entries: Maximum number of cached responses
+        :param max_bytes: Maximum total size of cached bodies
+        :param check_interval: Minimum seconds between data_version checks; local writes are
+                               invalidated immediately, writes from other processes within this delay
+        :param enabled: If False, cached views always run (useful when benchmarking the SQL paths)
+        :param vary: Optional callable returning request state, beyond the URL, that cached views' output
+                     depends on (e.g. the format negotiated from the Accept header); it becomes part of the key
+        :param scope: Optional callable returning (name, database path) of the database the current request
+                      reads; a name of None stands for the database given to bind()
+        :param max_watched: Databases watched for outside writes at once; the least recently used one is
+                            closed beyond that, and its cached responses are checked again when it is next used
+        """
+        self.enabled = enabled
+        self.database = database
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.vary = vary
+        self.scope = scope
+        self.max_watched = max_watched
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._tag_generations = {}
+        self._size = 0
+        self._listeners = []
+
+        self._watch_lock = threading.Lock()
+        self._watches = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    # -- storage -------------------------------------------------------------
+
+    def _scope(self):
+        if self.scope is None:
+            return None, self.database
+        name, database = self.scope()
+        return name, (database if name is not None else self.database)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry, generations):
+        with self._lock:
+            # Skip the store if one of the tables changed while the view was running
+            for tag, generation in generations.items():
+                if self._tag_generations.get(tag, 0) != generation:
+                    return
+            self._remove(key)
+            self._entries[key] = entry
+            self._size += len(entry.body)
+            for tag in entry.tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, *tags, scope=_CURRENT):
+        """
+        Drop every cached response tagged with any of the given tables.
+        :param tags: Table names
+        :param scope: Name of the database the tables belong to; the current request's by default
+        """
+        if scope is _CURRENT:
+            scope = self._scope()[0]
+        with self._lock:
+            for tag in tags:
+                tag = (scope, tag)
+                self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+                for key in list(self._keys_by_tag.pop(tag, ())):
+                    self._remove(key)
+        for listener in self._listeners:
+            listener(*tags)
+
+    def clear(self):
+        with self._lock:
+            for tag in list(self._keys_by_tag):
+                self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._size = 0
+        for listener in self._listeners:
+            listener()
+
+    def add_listener(self, listener):
+        """
+        Call `listener(*tables)` whenever tables are invalidated, locally or by another process,
+        and `listener()` when everything is cleared. Lets other caches follow the same invalidation.
+        """
+        self._listeners.append(listener)
+
+    # -- cross-process invalidation -----------------------------------------
+
+    def bind(self, database):
+        """
+        Watch another database file for outside writes. Everything cached so far is dropped.
+        :param database: Path to the SQLite database file
+        """
+        with self._watch_lock:
+            for watch in self._watches.values():
+                watch.close()
+            self._watches.clear()
+            self.database = database
+        self.clear()
+
+    def sync(self):
+        """
+        Invalidate tables written by other connections since the last check.
+        Cached views do this on every request; call it before reading from other caches that listen here.
+        PRAGMA data_version only changes when another connection commits, so the
+        Table_Version counters are read only when something actually changed.
+        """
+        name, database = self._scope()
+        now = time.monotonic()
+        with self._watch_lock:
+            watch = self._watches.get(name)
+            if watch is None or watch.database != database:
+                if watch is not None:
+                    watch.close()
+                watch = self._watches[name] = _Watch(database)
+                while len(self._watches) > self.max_watched:
+                    self._watches.popitem(last=False)[1].close()
+            self._watches.move_to_end(name)
+            if now - watch.last_check < self.check_interval:
+                return
+            watch.last_check = now
+            try:
+                if watch.conn is None:
+                    watch.conn = sqlite3.connect(database, check_same_thread=False)
+                data_version = watch.conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == watch.data_version:
+                    return
+                watch.data_version = data_version
+                versions = dict(watch.conn.execute("SELECT table_name, version FROM Table_Version"))
+            except sqlite3.Error:
+                # Table_Version not migrated yet: fall back to dropping everything
+                self.clear()
+                return
+            # A newly watched database has no known versions, so everything cached for it is dropped
+            changed = [table for table, version in versions.items()
+                       if watch.table_versions.get(table) != version]
+            watch.table_versions = versions
+        if changed:
+            self.invalidate(*changed, scope=name)
+
+    # -- decorators ----------------------------------------------------------
+
+    def _key(self, scope):
+        key = (scope, request.endpoint, request.path, tuple(sorted(request.args.items(multi=True))))
+        if self.vary is not None:
+            key += (self.vary(),)
+        return key
+
+    def cached(self, *tags):
+        """
+        Cache successful GET responses of a view under the given table tags.
+        Responses carry a strong ETag, and a matching If-None-Match gets a 304
+        straight from the cache without running the view.
+        :param tags: Tables the view reads from
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or not self.enabled:
+                    return view(*args, **kwargs)
+
+                self.sync()
+                scope = self._scope()[0]
+                key = self._key(scope)
+                entry = self._get(key)
+                if entry is None:
+                    self.misses += 1
+                    scoped_tags = tuple((scope, tag) for tag in tags)
+                    with self._lock:
+                        generations = {tag: self._tag_generations.get(tag, 0) for tag in scoped_tags}
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    headers = [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length']
+                    entry = CachedResponse(body, headers, hashlib.sha1(body).hexdigest(), scoped_tags)
+                    self._put(key, entry, generations)
+                else:
+                    self.hits += 1
+
+                response = Response(entry.body, status=200, headers=entry.headers)
+                response.set_etag(entry.etag)
+                # Let browsers keep the body but revalidate with If-None-Match every time
+                response.headers['Cache-Control'] = 'no-cache'
+                response.make_conditional(request)
+                if response.status_code == 304:
+                    self.not_modified += 1
+                return response
+            return wrapper
+        return decorator
+
+    def invalidates(self, *tags):
+        """
+        Invalidate the given table tags after a mutating view has run.
+        :param tags: Tables the view writes to
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    if request.method != 'GET':
+                        self.invalidate(*tags)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,130 @@
+import html
+import re
+
+from exercise_query import INTENSITIES, MUSCLE_GROUPS
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Longest query accepted, in terms; keeps MATCH expressions cheap
+MAX_TERMS = 16
+
+# Above this many matches a query is too unselective to rank: bm25 costs a few microseconds per
+# matching row, and a term found in most of the catalog carries almost no ranking signal anyway.
+# Such queries return matches in index order instead, so latency stays flat as the catalog grows.
+MAX_RANKED_MATCHES = 20000
+
+# bm25 column weights for Exercise_FTS (name, description, detail_description, equipment_needed)
+RANK_WEIGHTS = (10.0, 3.0, 1.0, 2.0)
+
+# Highlight markers unlikely to appear in stored text; swapped for <mark> after HTML-escaping
+_OPEN, _CLOSE = '\x02', '\x03'
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchError(ValueError):
+    """
+    Raised for an empty or invalid search request.
+    """
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression: every word becomes a quoted prefix term,
+    so user input can never be parsed as FTS5 query syntax.
+    :param text: Raw search text, e.g. "bench pre"
+    :return: str, e.g. '"bench"* "pre"*'
+    """
+    terms = _TERM.findall(text or '')
+    if not terms:
+        raise SearchError("'q' must contain at least one word")
+    return ' '.join(f'"{term}"*' for term in terms[:MAX_TERMS])
+
+
+def _marked(value):
+    if value is None:
+        return None
+    return html.escape(value).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+def search_exercises(conn, text, limit=DEFAULT_LIMIT, offset=0, muscle_groups=None, intensities=None):
+    """
+    Full-text search over exercise names and descriptions and their detail text, best matches first.
+    :param conn: Open SQLite connection
+    :param text: Raw search text; each word is matched as a prefix
+    :param limit: Maximum number of results
+    :param offset: Number of results to skip
+    :param muscle_groups: Optional list of muscle groups to restrict to
+    :param intensities: Optional list of intensities to restrict to
+    :return: (results, next_offset, ranked); next_offset is None on the last page and ranked is False
+             when the query matched more than MAX_RANKED_MATCHES rows. Each result has the exercise
+             columns plus rank, name_html and snippet_html (HTML-escaped, matches in <mark>)
+    """
+    if not 1 <= limit <= MAX_LIMIT:
+        raise SearchError(f"'limit' must be between 1 and {MAX_LIMIT}")
+    if offset < 0:
+        raise SearchError("'offset' must not be negative")
+    for group in muscle_groups or []:
+        if group not in MUSCLE_GROUPS:
+            raise SearchError(f"Invalid muscle_group '{group}'")
+    for intensity in intensities or []:
+        if intensity not in INTENSITIES:
+            raise SearchError(f"Invalid intensity '{intensity}'")
+
+    match = build_match_query(text)
+    # Counting stops at the cap, so this costs at most one pass over MAX_RANKED_MATCHES doclist entries
+    matches = conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM Exercise_FTS WHERE Exercise_FTS MATCH ? LIMIT ?)",
+        (match, MAX_RANKED_MATCHES + 1)
+    ).fetchone()[0]
+    ranked = matches <= MAX_RANKED_MATCHES
+
+    # With rank configured in the WHERE clause, FTS5 sorts by bm25 itself and the auxiliary
+    # functions below only run for the rows that are actually returned
+    sql = f"""
+        SELECT e.exercise_id, e.name, e.exercise_detail_id, e.rating, e.intensity, e.muscle_group, e.description,
+               {'Exercise_FTS.rank' if ranked else 'NULL'} AS rank,
+               highlight(Exercise_FTS, 0, '{_OPEN}', '{_CLOSE}') AS name_match,
+               snippet(Exercise_FTS, -1, '{_OPEN}', '{_CLOSE}', '…', 12) AS snippet
+        FROM Exercise_FTS
+        JOIN Exercise e ON e.exercise_id = Exercise_FTS.rowid
+        WHERE Exercise_FTS MATCH ?
+    """
+    if ranked:
+        sql += f" AND Exercise_FTS.rank MATCH 'bm25({', '.join(map(str, RANK_WEIGHTS))})'"
+    params = [match]
+    if muscle_groups:
+        sql += f" AND e.muscle_group IN ({', '.join('?' * len(muscle_groups))})"
+        params.extend(muscle_groups)
+    if intensities:
+        sql += f" AND e.intensity IN ({', '.join('?' * len(intensities))})"
+        params.extend(intensities)
+    sql += " ORDER BY Exercise_FTS.rank" if ranked else " ORDER BY Exercise_FTS.rowid"
+    sql += " LIMIT ? OFFSET ?"
+    params.extend([limit + 1, offset])
+
+    rows = conn.execute(sql, params).fetchall()
+    next_offset = offset + limit if len(rows) > limit else None
+    results = []
+    for row in rows[:limit]:
+        result = {key: row[key] for key in row.keys() if key not in ('name_match', 'snippet')}
+        result['name_html'] = _marked(row['name_match'])
+        result['snippet_html'] = _marked(row['snippet'])
+        results.append(result)
+    return results, next_offset, ranked
+
+
+def rebuild_index(conn, check=False):
+    """
+    Re-index every exercise from the base tables and merge the index b-trees.
+    Needed for databases whose rows were written with the triggers missing (e.g. restored dumps).
+    :param conn: Open SQLite connection
+    :param check: Also verify the index against the base tables afterwards
+    :return: Number of indexed exercises
+    """
+    with conn:
+        conn.execute("INSERT INTO Exercise_FTS (Exercise_FTS) VALUES ('rebuild')")
+        conn.execute("INSERT INTO Exercise_FTS (Exercise_FTS) VALUES ('optimize')")
+    if check:
+        # Raises sqlite3.DatabaseError if the index and the base tables disagree
+        conn.execute("INSERT INTO Exercise_FTS (Exercise_FTS, rank) VALUES ('integrity-check', 1)")
+    return conn.execute("SELECT COUNT(*) FROM Exercise").fetchone()[0]
@@ -0,0 +1,26 @@
+// Live row changes from /api/events (Server-Sent Events), so a page can patch itself after edits
+// made in other tabs instead of refetching its lists.
+//
+// subscribeChanges(['Workout'], onChange, onReset) calls onChange({table, op, key, row}) for every
+// inserted, updated or deleted row of those tables, and onReset(table) when a table has to be
+// reloaded because too much changed at once; table is null when every table has to be reloaded.
+// Returns the EventSource, or null when the browser has none.
+function subscribeChanges(topics, onChange, onReset) {
+    if (!window.EventSource) {
+        return null;
+    }
+    const source = new EventSource(`/api/events?topics=${encodeURIComponent(topics.join(','))}`);
+    source.addEventListener('change', event => {
+        const change = JSON.parse(event.data);
+        if (change.op === 'reset') {
+            onReset(change.table);
+        } else {
+            onChange(change);
+        }
+    });
+    // Sent on reconnecting when the missed changes are no longer available
+    source.addEventListener('reset', () => onReset(null));
+    // A slow client is dropped; EventSource reconnects by itself and resumes from the last event id
+    source.addEventListener('dropped', () => console.warn('Change feed dropped; reconnecting'));
+    return source;
+}
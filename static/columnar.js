@@ -0,0 +1,52 @@
+// Decoder for the columnar JSON format (see columnar.py).
+// Requests made with this Accept type get one array per column instead of one object per row.
+const COLUMNAR_TYPE = 'application/vnd.workoutdb.columnar+json';
+
+// Fetch a list endpoint in columnar form and resolve to the usual array of objects.
+// Resolves to { rows, response } so callers can still read headers such as X-Next-Cursor.
+function fetchColumnar(url, options = {}) {
+    const headers = Object.assign({ Accept: COLUMNAR_TYPE }, options.headers);
+    return fetch(url, Object.assign({}, options, { headers }))
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json().then(payload => ({ rows: decodeColumnar(payload), response }));
+        });
+}
+
+// Turn a columnar payload back into an array of row objects.
+// Dotted column names become nested objects and child lists are sliced out by their offsets.
+function decodeColumnar(payload) {
+    const columns = payload.columns.map(name => {
+        const dictionary = payload.dictionaries[name];
+        const values = payload.values[payload.columns.indexOf(name)];
+        return {
+            path: name.split('.'),
+            values: dictionary ? values.map(code => (code === null ? null : dictionary[code])) : values
+        };
+    });
+
+    const children = Object.entries(payload.children || {}).map(([key, child]) => ({
+        key,
+        offsets: child.offsets,
+        rows: decodeColumnar(child)
+    }));
+
+    const rows = new Array(payload.count);
+    for (let i = 0; i < payload.count; i++) {
+        const row = {};
+        columns.forEach(({ path, values }) => {
+            let target = row;
+            for (let j = 0; j < path.length - 1; j++) {
+                target = target[path[j]] || (target[path[j]] = {});
+            }
+            target[path[path.length - 1]] = values[i];
+        });
+        children.forEach(({ key, offsets, rows: childRows }) => {
+            row[key] = childRows.slice(offsets[i], offsets[i + 1]);
+        });
+        rows[i] = row;
+    }
+    return rows;
+}
@@ -8,10 +8,16 @@ document.addEventListener('DOMContentLoaded', function() {
         return;
     }
 
-    // Fetch exercises linked to the specific workout ID from the backend.
-    fetch(`/api/exercises-in-workouts/${workoutId}`)
-        .then(response => response.json())
-        .then(data => {
+    // Checkbox toggles are batched and saved together through the bulk link endpoint.
+    const linkBatch = createLinkBatch(workoutId, selectedIds => {
+        container.querySelectorAll('.exercise-checkbox').forEach(checkbox => {
+            checkbox.checked = selectedIds.has(Number(checkbox.value));
+        });
+    });
+
+    // Fetch the exercise catalog and the exercises already linked to this workout.
+    Promise.all([fetchAllExercises(), linkBatch.load()])
+        .then(([data, selectedIds]) => {
             if (data.length === 0) {
                 container.textContent = 'No exercises available to display.';
                 return;
@@ -27,41 +33,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 checkbox.className = 'exercise-checkbox';
                 checkbox.id = `exercise-${exercise.exercise_id}`;
                 checkbox.value = exercise.exercise_id;
-                checkbox.checked = exercise.is_selected;  // Assumes is_selected is provided by the API.
+                checkbox.checked = selectedIds.has(exercise.exercise_id);
 
                 const label = document.createElement('label');
                 label.setAttribute('for', `exercise-${exercise.exercise_id}`);
-                label.textContent = `${exercise.exercise_name} - Intensity: ${exercise.intensity}, Muscle Group: ${exercise.muscle_group}`;
+                label.textContent = `${exercise.name} - Intensity: ${exercise.intensity}, Muscle Group: ${exercise.muscle_group}`;
 
                 label.prepend(checkbox);  // Place the checkbox before the label text.
                 exerciseDiv.appendChild(label);
-                container.appendChild(exerciseDiv);
-
-                // Add an event listener to handle changes in checkbox state.
-                checkbox.addEventListener('change', () => {
-                    const method = checkbox.checked ? 'POST' : 'DELETE';
-                    const url = `/api/exercise-to-workout/add/${workoutId}/${exercise.exercise_id}`;
+                container.insertBefore(exerciseDiv, doneButton);
 
-                    fetch(url, {
-                        method: method,
-                        headers: {
-                            'Content-Type': 'application/json'
-                        }
-                    })
-                    .then(response => response.json())
-                    .then(result => {
-                        console.log(result.message);
-                        if (!result.success) {
-                            alert(result.message);
-                            checkbox.checked = !checkbox.checked;  // Revert checkbox on failure.
-                        }
-                    })
-                    .catch(error => {
-                        console.error('API error:', error);
-                        alert('Failed to update exercise status.');
-                        checkbox.checked = !checkbox.checked;  // Revert checkbox on failure.
-                    });
-                });
+                // Queue the change; it is sent with any other toggles made shortly after.
+                checkbox.addEventListener('change', () => linkBatch.toggle(exercise.exercise_id, checkbox.checked));
             });
         })
         .catch(error => {
@@ -74,13 +57,16 @@ document.addEventListener('DOMContentLoaded', function() {
         doneButton.addEventListener('click', () => {
             const workoutId = getWorkoutIdFromUrl();
             if (workoutId) {
-                window.location.href = `/edit-workout/${workoutId}`;
+                // Save pending toggles before leaving the page.
+                linkBatch.flush().then(() => {
+                    window.location.href = `/edit-workout/${workoutId}`;
+                });
             } else {
                 console.error('Workout ID not found in URL.');
             }
         });
         container.appendChild(doneButton);
-        
+
 
     function getWorkoutIdFromUrl() {
         // Extract the Workout ID from the URL path.
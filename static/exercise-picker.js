@@ -0,0 +1,92 @@
+// Shared helpers for the pages that pick exercises for a workout.
+
+// Fetch the whole exercise catalog, following the X-Next-Cursor header page by page.
+// Pages come in columnar form (columnar.js), which is much smaller for a large catalog.
+function fetchAllExercises() {
+    const exercises = [];
+    const params = new URLSearchParams({ limit: '500' });
+
+    function fetchPage() {
+        return fetchColumnar(`/api/exercises?${params}`)
+            .then(({ rows, response }) => {
+                exercises.push(...rows);
+                const nextCursor = response.headers.get('X-Next-Cursor');
+                if (nextCursor) {
+                    params.set('after', nextCursor);
+                    return fetchPage();
+                }
+                return exercises;
+            });
+    }
+    return fetchPage();
+}
+
+// Collect checkbox toggles for one workout and send them to the bulk link endpoint
+// in a single request, shortly after the last toggle or before leaving the page.
+// onSynced(exerciseIds) is called with the server's link set after every save.
+function createLinkBatch(workoutId, onSynced) {
+    const url = `/api/workouts/${workoutId}/exercises`;
+    const pending = new Map();  // exercise id -> true to add, false to remove
+    let timer = null;
+
+    function takePending() {
+        const body = { add: [], remove: [] };
+        pending.forEach((checked, exerciseId) => (checked ? body.add : body.remove).push(exerciseId));
+        pending.clear();
+        return body;
+    }
+
+    function load() {
+        return fetch(url)
+            .then(response => response.json())
+            .then(result => new Set(result.exercise_ids));
+    }
+
+    function flush() {
+        clearTimeout(timer);
+        timer = null;
+        if (pending.size === 0) {
+            return Promise.resolve();
+        }
+        return fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(takePending())
+        })
+            .then(response => response.json())
+            .then(result => {
+                if (!result.success) {
+                    throw new Error(result.message);
+                }
+                if (onSynced) {
+                    onSynced(new Set(result.exercise_ids));
+                }
+            })
+            .catch(error => {
+                console.error('Failed to update exercises:', error);
+                alert('Failed to update exercise status.');
+                // Put the checkboxes back in line with what the server has
+                return load().then(ids => onSynced && onSynced(ids));
+            });
+    }
+
+    function toggle(exerciseId, checked) {
+        pending.set(exerciseId, checked);
+        clearTimeout(timer);
+        timer = setTimeout(flush, 400);
+    }
+
+    // Send whatever is still pending if the user navigates away before the timer fires
+    window.addEventListener('pagehide', () => {
+        if (pending.size > 0) {
+            fetch(url, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(takePending()),
+                keepalive: true
+            });
+        }
+    });
+
+    return { load, toggle, flush };
+}
@@ -1,27 +1,100 @@
+// Parse YYYY-MM-DD as a local date (new Date("YYYY-MM-DD") would be UTC midnight)
+function parseIsoDate(value) {
+    const [year, month, day] = value.split("-").map(Number);
+    return new Date(year, month - 1, day);
+}
+
+const longDateFormat = new Intl.DateTimeFormat("en-US", { weekday: "long", month: "long", day: "numeric", year: "numeric" });
+
 document.addEventListener("DOMContentLoaded", function() {
     const tbody = document.querySelector("#scheduleTable tbody");
 
-    // Retrieve or generate day IDs
-    let dayIds = JSON.parse(localStorage.getItem("dayIds"));
-    if (!dayIds) {
-        dayIds = generateDayIds();
-        localStorage.setItem("dayIds", JSON.stringify(dayIds));
+    // The server renders the month; each day cell carries its date, Day row and scheduled workouts
+    tbody.addEventListener("click", function(event) {
+        const cell = event.target.closest("td[data-date]");
+        if (cell) {
+            handleDayClick(cell);
+        }
+    });
+
+    // Scheduling done in other tabs and screens shows up without reloading the page
+    subscribeChanges(["Day", "Workout_On_Day", "Workout", "Schedule_Rule", "Schedule_Rule_Exception"],
+        applyScheduleChange, refreshMonth);
+
+    function applyScheduleChange(change) {
+        if (change.table === "Day" && change.op !== "delete") {
+            const cell = tbody.querySelector(`td[data-date="${change.row.date}"]`);
+            if (cell && !cell.dataset.dayId) {
+                cell.dataset.dayId = change.row.day_id;
+            }
+            return;
+        }
+        refreshMonth();
     }
 
-    // Function to generate a table row for a week
-    function generateWeekRow() {
-        const row = document.createElement("tr");
-        for (let i = 0; i < 7; i++) {
-            const cell = document.createElement("td");
-            row.appendChild(cell);
+    // Re-read the month shown, once for a burst of changes, and update the cells in place
+    let refreshTimer = null;
+    function refreshMonth() {
+        clearTimeout(refreshTimer);
+        refreshTimer = setTimeout(() => {
+            const cells = tbody.querySelectorAll("td[data-date]");
+            if (cells.length === 0) {
+                return;
+            }
+            const params = new URLSearchParams({ from: cells[0].dataset.date, to: cells[cells.length - 1].dataset.date });
+            fetch(`/api/schedule?${params}`)
+                .then(response => response.json())
+                .then(data => {
+                    const byDate = {};
+                    data.days.forEach(day => {
+                        const merged = byDate[day.date];
+                        if (merged) {
+                            merged.workouts.push(...day.workouts);
+                        } else {
+                            byDate[day.date] = { day_id: day.day_id, note: day.note, workouts: [...day.workouts] };
+                        }
+                    });
+                    cells.forEach(cell => updateCell(cell, byDate[cell.dataset.date]));
+                })
+                .catch(error => console.error('Error refreshing the schedule:', error));
+        }, 200);
+    }
+
+    // Same markup as templates/schedule-day.html
+    function updateCell(cell, day) {
+        const workouts = day ? day.workouts : [];
+        if (day && day.day_id !== null) {
+            cell.dataset.dayId = day.day_id;
+        }
+        if (day && day.note) {
+            cell.dataset.note = day.note;
+        }
+        const oldList = cell.querySelector(".day-workouts");
+        if (oldList) {
+            oldList.remove();
         }
-        return row;
+        if (workouts.length === 0) {
+            cell.classList.remove("has-workouts");
+            cell.removeAttribute("title");
+            return;
+        }
+        const list = document.createElement("ul");
+        list.className = "day-workouts";
+        list.hidden = true;
+        workouts.forEach(workout => {
+            const item = document.createElement("li");
+            item.textContent = `Workout: ${workout.name}, Focus: ${workout.focus}` + (workout.rule_id ? " (recurring)" : "");
+            list.appendChild(item);
+        });
+        cell.appendChild(list);
+        cell.classList.add("has-workouts");
+        cell.title = workouts.map(workout => workout.name).join(", ");
     }
 
     // Click event handler for day cells
-    function handleDayClick() {
-        const dayId = this.dataset.dayId;
-        console.log("Clicked on day with ID:", dayId);
+    function handleDayClick(cell) {
+        const date = cell.dataset.date;
+        console.log("Clicked on day:", date);
         const scheduleContainer = document.getElementById("scheduleContainer");
         scheduleContainer.innerHTML = "";  // Clear existing content
 
@@ -30,9 +103,9 @@ document.addEventListener("DOMContentLoaded", function() {
         popupContainer.className = "popup-container";
 
         // Always visible elements
-        const dayIdElement = createDayIdElement(dayId);
-        const scheduleButton = createScheduleButton(dayId);
-        popupContainer.appendChild(dayIdElement);
+        const dateElement = createDateElement(date, cell.dataset.note);
+        const scheduleButton = createScheduleButton(cell);
+        popupContainer.appendChild(dateElement);
         popupContainer.appendChild(scheduleButton);
 
         // Container for workouts that might be empty
@@ -40,84 +113,70 @@ document.addEventListener("DOMContentLoaded", function() {
         workoutsContainer.className = "workouts-container";
         popupContainer.appendChild(workoutsContainer);
 
-        // Fetch and display workouts for the day
-        fetchWorkoutsForDay(dayId, workoutsContainer);
+        // Display workouts for the day from the rendered cell
+        displayWorkoutsForDay(cell, workoutsContainer);
 
         scheduleContainer.appendChild(popupContainer);
         scheduleContainer.style.display = "block";  // Make container visible
     }
 
-    // Generate all day IDs for the current month
-    function generateDayIds() {
-        const dayIds = [];
-        const currentDate = new Date();
-        const daysInMonth = new Date(currentDate.getFullYear(), currentDate.getMonth() + 1, 0).getDate();
-        for (let i = 0; i < daysInMonth; i++) {
-            dayIds.push(Math.floor(Math.random() * 1000000));  // Generate a random ID
+    // Helper function to create the date display element
+    function createDateElement(date, note) {
+        const dateElement = document.createElement("p");
+        dateElement.textContent = longDateFormat.format(parseIsoDate(date));
+        if (note) {
+            dateElement.textContent += ` - ${note}`;
         }
-        return dayIds;
+        return dateElement;
     }
 
-    // Generate the schedule table
-    function generateScheduleTable() {
-        const currentDate = new Date();
-        const startDayOfWeek = new Date(currentDate.getFullYear(), currentDate.getMonth(), 1).getDay();
-        const daysInMonth = new Date(currentDate.getFullYear(), currentDate.getMonth() + 1, 0).getDate();
-        let dayCounter = 0;  // Track days to assign IDs correctly
-
-        for (let i = 0; i < 6; i++) {  // Up to 6 weeks in a month
-            const row = generateWeekRow();
-            tbody.appendChild(row);
-            row.childNodes.forEach((cell, index) => {
-                if (i === 0 && index < startDayOfWeek || dayCounter >= daysInMonth) {
-                    cell.textContent = "";
-                } else {
-                    dayCounter++;
-                    cell.textContent = dayCounter;
-                    const dayId = dayIds[dayCounter - 1];
-                    cell.dataset.dayId = dayId;
-                    cell.addEventListener("click", handleDayClick);
-                }
-            });
+    // Helper function to display workouts for a specific day
+    function displayWorkoutsForDay(cell, container) {
+        const workouts = cell.querySelectorAll(".day-workouts li");
+        if (workouts.length === 0) {
+            container.textContent = 'No workouts scheduled for this day.';
+            return;
         }
+        workouts.forEach(workout => {
+            const workoutElement = document.createElement("p");
+            workoutElement.textContent = workout.textContent;
+            container.appendChild(workoutElement);
+        });
     }
 
-    // Helper function to create Day ID display element
-    function createDayIdElement(dayId) {
-        const dayIdElement = document.createElement("p");
-        dayIdElement.textContent = "Day ID: " + dayId;
-        return dayIdElement;
-    }
-
-    // Helper function to fetch and display workouts for a specific day
-    function fetchWorkoutsForDay(dayId, container) {
-        fetch(`/api/workouts-by-day/${dayId}`)
+    // Resolve the Day row for a date, creating it on first use
+    function getDayId(cell) {
+        if (cell.dataset.dayId) {
+            return Promise.resolve(cell.dataset.dayId);
+        }
+        return fetch('/api/days', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ date: cell.dataset.date })
+        })
             .then(response => response.json())
-            .then(workouts => {
-                if (workouts.length === 0) {
-                    container.textContent = 'No workouts scheduled for this day.';
-                } else {
-                    workouts.forEach(workout => {
-                        const workoutElement = document.createElement("p");
-                        workoutElement.textContent = `Workout: ${workout.name}, Focus: ${workout.focus}`;
-                        container.appendChild(workoutElement);
-                    });
+            .then(result => {
+                if (!result.success) {
+                    throw new Error(result.error);
                 }
-            })
-            .catch(error => console.error('Error fetching workouts for the day:', error));
+                cell.dataset.dayId = result.day_id;
+                return result.day_id;
+            });
     }
 
     // Helper function to create a schedule workout button
-    function createScheduleButton(dayId) {
+    function createScheduleButton(cell) {
         const button = document.createElement("button");
         button.textContent = "Schedule Workout";
         button.addEventListener("click", () => {
-            const url = `/select-workout/${dayId}`;
-            console.log("Navigating to URL:", url); // Debug statement to check URL
-            window.location.href = url;
+            getDayId(cell)
+                .then(dayId => {
+                    const url = `/select-workout/${dayId}`;
+                    console.log("Navigating to URL:", url); // Debug statement to check URL
+                    window.location.href = url;
+                })
+                .catch(error => console.error('Error creating the day:', error));
         });
         return button;
     }
-
-    generateScheduleTable();  // Initiate the schedule table generation
 });
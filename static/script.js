@@ -1,67 +1,109 @@
 document.addEventListener('DOMContentLoaded', function() {
     const filterDropdown = document.getElementById('filterDropdown');
+    const searchBox = document.getElementById('searchBox');
+    const container = document.getElementById('exercises-container');
+    const pager = document.getElementById('exercises-pager');
+
+    // The server renders the current page; it is put back when a search is cleared
+    const serverPage = container.innerHTML;
+    filterDropdown.value = new URLSearchParams(window.location.search).get('filter') || '';
 
-    // Event listener for filter dropdown
+    // Filtering loads the first server-rendered page of the filtered list
     filterDropdown.addEventListener('change', function() {
         const selectedFilter = this.value;
+        window.location.search = selectedFilter ? new URLSearchParams({ filter: selectedFilter }).toString() : '';
+    });
 
-        // Fetch exercises with filter option
-        fetch(`/api/exercises?filter=${selectedFilter}`)
-            .then(response => response.json())
-            .then(data => {
-                renderExercises(data);
-            })
-            .catch(error => console.error('Error loading the exercises:', error));
+    // Search on the server as the user types, once they pause
+    let searchTimer = null;
+    searchBox.addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            const query = searchBox.value.trim();
+            if (query) {
+                pager.hidden = true;
+                searchExercises(query);
+            } else {
+                container.dataset.requestId = String(Date.now());
+                container.innerHTML = serverPage;
+                pager.hidden = false;
+            }
+        }, 250);
     });
 
-    // Initial fetch to load exercises without filtering
-    fetchExercises();
+    container.addEventListener('click', handleExerciseClick);
 });
 
-function fetchExercises() {
-    fetch('/api/exercises')
+function handleExerciseClick(event) {
+    const button = event.target.closest('button');
+    const exerciseDiv = button && button.closest('.exercise');
+    if (!exerciseDiv) {
+        return;
+    }
+    const exerciseId = exerciseDiv.dataset.exerciseId;
+    if (button.classList.contains('edit-btn')) {
+        editExercise(exerciseId);
+    } else if (button.classList.contains('delete-btn')) {
+        deleteExercise(exerciseId, exerciseDiv);
+    }
+}
+
+// Ranked full-text search; shows the first page of best matches
+function searchExercises(query) {
+    const container = document.getElementById('exercises-container');
+    const requestId = (container.dataset.requestId = String(Date.now()));
+    fetch(`/api/search?${new URLSearchParams({ q: query, limit: '50' })}`)
         .then(response => response.json())
         .then(data => {
-            renderExercises(data);
+            if (container.dataset.requestId !== requestId) {
+                return;
+            }
+            clearExercises(container);
+            renderExercises(data.results || [], container);
         })
-        .catch(error => console.error('Error loading the exercises:', error));
+        .catch(error => console.error('Error searching exercises:', error));
 }
 
-function renderExercises(data) {
-    const container = document.getElementById('exercises-container');
+function clearExercises(container) {
     container.innerHTML = ''; // Clear previous content
+}
 
-    // Setup container for grid display
-    container.style.display = 'grid';
-    container.style.gridTemplateColumns = 'repeat(3, 1fr)'; // 3 columns
-    container.style.gap = '20px'; // Spacing between grid items
-
+function renderExercises(data, container) {
     data.forEach(item => {
         const exerciseDiv = document.createElement('div');
         exerciseDiv.className = 'exercise';
+        exerciseDiv.dataset.exerciseId = item.exercise_id;
 
         const nameHeader = document.createElement('h2');
-        nameHeader.textContent = item.name;
+        if (item.name_html !== undefined) {
+            // Search results: the server escapes the text and wraps matched words in <mark>
+            nameHeader.innerHTML = item.name_html;
+        } else {
+            nameHeader.textContent = item.name;
+        }
         exerciseDiv.appendChild(nameHeader);
 
+        if (item.snippet_html && item.snippet_html !== item.name_html) {
+            const snippet = document.createElement('p');
+            snippet.className = 'search-snippet';
+            snippet.innerHTML = item.snippet_html;
+            exerciseDiv.appendChild(snippet);
+        }
+
         const detailsList = document.createElement('ul');
-        detailsList.style.padding = '0'; // Remove default padding
-        detailsList.style.listStyle = 'none'; // Remove list styling
 
         Object.entries(item).forEach(([key, value]) => {
-            if (!['exercise_id', 'exercise_detail_id', 'name'].includes(key)) {
+            if (!['exercise_id', 'exercise_detail_id', 'name', 'name_html', 'snippet_html', 'rank'].includes(key)) {
                 const detail = document.createElement('li');
                 detail.textContent = `${mapColumnToTitle(key)}: ${value}`;
-                detail.style.fontSize = '0.8em'; // Smaller font size for details
                 detailsList.appendChild(detail);
             }
         });
         exerciseDiv.appendChild(detailsList);
 
+        // Clicks are handled by handleExerciseClick on the container
         const editButton = createButton('Edit', 'edit-btn');
-        editButton.onclick = () => editExercise(item.exercise_id);
         const deleteButton = createButton('Delete', 'delete-btn');
-        deleteButton.onclick = () => deleteExercise(item.exercise_id, exerciseDiv);
 
         exerciseDiv.append(editButton, deleteButton);
 
@@ -86,8 +128,6 @@ function createButton(text, className) {
     const button = document.createElement('button');
     button.textContent = text;
     button.className = className;
-    button.style.padding = '5px 10px';
-    button.style.marginTop = '10px';
     return button;
 }
 
@@ -1,14 +1,21 @@
+let linkBatch = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Get workout ID from the URL on page load
     const workoutId = getWorkoutIdFromUrl();
 
+    // Checkbox toggles are batched and saved together
+    linkBatch = createLinkBatch(workoutId, syncCheckboxes);
+
     // Fetch and display exercises for this workout
     fetchExercises(workoutId);
 
-    // Setup listener for the "done" button to redirect to the edit workout page
+    // Setup listener for the "done" button to save pending changes and redirect to the edit workout page
     const doneButton = document.getElementById('done-button');
     doneButton.addEventListener('click', function() {
-        window.location.href = `/add-or-edit-workout/${workoutId}`;
+        linkBatch.flush().then(() => {
+            window.location.href = `/add-or-edit-workout/${workoutId}`;
+        });
     });
 });
 
@@ -20,20 +27,23 @@ function getWorkoutIdFromUrl() {
 
 async function fetchExercises() {
     try {
-        const response = await fetch('/api/exercises');
-        if (!response.ok) {
-            throw new Error('Failed to fetch exercises');
-        }
-        const data = await response.json();
-        if (!Array.isArray(data)) {
-            throw new Error('Invalid data format');
-        }
-        displayExercises(data);
+        const [exercises, selectedIds] = await Promise.all([fetchAllExercises(), linkBatch.load()]);
+        exercises.forEach(exercise => {
+            exercise.is_selected = selectedIds.has(exercise.exercise_id);
+        });
+        displayExercises(exercises);
     } catch (error) {
         console.error('Failed to fetch exercises:', error);
     }
 }
 
+// Check exactly the exercises linked on the server
+function syncCheckboxes(selectedIds) {
+    document.querySelectorAll('#exercises-container input[type="checkbox"]').forEach(checkbox => {
+        checkbox.checked = selectedIds.has(Number(checkbox.value));
+    });
+}
+
 function displayExercises(exercises) {
     const container = document.getElementById('exercises-container');
     container.innerHTML = ''; // Clear any existing content
@@ -47,11 +57,12 @@ function displayExercises(exercises) {
 
         const checkbox = document.createElement('input');
         checkbox.type = 'checkbox';
+        checkbox.value = exercise.exercise_id;
         checkbox.checked = exercise.is_selected;
-        checkbox.addEventListener('change', () => handleCheckboxChange(getWorkoutIdFromUrl(), exercise.exercise_id, checkbox.checked));
+        checkbox.addEventListener('change', () => linkBatch.toggle(exercise.exercise_id, checkbox.checked));
 
         const label = document.createElement('label');
-        label.textContent = `${exercise.exercise_name} - ${exercise.intensity} - ${exercise.muscle_group}`;
+        label.textContent = `${exercise.name} - ${exercise.intensity} - ${exercise.muscle_group}`;
 
         const descriptionInput = document.createElement('input');
         descriptionInput.type = 'text';
@@ -186,47 +197,6 @@ async function handleFormSubmit(event, exerciseId) {
     }
 }
 
-function handleCheckboxChange(workoutId, exerciseId, isChecked) {
-    // If checkbox is checked, add exercise to workout, otherwise remove it
-    if (isChecked) {
-        addExerciseToWorkout(workoutId, exerciseId);
-    } else {
-        removeExerciseFromWorkout(workoutId, exerciseId);
-    }
-}
-
-async function addExerciseToWorkout(workoutId, exerciseId) {
-    const url = `/api/exercise-to-workout/add/${workoutId}/${exerciseId}`;
-    try {
-        const response = await fetch(url, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
-        });
-        const data = await response.json();
-        console.log(data.message);
-        // After adding, fetch and display exercises again
-        fetchExercises(workoutId);
-    } catch (error) {
-        console.error('Error adding exercise to workout:', error);
-    }
-}
-
-async function removeExerciseFromWorkout(workoutId, exerciseId) {
-    const url = `/api/exercise-to-workout/remove/${workoutId}/${exerciseId}`;
-    try {
-        const response = await fetch(url, {
-            method: 'DELETE',
-            headers: { 'Content-Type': 'application/json' }
-        });
-        const data = await response.json();
-        console.log(data.message);
-        // After removing, fetch and display exercises again
-        fetchExercises(workoutId);
-    } catch (error) {
-        console.error('Error removing exercise from workout:', error);
-    }
-}
-
 function showExerciseDetail(exerciseId) {
     const detailDiv = document.querySelector(`.exercise-container[data-exercise-id="${exerciseId}"] .exercise-detail`);
     const addButton = document.querySelector(`.exercise-container[data-exercise-id="${exerciseId}"] .show-detail-button`);
@@ -8,10 +8,9 @@ document.addEventListener('DOMContentLoaded', function() {
         return;
     }
 
-    // Fetch all workouts from the backend and handle API response.
-    fetch('/api/workouts')
-        .then(response => response.json())
-        .then(data => {
+    // Fetch all workouts from the backend in columnar form, so key names are not repeated for every workout.
+    fetchColumnar('/api/workouts')
+        .then(({ rows: data }) => {
             if (data.length === 0) {
                 container.textContent = 'No workouts available to display.';
                 return;
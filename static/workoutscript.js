@@ -1,100 +1,56 @@
 document.addEventListener('DOMContentLoaded', function() {
     const container = document.getElementById('workouts-container');
     if (container) {
-        fetchWorkouts(container);
+        // Workouts are rendered on the server one page at a time; only their buttons need wiring up
+        container.addEventListener('click', handleWorkoutClick);
+        // Edits from other tabs and screens are applied as they happen
+        subscribeChanges(['Workout', 'Exercise_In_Workout'], applyWorkoutChange, showReloadNotice);
     }
 });
 
-function fetchWorkouts(container) {
-    fetch('/api/workouts')
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`HTTP error! Status: ${response.status}`);
-            }
-            return response.json();
-        })
-        .then(data => {
-            console.log("Workouts fetched:", data);  // Log fetched data for debugging
-            displayWorkouts(data, container);
-        })
-        .catch(error => {
-            console.error('Error loading the workouts:', error);
-            container.textContent = 'Failed to load workouts.';
-        });
+function applyWorkoutChange(change) {
+    const workoutId = change.key.workout_id;
+    const workoutDiv = document.getElementById(`workout-${workoutId}`);
+    if (change.table === 'Workout' && change.op === 'insert') {
+        showReloadNotice();
+    } else if (!workoutDiv) {
+        // Not on this page
+    } else if (change.table === 'Workout' && change.op === 'delete') {
+        workoutDiv.remove();
+    } else if (change.table === 'Workout') {
+        const row = change.row;
+        workoutDiv.querySelector('h2').textContent = row.name;
+        workoutDiv.querySelector('p').textContent =
+            `Description: ${row.description}, Intensity: ${row.intensity}, Focus: ${row.focus}`;
+    } else {
+        // The exercise list of a workout is rendered on the server
+        showReloadNotice();
+    }
 }
 
-function displayWorkouts(data, container) {
-    container.innerHTML = ''; // Clear previous contents
-    if (!data || data.length === 0) {
-        container.textContent = 'No workouts available.';
+function showReloadNotice() {
+    if (document.getElementById('reload-notice')) {
         return;
     }
-
-    data.forEach(workout => {
-        const workoutDiv = createWorkoutDiv(workout);
-        container.appendChild(workoutDiv);
-    });
+    const notice = document.createElement('p');
+    notice.id = 'reload-notice';
+    notice.className = 'notice';
+    notice.innerHTML = 'Workouts have changed. <a href="">Reload</a>';
+    document.getElementById('workouts-container').before(notice);
 }
 
-function createWorkoutDiv(workout) {
-    const workoutDiv = document.createElement('div');
-    workoutDiv.id = `workout-${workout.workout_id}`;
-    workoutDiv.className = 'workout';
-    workoutDiv.appendChild(createWorkoutHeader(workout));
-    workoutDiv.appendChild(createWorkoutDetails(workout));
-
-    if (workout.exercises && workout.exercises.length) {
-        workoutDiv.appendChild(createExercisesList(workout.exercises));
+function handleWorkoutClick(event) {
+    const button = event.target.closest('button');
+    const workoutDiv = button && button.closest('.workout');
+    if (!workoutDiv) {
+        return;
+    }
+    const workoutId = workoutDiv.dataset.workoutId;
+    if (button.classList.contains('edit-btn')) {
+        editWorkout(workoutId);
+    } else if (button.classList.contains('delete-btn')) {
+        deleteWorkout(workoutId, workoutDiv);
     }
-
-    appendActionButtons(workout, workoutDiv);
-    return workoutDiv;
-}
-
-function createWorkoutHeader(workout) {
-    const header = document.createElement('h2');
-    header.textContent = workout.name;
-    return header;
-}
-
-function createWorkoutDetails(workout) {
-    const details = document.createElement('p');
-    details.textContent = `Description: ${workout.description}, Intensity: ${workout.intensity}, Focus: ${workout.focus}`;
-    return details;
-}
-
-function createExercisesList(exercises) {
-    const header = document.createElement('h3');
-    header.textContent = 'Selected Exercises:';
-    const list = document.createElement('ul');
-    exercises.forEach(exercise => {
-        list.appendChild(createExerciseItem(exercise));
-    });
-    const container = document.createElement('div');
-    container.appendChild(header);
-    container.appendChild(list);
-    return container;
-}
-
-function createExerciseItem(exercise) {
-    const item = document.createElement('li');
-    item.textContent = `${exercise.name} - Intensity: ${exercise.intensity}, Muscle Group: ${exercise.muscle_group}, Description: ${exercise.description}`;
-    return item;
-}
-
-function appendActionButtons(workout, workoutDiv) {
-    const editButton = createButton('Edit', 'edit-btn', () => editWorkout(workout.workout_id));
-    const deleteButton = createButton('Delete', 'delete-btn', () => deleteWorkout(workout.workout_id, workoutDiv));
-    workoutDiv.appendChild(editButton);
-    workoutDiv.appendChild(deleteButton);
-}
-
-function createButton(text, className, onClick) {
-    const button = document.createElement('button');
-    button.className = className;
-    button.textContent = text;
-    button.addEventListener('click', onClick);
-    return button;
 }
 
 function deleteWorkout(workoutId, workoutDiv) {
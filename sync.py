@@ -0,0 +1,209 @@
+import datetime
+import json
+
+from migrations import CHANGE_LOG_KEYS
+
+SYNCED_TABLES = tuple(CHANGE_LOG_KEYS)
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Tombstones are kept this long; a client that has not synced for longer must download everything again
+DEFAULT_RETENTION_DAYS = 30
+
+# Rows are read by rowid in chunks of this many, below SQLite's bound parameter limit
+_CHUNK = 500
+
+
+class SyncError(ValueError):
+    """
+    Raised for an invalid sync cursor or page size.
+    """
+
+
+def _int_arg(value, name, minimum=0):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise SyncError(f"'{name}' must be an integer")
+    if number < minimum:
+        raise SyncError(f"'{name}' must be at least {minimum}")
+    return number
+
+
+def page_size(value):
+    """
+    :param value: ?limit= argument, or None for the default
+    """
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    return min(_int_arg(value, 'limit', 1), MAX_PAGE_SIZE)
+
+
+def current_version(conn):
+    """
+    :return: Version of the newest change ever logged; AUTOINCREMENT keeps it even after compaction
+    """
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'Change_Log'").fetchone()
+    return row[0] if row else 0
+
+
+def compacted_through(conn):
+    """
+    :return: Highest version whose tombstones may have been compacted away; older cursors need a full resync
+    """
+    return conn.execute("SELECT value FROM Sync_State WHERE name = 'compacted_through'").fetchone()[0]
+
+
+def _rows_by_rowid(conn, table, row_ids):
+    rows = []
+    for i in range(0, len(row_ids), _CHUNK):
+        chunk = row_ids[i:i + _CHUNK]
+        rows.extend(dict(row) for row in conn.execute(
+            f"SELECT * FROM {table} WHERE rowid IN ({', '.join('?' * len(chunk))})", chunk
+        ))
+    return rows
+
+
+def changes_since(conn, since, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of the rows changed after a version: their current values, or their keys if they were deleted.
+    A row changed several times in the page is reported once. Upserts carry the row as it is now, which
+    may already include later changes; applying those again on the next page is harmless.
+    :param conn: Open SQLite connection, inside a read transaction so the page is consistent
+    :param since: Version the client last synced to
+    :param limit: Maximum number of log entries read
+    :return: Dict {'version', 'more', 'upserts': {table: [rows]}, 'deletes': {table: [keys]}}; the client
+             stores 'version' and asks for the next page with it
+    """
+    entries = conn.execute(
+        "SELECT version, table_name, row_id, row_key, deleted FROM Change_Log "
+        "WHERE version > ? ORDER BY version LIMIT ?",
+        (since, limit + 1)
+    ).fetchall()
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for entry in entries:
+        latest[(entry['table_name'], entry['row_key'])] = entry
+    upsert_ids = {}
+    deletes = {}
+    for (table, row_key), entry in latest.items():
+        if entry['deleted']:
+            deletes.setdefault(table, []).append(json.loads(row_key))
+        else:
+            upsert_ids.setdefault(table, []).append(entry['row_id'])
+    # A row deleted after this page is missing here; its tombstone comes in a later page
+    upserts = {table: _rows_by_rowid(conn, table, row_ids) for table, row_ids in upsert_ids.items()}
+
+    version = entries[-1]['version'] if entries else max(since, current_version(conn))
+    return {'version': version, 'more': more, 'upserts': upserts, 'deletes': deletes}
+
+
+def parse_snapshot_cursor(cursor):
+    """
+    :param cursor: 'version:table:rowid' from a previous snapshot page
+    :return: (version, table index, rowid)
+    """
+    parts = cursor.split(':')
+    if len(parts) != 3 or parts[1] not in SYNCED_TABLES:
+        raise SyncError("'cursor' must come from a previous /api/sync response")
+    return (_int_arg(parts[0], 'cursor'), SYNCED_TABLES.index(parts[1]), _int_arg(parts[2], 'cursor'))
+
+
+def snapshot(conn, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of a full download of every synced table, for new clients and for cursors older than the
+    retained log. The version is taken when the download starts; once the last page is in, syncing from
+    that version picks up whatever changed while the pages were read.
+    :param conn: Open SQLite connection
+    :param cursor: None to start, then the previous page's 'cursor'
+    :param limit: Maximum number of rows in the page
+    :return: Dict {'version', 'more', 'cursor', 'upserts': {table: [rows]}, 'deletes': {}}
+    """
+    if cursor is None:
+        version, index, after = current_version(conn), 0, 0
+    else:
+        version, index, after = parse_snapshot_cursor(cursor)
+    upserts = {}
+    remaining = limit
+    next_cursor = None
+    while index < len(SYNCED_TABLES):
+        table = SYNCED_TABLES[index]
+        rows = conn.execute(
+            f"SELECT rowid AS _rowid, * FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after, remaining + 1)
+        ).fetchall()
+        page = rows[:remaining]
+        if page:
+            upserts[table] = [{key: row[key] for key in row.keys()[1:]} for row in page]
+        if len(rows) > remaining:
+            next_cursor = f"{version}:{table}:{page[-1]['_rowid']}"
+            break
+        remaining -= len(page)
+        index += 1
+        after = 0
+        if remaining == 0 and index < len(SYNCED_TABLES):
+            next_cursor = f"{version}:{SYNCED_TABLES[index]}:0"
+            break
+    return {'version': version, 'more': next_cursor is not None, 'cursor': next_cursor,
+            'upserts': upserts, 'deletes': {}}
+
+
+def sync_page(conn, since=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Page for GET /api/sync. A client without a version, or whose version is older than the compacted
+    part of the log or newer than the log itself (the database was replaced), gets a full snapshot
+    instead of changes; 'full' tells it to discard what it has first.
+    :param since: Version the client last synced to (the ?since= argument), or None
+    :param cursor: ?cursor= argument of a snapshot page after the first
+    :return: changes_since() or snapshot() page, plus 'full'
+    """
+    if since is not None:
+        since = _int_arg(since, 'since')
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+    try:
+        if cursor is not None:
+            page = dict(snapshot(conn, cursor, limit), full=True)
+        elif since is not None and compacted_through(conn) <= since <= current_version(conn):
+            page = dict(changes_since(conn, since, limit), full=False)
+        else:
+            page = dict(snapshot(conn, None, limit), full=True)
+    finally:
+        conn.rollback()
+    return page
+
+
+def compact(conn, retention_days=DEFAULT_RETENTION_DAYS):
+    """
+    Writer operation: drop log entries superseded by a later entry for the same row, which no client needs,
+    and tombstones older than the retention window. Cursors from before the newest dropped tombstone
+    can no longer be served and fall back to a full snapshot.
+    :return: Dict {'superseded', 'tombstones', 'compacted_through'}
+    """
+    superseded = conn.execute("""
+        DELETE FROM Change_Log
+        WHERE EXISTS (
+            SELECT 1 FROM Change_Log AS later
+            WHERE later.table_name = Change_Log.table_name
+              AND later.row_key = Change_Log.row_key
+              AND later.version > Change_Log.version
+        )
+    """).rowcount
+    cutoff = (datetime.datetime.now(datetime.timezone.utc)
+              - datetime.timedelta(days=retention_days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    newest = conn.execute(
+        "SELECT MAX(version) FROM Change_Log WHERE deleted = 1 AND changed_at < ?", (cutoff,)
+    ).fetchone()[0]
+    tombstones = 0
+    if newest is not None:
+        tombstones = conn.execute(
+            "DELETE FROM Change_Log WHERE deleted = 1 AND version <= ?", (newest,)
+        ).rowcount
+        conn.execute(
+            "UPDATE Sync_State SET value = MAX(value, ?) WHERE name = 'compacted_through'", (newest,)
+        )
+    return {'superseded': superseded, 'tombstones': tombstones, 'compacted_through': compacted_through(conn)}
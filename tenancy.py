@@ -0,0 +1,181 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from migrations import migrate
+
+# Tenant names are used as file names and subdomains: lowercase letters, digits and inner hyphens
+TENANT_NAME = re.compile(r'^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$')
+
+
+class TenantError(ValueError):
+    """
+    Raised for an invalid or unknown tenant.
+    """
+
+
+def check_name(name):
+    """
+    :param name: Tenant name from a header, subdomain or command line
+    :return: The name, lowercased
+    """
+    name = name.strip().lower()
+    if not TENANT_NAME.match(name):
+        raise TenantError(f"Invalid tenant name '{name}'")
+    return name
+
+
+def tenant_from_request(request, header='X-Tenant', domain=None):
+    """
+    Tenant a request is for: the `header` if sent, otherwise the subdomain of `domain` in the Host,
+    e.g. 'ironworks' for ironworks.workouts.example.com with domain 'workouts.example.com'.
+    :return: Tenant name, or None if the request names no tenant
+    """
+    name = request.headers.get(header)
+    if not name and domain:
+        host = request.host.rsplit(':', 1)[0].lower()
+        suffix = '.' + domain.lower()
+        if host.endswith(suffix) and '.' not in host[:-len(suffix)]:
+            name = host[:-len(suffix)]
+    return check_name(name) if name else None
+
+
+def database_path(directory, tenant):
+    """
+    :return: Path of a tenant's SQLite file
+    """
+    return os.path.join(directory, f"{tenant}.db")
+
+
+def create_database(path, schema_file):
+    """
+    Create and migrate a tenant database unless it exists. It is built under a temporary name and
+    linked into place, so workers creating the same tenant at once never see a half-built file or wait
+    on each other's migration; the copy that loses the race is discarded.
+    :param path: Path of the tenant's database
+    :param schema_file: SQL file with the base schema and seed data
+    :return: True if this call created the database
+    """
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        conn = sqlite3.connect(temporary)
+        try:
+            migrate(conn, schema_file)
+        finally:
+            # Closing the last connection checkpoints the WAL into the file
+            conn.close()
+        try:
+            os.link(temporary, path)
+        except FileExistsError:
+            return False
+        return True
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(temporary + suffix):
+                os.remove(temporary + suffix)
+
+
+def list_tenants(directory):
+    """
+    :return: Names of the tenants that have a database in the directory
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = (name[:-3] for name in os.listdir(directory) if name.endswith('.db'))
+    return sorted(name for name in names if TENANT_NAME.match(name))
+
+
+class TenantRegistry:
+    """
+    LRU of the tenants whose resources (connection pool, writer thread, caches) are open.
+
+    Each tenant has its own database file, so its writes take its own lock and are committed by its
+    own writer thread; tenants do not wait on each other. Resources are built on a tenant's first
+    request, which is also when a new tenant's database is created and migrated, and the least recently
+    used tenant is closed once more than `max_open` are open. A tenant still serving requests (an open
+    event stream, say) is closed when its last request ends.
+    """
+
+    def __init__(self, factory, max_open=32):
+        """
+        :param factory: Callable building a tenant's resources from its name; the object needs a close()
+        :param max_open: Tenants kept open at once
+        """
+        self.factory = factory
+        self.max_open = max_open
+
+        self._lock = threading.Lock()
+        self._open = OrderedDict()
+        self._users = {}
+        self._closing = {}
+
+        self.opened = 0
+        self.evictions = 0
+
+    def acquire(self, tenant):
+        """
+        Resources of a tenant for the duration of a request; give them back with release().
+        :param tenant: Checked tenant name
+        """
+        evicted = []
+        with self._lock:
+            resources = self._open.get(tenant)
+            if resources is None:
+                # A tenant evicted while still in use is taken back rather than opened a second time
+                resources = self._closing.pop(tenant, None)
+                if resources is None:
+                    resources = self.factory(tenant)
+                    self.opened += 1
+                self._open[tenant] = resources
+                while len(self._open) > self.max_open:
+                    name, oldest = self._open.popitem(last=False)
+                    self.evictions += 1
+                    if self._users.get(name):
+                        # Closed by the release() of its last request
+                        self._closing[name] = oldest
+                    else:
+                        evicted.append(oldest)
+            else:
+                self._open.move_to_end(tenant)
+            self._users[tenant] = self._users.get(tenant, 0) + 1
+        # Closing waits for queued writes, so it happens outside the lock
+        for resources_to_close in evicted:
+            resources_to_close.close()
+        return resources
+
+    def release(self, tenant):
+        """
+        :param tenant: Name given to acquire()
+        """
+        with self._lock:
+            users = self._users[tenant] - 1
+            if users:
+                self._users[tenant] = users
+                return
+            del self._users[tenant]
+            closing = self._closing.pop(tenant, None)
+        if closing is not None:
+            closing.close()
+
+    def close_all(self):
+        with self._lock:
+            resources = list(self._open.values()) + list(self._closing.values())
+            self._open.clear()
+            self._closing.clear()
+        for item in resources:
+            item.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': len(self._open),
+                'max_open': self.max_open,
+                'in_use': len(self._users),
+                'opened': self.opened,
+                'evictions': self.evictions,
+            }
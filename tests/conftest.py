@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from migrations import migrate  # noqa: E402
+
+SCHEMA_FILE = os.path.join(ROOT, 'create-tables.sql')
+
+
+@pytest.fixture
+def database(tmp_path):
+    """
+    Path of a database migrated to the latest version, seeded from create-tables.sql.
+    """
+    path = str(tmp_path / 'workout.db')
+    conn = sqlite3.connect(path)
+    try:
+        migrate(conn, SCHEMA_FILE)
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
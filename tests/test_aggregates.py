@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from analytics import rebuild_aggregates, workout_volume
+
+SUMMARY_TABLES = {
+    'Workout_Volume': 'workout_id',
+    'Workout_Muscle_Volume': 'workout_id, muscle_group',
+    'Muscle_Group_Volume': 'muscle_group',
+    'Weekly_Volume': 'week_start',
+}
+
+
+def summaries(conn):
+    return {table: [tuple(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY {order}")]
+            for table, order in SUMMARY_TABLES.items()}
+
+
+def assert_matches_rebuild(conn):
+    kept_by_triggers = summaries(conn)
+    rebuild_aggregates(conn)
+    assert kept_by_triggers == summaries(conn)
+
+
+def ids(conn, sql):
+    return [row[0] for row in conn.execute(sql)]
+
+
+def test_seed_data_matches_rebuild(conn):
+    assert_matches_rebuild(conn)
+
+
+def test_linking_an_exercise_updates_its_workout(conn):
+    before = workout_volume(conn, 3)
+    exercise_id = conn.execute(
+        "SELECT MIN(exercise_id) FROM Exercise WHERE exercise_id NOT IN "
+        "(SELECT exercise_id FROM Exercise_In_Workout WHERE workout_id = 3)"
+    ).fetchone()[0]
+    with conn:
+        conn.execute("INSERT INTO Exercise_In_Workout (exercise_id, workout_id) VALUES (?, 3)", (exercise_id,))
+    assert workout_volume(conn, 3)['exercise_count'] == before['exercise_count'] + 1
+    assert_matches_rebuild(conn)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_writes_keep_every_summary_in_sync(conn, seed):
+    rng = random.Random(seed)
+    exercises = ids(conn, "SELECT exercise_id FROM Exercise")
+    details = ids(conn, "SELECT exercise_detail_id FROM Exercise_Detail")
+    workouts = ids(conn, "SELECT workout_id FROM Workout")
+    days = ids(conn, "SELECT day_id FROM Day")
+    muscle_groups = ('Chest', 'Back', 'Legs', None)
+
+    def link():
+        conn.execute("INSERT OR IGNORE INTO Exercise_In_Workout (exercise_id, workout_id) VALUES (?, ?)",
+                     (rng.choice(exercises), rng.choice(workouts)))
+
+    def unlink():
+        conn.execute("DELETE FROM Exercise_In_Workout WHERE rowid = "
+                     "(SELECT rowid FROM Exercise_In_Workout ORDER BY random() LIMIT 1)")
+
+    def change_detail():
+        conn.execute("UPDATE Exercise_Detail SET sets = ?, reps = ?, weight = ? WHERE exercise_detail_id = ?",
+                     (rng.randint(1, 6), rng.randint(1, 15), rng.choice((None, rng.randint(5, 100))),
+                      rng.choice(details)))
+
+    def change_muscle_group():
+        conn.execute("UPDATE Exercise SET muscle_group = ? WHERE exercise_id = ?",
+                     (rng.choice(muscle_groups), rng.choice(exercises)))
+
+    def schedule():
+        conn.execute("INSERT INTO Workout_On_Day (workout_id, day_id) VALUES (?, ?)",
+                     (rng.choice(workouts), rng.choice(days)))
+
+    def unschedule():
+        conn.execute("DELETE FROM Workout_On_Day WHERE rowid = "
+                     "(SELECT rowid FROM Workout_On_Day ORDER BY random() LIMIT 1)")
+
+    def move_day():
+        conn.execute("UPDATE Day SET date = date(?, ?) WHERE day_id = ?",
+                     ('2024-05-07', f'{rng.randint(-20, 20)} days', rng.choice(days)))
+
+    writes = (link, unlink, change_detail, change_muscle_group, schedule, unschedule, move_day)
+    with conn:
+        for _ in range(200):
+            rng.choice(writes)()
+    assert_matches_rebuild(conn)
@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+import bulk_io
+
+
+def run_in(conn):
+    def run(fn, *args):
+        with conn:
+            return fn(conn, *args)
+    return run
+
+
+def test_links_already_present_are_skipped_not_imported(conn):
+    exercise_id, workout_id = conn.execute("SELECT exercise_id, workout_id FROM Exercise_In_Workout").fetchone()
+    new_exercise = conn.execute(
+        "SELECT MIN(exercise_id) FROM Exercise WHERE exercise_id NOT IN "
+        "(SELECT exercise_id FROM Exercise_In_Workout WHERE workout_id = ?)", (workout_id,)
+    ).fetchone()[0]
+    records = [{'exercise_id': exercise_id, 'workout_id': workout_id},
+               {'exercise_id': new_exercise, 'workout_id': workout_id}]
+    report = bulk_io.import_records(run_in(conn), 'workout-exercises', enumerate(records, start=1))
+    assert report.to_dict()['imported'] == 1
+    assert report.skipped == 1
+
+
+def test_report_keeps_committed_chunks_when_the_import_stops(conn):
+    records = [{'name': f'Imported {i}', 'focus': 'Bodybuilding', 'intensity': 'Light'} for i in range(5)]
+    calls = []
+
+    def run(fn, *args):
+        calls.append(fn)
+        if len(calls) > 2:
+            raise sqlite3.OperationalError('database is locked')
+        return run_in(conn)(fn, *args)
+
+    report = bulk_io.ImportReport()
+    with pytest.raises(sqlite3.OperationalError):
+        bulk_io.import_records(run, 'workouts', enumerate(records, start=1), chunk_size=2, report=report)
+    assert report.processed == 5
+    assert report.imported == 4
@@ -0,0 +1,20 @@
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+def test_connections_released_after_close_all_are_closed(database):
+    pool = ConnectionPool(database, max_size=2)
+    busy = pool.acquire()
+    pool.release(pool.acquire())
+
+    pool.close_all()
+    assert pool.stats()['open'] == 1
+    pool.release(busy)
+    assert pool.stats()['open'] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        busy.execute("SELECT 1")
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.acquire()
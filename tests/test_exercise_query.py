@@ -0,0 +1,70 @@
+import pytest
+
+from exercise_query import ExerciseQuery, QueryError
+
+
+@pytest.fixture
+def catalog(conn):
+    # Ties and NULLs in the sort keys are what keyset cursors get wrong
+    detail_id = conn.execute("SELECT MIN(exercise_detail_id) FROM Exercise_Detail").fetchone()[0]
+    with conn:
+        conn.executemany(
+            "INSERT INTO Exercise (exercise_id, name, exercise_detail_id, rating, intensity, muscle_group) "
+            "VALUES (?, ?, ?, ?, 'Light', 'Legs')",
+            [(900, 'Tie A', detail_id, 5), (901, 'Tie B', detail_id, 5), (902, None, detail_id, None),
+             (903, None, detail_id, None)]
+        )
+    return conn
+
+
+def expected_order(conn, sort, direction):
+    rows = conn.execute("SELECT exercise_id, rating, name FROM Exercise").fetchall()
+    present = sorted((row for row in rows if row[sort] is not None),
+                     key=lambda row: (row[sort], row['exercise_id']), reverse=direction == 'desc')
+    missing = sorted((row for row in rows if row[sort] is None),
+                     key=lambda row: row['exercise_id'], reverse=direction == 'desc')
+    return [row['exercise_id'] for row in present + missing]
+
+
+def walk(conn, **params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = ExerciseQuery(after=cursor, **params).fetch_page(conn)
+        ids.extend(row['exercise_id'] for row in rows)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize('sort', ['exercise_id', 'rating', 'name'])
+@pytest.mark.parametrize('direction', ['asc', 'desc'])
+def test_cursor_pages_cover_every_row_once_in_order(catalog, sort, direction):
+    ids, pages = walk(catalog, sort=sort, direction=direction, limit=3)
+    assert ids == expected_order(catalog, sort, direction)
+    assert pages == -(-len(ids) // 3)
+
+
+def test_cursor_inside_the_null_block(catalog):
+    query = ExerciseQuery(sort='rating', limit=50, after=',902')
+    rows, cursor = query.fetch_page(catalog)
+    assert [row['exercise_id'] for row in rows] == [903]
+    assert cursor is None
+
+
+def test_filters_apply_to_every_page(catalog):
+    ids, _ = walk(catalog, intensities=['Light'], min_rating=5, sort='rating', direction='desc', limit=1)
+    assert ids == [row[0] for row in catalog.execute(
+        "SELECT exercise_id FROM Exercise WHERE intensity = 'Light' AND rating >= 5 "
+        "ORDER BY rating DESC, exercise_id DESC")]
+
+
+@pytest.mark.parametrize('params', [
+    {'sort': 'rating', 'after': '17'},
+    {'sort': 'rating', 'after': 'high,17'},
+    {'after': 'abc'},
+    {'sort': 'weight'},
+    {'limit': 0},
+])
+def test_invalid_parameters(params):
+    with pytest.raises(QueryError):
+        ExerciseQuery(**params)
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+import bulk_io
+from id_allocator import IdAllocator, reserve_block
+from writer import WriteQueue
+
+FIELDS = {'focus': 'Bodybuilding', 'intensity': 'Light'}
+
+
+@pytest.fixture
+def writer(database):
+    queue = WriteQueue(lambda: sqlite3.connect(database, check_same_thread=False))
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def ids(writer):
+    return IdAllocator(lambda name, size: writer.run(reserve_block, name, size), block_size=10)
+
+
+def import_workouts(writer, ids, *records):
+    return bulk_io.import_records(writer.run, 'workouts', enumerate(records, start=1), next_id=ids.next_id)
+
+
+def workout_names(conn):
+    return dict(conn.execute("SELECT workout_id, name FROM Workout").fetchall())
+
+
+def test_ids_are_unique_and_skip_existing_rows(conn, ids):
+    highest = conn.execute("SELECT MAX(workout_id) FROM Workout").fetchone()[0]
+    handed_out = [ids.next_id('Workout') for _ in range(25)]
+    assert len(set(handed_out)) == 25
+    assert min(handed_out) > highest
+    assert ids.stats()['reservations'] == 3
+
+
+def test_imported_rows_without_an_id_take_one_from_the_allocator(conn, writer, ids):
+    handed_out = ids.next_id('Workout')
+    report = import_workouts(writer, ids, dict(FIELDS, workout_id=None, name='Imported'))
+    assert report.imported == 1
+    imported_id = next(key for key, name in workout_names(conn).items() if name == 'Imported')
+    assert imported_id != handed_out
+    # The id handed out before the import is still free for its create
+    assert handed_out not in workout_names(conn)
+
+
+def test_explicit_ids_inside_a_reserved_block_are_rejected(conn, writer, ids):
+    handed_out = ids.next_id('Workout')
+    report = import_workouts(writer, ids,
+                             dict(FIELDS, workout_id=handed_out + 1, name='Clash'),
+                             dict(FIELDS, workout_id=3, name='Updated'))
+    assert report.imported == 1
+    assert [error['line'] for error in report.errors] == [1]
+    names = workout_names(conn)
+    assert handed_out + 1 not in names
+    assert names[3] == 'Updated'
+
+
+def test_explicit_ids_above_the_reservation_move_it(conn, writer, ids):
+    ids.next_id('Workout')
+    report = import_workouts(writer, ids, dict(FIELDS, workout_id=5000, name='Far'))
+    assert report.imported == 1
+    assert conn.execute("SELECT next_id FROM Id_Sequence WHERE name = 'Workout'").fetchone()[0] == 5001
+    # Once the current block runs out, the next one starts past the imported row
+    assert [ids.next_id('Workout') for _ in range(10)][-1] == 5001
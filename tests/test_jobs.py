@@ -0,0 +1,149 @@
+import sqlite3
+
+import pytest
+
+import jobs
+from writer import WriteQueue
+
+TYPES = {
+    'export': jobs.JobType('export', jobs.export_job, kind='process', concurrency=2, check=jobs.check_export),
+    'vacuum': jobs.JobType('vacuum', jobs.vacuum_job),
+}
+FREE = {'process': 8, 'thread': 8}
+
+
+def enqueue(conn, job_type, count=1, max_attempts=jobs.DEFAULT_MAX_ATTEMPTS):
+    with conn:
+        return [jobs.enqueue(conn, job_type, {}, max_attempts) for _ in range(count)]
+
+
+def status(conn, job_id):
+    return jobs.get_job(conn, job_id)['status']
+
+
+def expire_lease(conn, job_id):
+    with conn:
+        conn.execute("UPDATE Job SET heartbeat_at = '2000-01-01T00:00:00.000Z' WHERE job_id = ?", (job_id,))
+
+
+def test_claim_honours_type_concurrency(conn):
+    exports = enqueue(conn, 'export', 3)
+    vacuums = enqueue(conn, 'vacuum', 2)
+
+    claimed = [row['job_id'] for row in jobs.claim(conn, 'w1', TYPES, FREE)]
+    assert claimed == exports[:2] + vacuums[:1]
+    # Another worker sees the running jobs and takes nothing more of either type
+    assert jobs.claim(conn, 'w2', TYPES, FREE) == []
+
+    assert jobs.finish(conn, exports[0], 'w1', 'succeeded', {'rows': 0})
+    assert [row['job_id'] for row in jobs.claim(conn, 'w2', TYPES, FREE)] == [exports[2]]
+    assert jobs.get_job(conn, exports[2])['worker'] == 'w2'
+
+
+def test_claim_honours_free_pool_slots(conn):
+    exports = enqueue(conn, 'export', 2)
+    vacuums = enqueue(conn, 'vacuum', 1)
+
+    claimed = jobs.claim(conn, 'w1', TYPES, {'process': 1, 'thread': 0})
+    assert [row['job_id'] for row in claimed] == exports[:1]
+    assert status(conn, exports[1]) == 'queued'
+    assert status(conn, vacuums[0]) == 'queued'
+
+
+def test_claim_skips_jobs_waiting_for_a_retry(conn):
+    job_id, = enqueue(conn, 'vacuum')
+    jobs.claim(conn, 'w1', TYPES, FREE)
+    assert jobs.retry_or_fail(conn, job_id, 'w1', 'boom')
+    assert status(conn, job_id) == 'queued'
+    assert jobs.claim(conn, 'w1', TYPES, FREE) == []
+
+
+def test_claim_does_not_lock_an_empty_queue(conn, database):
+    enqueue(conn, 'vacuum')
+    jobs.claim(conn, 'w1', TYPES, FREE)
+    enqueue(conn, 'export')
+    writer = sqlite3.connect(database)
+    writer.execute("BEGIN IMMEDIATE")
+    conn.execute("PRAGMA busy_timeout = 0")
+    try:
+        # Nothing due for the free slots: no write lock is needed to find that out
+        assert jobs.claim(conn, 'w1', TYPES, {'process': 0, 'thread': 8}) == []
+        with pytest.raises(sqlite3.OperationalError):
+            jobs.claim(conn, 'w1', TYPES, FREE)
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_requeue_expired(conn):
+    live, expired = enqueue(conn, 'export', 2)
+    jobs.claim(conn, 'w1', TYPES, FREE)
+    expire_lease(conn, expired)
+
+    assert jobs.requeue_expired(conn, lease=60) == 1
+    job = jobs.get_job(conn, expired)
+    assert job['status'] == 'queued'
+    assert job['worker'] is None
+    assert status(conn, live) == 'running'
+    # The dead worker's late result is ignored
+    assert not jobs.finish(conn, expired, 'w1', 'succeeded')
+
+
+@pytest.mark.parametrize('max_attempts, cancel, expected', [
+    (1, False, 'failed'),
+    (3, True, 'cancelled'),
+])
+def test_requeue_expired_finishes_jobs_that_cannot_run_again(conn, max_attempts, cancel, expected):
+    job_id, = enqueue(conn, 'vacuum', max_attempts=max_attempts)
+    jobs.claim(conn, 'w1', TYPES, FREE)
+    if cancel:
+        with conn:
+            jobs.cancel(conn, job_id)
+    expire_lease(conn, job_id)
+
+    assert jobs.requeue_expired(conn, lease=60) == 1
+    job = jobs.get_job(conn, job_id)
+    assert job['status'] == expected
+    assert job['finished_at'] is not None
+
+
+def test_heartbeat_keeps_the_lease(conn):
+    job_id, = enqueue(conn, 'vacuum')
+    jobs.claim(conn, 'w1', TYPES, FREE)
+    expire_lease(conn, job_id)
+    jobs.heartbeat(conn, 'w1')
+    assert jobs.requeue_expired(conn, lease=60) == 0
+    assert status(conn, job_id) == 'running'
+
+
+def test_replace_exercise_writes_through_the_writer(conn, database):
+    source, target = (row[0] for row in conn.execute(
+        "SELECT exercise_id FROM Exercise_In_Workout GROUP BY exercise_id ORDER BY COUNT(*) DESC LIMIT 2"
+    ))
+    workouts = {row[0] for row in conn.execute(
+        "SELECT workout_id FROM Exercise_In_Workout WHERE exercise_id IN (?, ?)", (source, target)
+    )}
+    with conn:
+        job_id = jobs.enqueue(conn, 'replace-exercise', {})
+    types = {'replace-exercise': jobs.JobType('replace-exercise', jobs.replace_exercise_job)}
+    jobs.claim(conn, 'w1', types, FREE)
+
+    queue = WriteQueue(lambda: sqlite3.connect(database, check_same_thread=False))
+    calls = []
+
+    def write(fn, *args):
+        calls.append(fn)
+        return queue.run(fn, *args)
+
+    context = jobs.JobContext(database, job_id, 'w1', write)
+    try:
+        result = jobs._execute(jobs.replace_exercise_job, context,
+                               {'from_exercise_id': source, 'to_exercise_id': target})
+    finally:
+        queue.close()
+    assert calls
+    assert result['workouts'] > 0
+    assert conn.execute("SELECT 1 FROM Exercise_In_Workout WHERE exercise_id = ?", (source,)).fetchone() is None
+    assert {row[0] for row in conn.execute(
+        "SELECT workout_id FROM Exercise_In_Workout WHERE exercise_id = ?", (target,)
+    )} == workouts
@@ -0,0 +1,97 @@
+import datetime
+
+import pytest
+
+from recurrence import Rule, RuleCache, RuleError, parse_rrule
+
+D = datetime.date
+
+
+def brute_force(rule, start, end):
+    """
+    Reference expansion: test every day in the range against the rule's definition.
+    """
+    dates = []
+    date = start
+    while date <= end:
+        in_range = rule.start <= date and (rule.until is None or date <= rule.until)
+        if rule.freq == 'DAILY':
+            matches = (date - rule.start).days % rule.interval == 0
+        else:
+            anchor = rule.start - datetime.timedelta(days=rule.start.weekday())
+            matches = (date.weekday() in rule.weekdays
+                       and ((date - anchor).days // 7) % rule.interval == 0)
+        if in_range and matches and date not in rule.exceptions:
+            dates.append(date)
+        date += datetime.timedelta(days=1)
+    return dates
+
+
+RULES = [
+    Rule(3, 'DAILY', D(2024, 1, 3)),
+    Rule(3, 'DAILY', D(2024, 1, 3), interval=3, exceptions=[D(2024, 1, 9)]),
+    Rule(3, 'WEEKLY', D(2024, 1, 3)),
+    Rule(3, 'WEEKLY', D(2024, 1, 3), interval=2, weekdays=[0, 3, 6]),
+    Rule(3, 'WEEKLY', D(2024, 1, 7), interval=3, weekdays=[0, 5], until=D(2024, 4, 30)),
+]
+WINDOWS = [
+    (D(2023, 12, 1), D(2024, 2, 15)),
+    (D(2024, 1, 8), D(2024, 1, 8)),
+    (D(2024, 3, 10), D(2024, 6, 30)),
+    (D(2026, 5, 1), D(2026, 5, 31)),
+]
+
+
+@pytest.mark.parametrize('rule', RULES, ids=lambda rule: rule.rrule())
+@pytest.mark.parametrize('window', WINDOWS, ids=lambda window: f"{window[0]}..{window[1]}")
+def test_occurrences_match_brute_force(rule, window):
+    assert list(rule.occurrences(*window)) == brute_force(rule, *window)
+
+
+def test_rrule_round_trip():
+    rule = Rule.from_json({'workout_id': 3, 'start': '2024-01-03',
+                           'rrule': 'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TH,MO;UNTIL=20241231'})
+    assert rule.weekdays == (0, 3)
+    assert rule.until == D(2024, 12, 31)
+    assert rule.rrule() == 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20241231'
+    assert parse_rrule(rule.rrule())['weekdays'] == ['MO', 'TH']
+
+
+@pytest.mark.parametrize('data', [
+    {'workout_id': 3, 'start': '2024-01-03', 'rrule': 'FREQ=MONTHLY'},
+    {'workout_id': 3, 'start': '2024-01-03', 'rrule': 'FREQ=DAILY;BYDAY=MO'},
+    {'workout_id': 3, 'start': '2024-01-03', 'rrule': 'FREQ=WEEKLY;COUNT=3'},
+    {'workout_id': 3, 'start': '2024-01-03', 'until': '2023-12-31'},
+    {'workout_id': 3, 'start': '2024-01-03', 'interval': 0},
+    {'workout_id': 3, 'start': '3 Jan'},
+    {'workout_id': '3', 'start': '2024-01-03'},
+])
+def test_invalid_rules(data):
+    with pytest.raises(RuleError):
+        Rule.from_json(data)
+
+
+def add_rule(conn, rule_id, by_weekday='MO'):
+    with conn:
+        conn.execute("INSERT INTO Schedule_Rule (rule_id, workout_id, freq, by_weekday, start_date) "
+                     "VALUES (?, 3, 'WEEKLY', ?, '2024-01-01')", (rule_id, by_weekday))
+
+
+def test_rule_cache_expands_once_until_a_table_changes(conn):
+    cache = RuleCache()
+    add_rule(conn, 1)
+    january = (D(2024, 1, 1), D(2024, 1, 31))
+
+    first = cache.expand(conn, *january)
+    assert sorted(first) == ['2024-01-01', '2024-01-08', '2024-01-15', '2024-01-22', '2024-01-29']
+    assert first['2024-01-08'][0]['rule_id'] == 1
+    assert cache.expand(conn, *january) is first
+    assert cache.stats()['loads'] == 1
+
+    with conn:
+        conn.execute("INSERT INTO Schedule_Rule_Exception (rule_id, date) VALUES (1, '2024-01-08')")
+    assert '2024-01-08' not in cache.expand(conn, *january)
+
+    add_rule(conn, 2, 'TU')
+    assert [w['rule_id'] for w in cache.expand(conn, *january)['2024-01-02']] == [2]
+    assert cache.stats()['loads'] == 3
@@ -0,0 +1,95 @@
+import pytest
+
+import search
+from search import SearchError, build_match_query, search_exercises
+
+
+@pytest.fixture
+def detail_id(conn):
+    return conn.execute("SELECT MIN(exercise_detail_id) FROM Exercise_Detail").fetchone()[0]
+
+
+def add_exercise(conn, exercise_id, name, description, detail_id):
+    with conn:
+        conn.execute(
+            "INSERT INTO Exercise (exercise_id, name, exercise_detail_id, rating, intensity, muscle_group, description) "
+            "VALUES (?, ?, ?, 5, 'Light', 'Legs', ?)",
+            (exercise_id, name, detail_id, description)
+        )
+
+
+def found(conn, text, **kwargs):
+    return [result['exercise_id'] for result in search_exercises(conn, text, **kwargs)[0]]
+
+
+def test_match_query_quotes_every_term_as_a_prefix():
+    assert build_match_query('bench pre') == '"bench"* "pre"*'
+    # FTS5 operators in user input are plain words
+    assert build_match_query('curl OR "NEAR(x') == '"curl"* "OR"* "NEAR"* "x"*'
+    with pytest.raises(SearchError):
+        build_match_query(' -- ')
+
+
+def test_triggers_keep_the_index_in_sync(conn, detail_id):
+    add_exercise(conn, 900, 'Zercher squat', 'Bar in the elbows', detail_id)
+    assert found(conn, 'zerch') == [900]
+
+    with conn:
+        conn.execute("UPDATE Exercise SET name = 'Anderson squat' WHERE exercise_id = 900")
+    assert found(conn, 'zercher') == []
+    assert found(conn, 'anderson') == [900]
+
+    with conn:
+        conn.execute("DELETE FROM Exercise WHERE exercise_id = 900")
+    assert found(conn, 'anderson') == []
+
+
+def test_detail_changes_are_indexed(conn, detail_id):
+    add_exercise(conn, 900, 'Zercher squat', None, detail_id)
+    with conn:
+        conn.execute("UPDATE Exercise_Detail SET equipment_needed = 'Kettlebellzz' WHERE exercise_detail_id = ?",
+                     (detail_id,))
+    assert 900 in found(conn, 'kettlebellzz', limit=100)
+
+
+def test_name_matches_rank_above_description_matches(conn, detail_id):
+    add_exercise(conn, 900, 'Plain row', 'Like a quuxpress', detail_id)
+    add_exercise(conn, 901, 'Quuxpress', 'Plain', detail_id)
+    results, next_offset, ranked = search_exercises(conn, 'quuxpress')
+    assert ranked
+    assert [result['exercise_id'] for result in results] == [901, 900]
+    assert next_offset is None
+
+
+def test_highlights_are_escaped(conn, detail_id):
+    add_exercise(conn, 900, '<b>Quux</b> press', None, detail_id)
+    result = search_exercises(conn, 'quux')[0][0]
+    assert result['name_html'] == '&lt;b&gt;<mark>Quux</mark>&lt;/b&gt; press'
+
+
+def test_offset_pages(conn, detail_id):
+    for i in range(5):
+        add_exercise(conn, 900 + i, f'Quux variation {i}', None, detail_id)
+    first, next_offset, _ = search_exercises(conn, 'quux', limit=3)
+    second, last, _ = search_exercises(conn, 'quux', limit=3, offset=next_offset)
+    assert next_offset == 3 and last is None
+    assert sorted(r['exercise_id'] for r in first + second) == list(range(900, 905))
+
+
+def test_unselective_queries_are_not_ranked(conn, detail_id, monkeypatch):
+    for i in range(3):
+        add_exercise(conn, 900 + i, f'Quux variation {i}', None, detail_id)
+    monkeypatch.setattr(search, 'MAX_RANKED_MATCHES', 2)
+    results, _, ranked = search_exercises(conn, 'quux')
+    assert not ranked
+    assert [result['exercise_id'] for result in results] == [900, 901, 902]
+    assert all(result['rank'] is None for result in results)
+
+
+def test_rebuild_index_recovers_rows_written_without_triggers(conn, detail_id):
+    with conn:
+        conn.execute("DROP TRIGGER trg_exercise_insert_fts")
+    add_exercise(conn, 900, 'Zercher squat', None, detail_id)
+    assert found(conn, 'zercher') == []
+    search.rebuild_index(conn, check=True)
+    assert found(conn, 'zercher') == [900]
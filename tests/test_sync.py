@@ -0,0 +1,93 @@
+import pytest
+
+import sync
+from migrations import CHANGE_LOG_KEYS
+
+
+def write(conn, sql, params=()):
+    with conn:
+        conn.execute(sql, params)
+
+
+def rename_workout(conn, workout_id, name):
+    write(conn, "UPDATE Workout SET name = ? WHERE workout_id = ?", (name, workout_id))
+
+
+def read_pages(conn, since, limit, between_pages=None):
+    """
+    Follow changes_since() pages until the log is exhausted, like a client would.
+    :return: (final version, {(table, key) -> row or None for a delete})
+    """
+    seen = {}
+    while True:
+        page = sync.changes_since(conn, since, limit)
+        for table, rows in page['upserts'].items():
+            for row in rows:
+                seen[(table, row[CHANGE_LOG_KEYS[table][0]])] = row
+        for table, keys in page['deletes'].items():
+            for key in keys:
+                seen[(table, key[CHANGE_LOG_KEYS[table][0]])] = None
+        since = page['version']
+        if not page['more']:
+            return since, seen
+        if between_pages is not None:
+            between_pages()
+            between_pages = None
+
+
+@pytest.fixture
+def day_id(conn):
+    return conn.execute("SELECT MIN(day_id) FROM Day").fetchone()[0]
+
+
+def test_changes_since_pages_through_the_log(conn, day_id):
+    start = sync.current_version(conn)
+    rename_workout(conn, 3, 'Legs')
+    rename_workout(conn, 4, 'Arms')
+    write(conn, "DELETE FROM Day WHERE day_id = ?", (day_id,))
+    rename_workout(conn, 3, 'Legs again')
+
+    version, seen = read_pages(conn, start, limit=1)
+    assert version == sync.current_version(conn)
+    assert seen[('Workout', 3)]['name'] == 'Legs again'
+    assert seen[('Workout', 4)]['name'] == 'Arms'
+    assert seen[('Day', day_id)] is None
+
+
+def test_paging_survives_compaction_between_pages(conn, day_id):
+    start = sync.current_version(conn)
+    rename_workout(conn, 3, 'Legs')
+    rename_workout(conn, 4, 'Arms')
+    write(conn, "DELETE FROM Day WHERE day_id = ?", (day_id,))
+    rename_workout(conn, 3, 'Legs again')
+
+    def compact():
+        # Drops the superseded entry for workout 3 the client has already passed, keeps the fresh tombstone
+        with conn:
+            result = sync.compact(conn, retention_days=30)
+        assert result['superseded'] == 1
+        assert result['tombstones'] == 0
+
+    version, seen = read_pages(conn, start, limit=1, between_pages=compact)
+    assert version == sync.current_version(conn)
+    assert seen[('Workout', 3)]['name'] == 'Legs again'
+    assert seen[('Workout', 4)]['name'] == 'Arms'
+    assert seen[('Day', day_id)] is None
+
+
+def test_cursor_older_than_compacted_tombstones_gets_a_snapshot(conn, day_id):
+    start = sync.current_version(conn)
+    write(conn, "DELETE FROM Day WHERE day_id = ?", (day_id,))
+    rename_workout(conn, 3, 'Legs')
+    with conn:
+        result = sync.compact(conn, retention_days=-1)
+    assert result['tombstones'] == 1
+    assert result['compacted_through'] > start
+
+    stale = sync.sync_page(conn, since=start)
+    assert stale['full']
+    current = sync.sync_page(conn, since=result['compacted_through'])
+    assert not current['full']
+    assert [row['name'] for row in current['upserts']['Workout']] == ['Legs']
+    # Compaction never lowers the version a client can reach
+    assert sync.current_version(conn) >= result['compacted_through']
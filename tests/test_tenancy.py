@@ -0,0 +1,66 @@
+import pytest
+
+import tenancy
+
+
+class Resources:
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+@pytest.fixture
+def registry():
+    built = []
+
+    def factory(tenant):
+        resources = Resources(tenant)
+        built.append(resources)
+        return resources
+
+    registry = tenancy.TenantRegistry(factory, max_open=1)
+    registry.built = built
+    return registry
+
+
+def test_idle_tenant_is_closed_when_evicted(registry):
+    a = registry.acquire('a')
+    registry.release('a')
+    registry.acquire('b')
+    assert a.closed == 1
+    assert registry.stats()['evictions'] == 1
+
+
+def test_tenant_evicted_while_in_use_closes_after_its_last_request(registry):
+    a = registry.acquire('a')
+    registry.acquire('a')
+    registry.acquire('b')
+    # Still serving two requests: evicted from the LRU but left open
+    assert a.closed == 0
+    assert registry.stats() == {'open': 1, 'max_open': 1, 'in_use': 2, 'opened': 2, 'evictions': 1}
+
+    registry.release('a')
+    assert a.closed == 0
+    registry.release('a')
+    assert a.closed == 1
+
+
+def test_tenant_evicted_while_in_use_is_taken_back_not_reopened(registry):
+    a = registry.acquire('a')
+    b = registry.acquire('b')
+    assert registry.acquire('a') is a
+    assert len(registry.built) == 2
+    # Taking 'a' back evicted 'b', which is still in use
+    assert b.closed == 0
+
+    registry.release('a')
+    registry.release('a')
+    assert a.closed == 0
+    registry.release('b')
+    assert b.closed == 1
+    registry.close_all()
+    assert a.closed == 1
+    assert b.closed == 1
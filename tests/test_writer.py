@@ -0,0 +1,126 @@
+import contextvars
+import sqlite3
+import threading
+
+import pytest
+
+from writer import WriteQueue
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'writer.db')
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE Note (note_id INTEGER PRIMARY KEY, body TEXT NOT NULL UNIQUE)")
+    conn.close()
+    return path
+
+
+def connect_to(path, busy_timeout=5.0):
+    return lambda: sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+
+
+def bodies(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT body FROM Note"))
+    finally:
+        conn.close()
+
+
+def insert(conn, body):
+    return conn.execute("INSERT INTO Note (body) VALUES (?)", (body,)).lastrowid
+
+
+def insert_then_fail(conn, body):
+    insert(conn, body)
+    raise ValueError('rejected')
+
+
+def test_failing_operation_is_rolled_back_alone(path):
+    writer = WriteQueue(connect_to(path))
+    started, proceed = threading.Event(), threading.Event()
+
+    def hold(conn):
+        started.set()
+        proceed.wait(5)
+        return insert(conn, 'first')
+
+    # Everything queued while the first batch is still open is committed together in the next one
+    first = writer.submit(hold)
+    assert started.wait(5)
+    futures = [writer.submit(insert, 'a'), writer.submit(insert_then_fail, 'b'), writer.submit(insert, 'c')]
+    proceed.set()
+
+    assert first.result(5)
+    assert futures[0].result(5) and futures[2].result(5)
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    writer.close()
+
+    assert bodies(path) == ['a', 'c', 'first']
+    stats = writer.stats()
+    assert stats['batches'] == 2
+    assert stats['largest_batch'] == 3
+    assert stats['failed'] == 1
+
+
+def test_constraint_error_fails_only_its_operation(path):
+    writer = WriteQueue(connect_to(path))
+    writer.run(insert, 'x')
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.run(insert, 'x')
+    assert writer.run(insert, 'y')
+    writer.close()
+    assert bodies(path) == ['x', 'y']
+
+
+def test_batch_is_retried_while_another_process_holds_the_lock(path):
+    # No busy_timeout on the writer's connection, so every attempt against the held lock fails at once
+    writer = WriteQueue(connect_to(path, busy_timeout=0), retries=8, retry_delay=0.02)
+    blocker = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(0.2, blocker.execute, ("COMMIT",))
+    timer.start()
+    try:
+        assert writer.run(insert, 'after lock')
+    finally:
+        timer.join()
+        blocker.close()
+        writer.close()
+    assert writer.stats()['busy_retries'] >= 1
+    assert bodies(path) == ['after lock']
+
+
+def test_gives_up_after_the_retries(path):
+    writer = WriteQueue(connect_to(path, busy_timeout=0), retries=2, retry_delay=0.01)
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            writer.run(insert, 'never')
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+        writer.close()
+    assert writer.stats()['busy_retries'] == 2
+    assert bodies(path) == []
+
+
+def test_after_commit_errors_do_not_fail_the_batch(path):
+    def broken_hook(result):
+        raise RuntimeError('subscriber gone')
+
+    writer = WriteQueue(connect_to(path), after_commit=broken_hook)
+    assert writer.run(insert, 'kept')
+    writer.close()
+    assert bodies(path) == ['kept']
+
+
+def test_operations_run_in_the_callers_context(path):
+    request_id = contextvars.ContextVar('request_id', default=None)
+    writer = WriteQueue(connect_to(path))
+    request_id.set('req-1')
+    assert writer.run(lambda conn: request_id.get()) == 'req-1'
+    writer.close()
@@ -0,0 +1,294 @@
+import threading
+
+import numpy as np
+
+from exercise_query import INTENSITIES, MUSCLE_GROUPS
+
+# How each focus weighs the exercise features:
+# (preference for Light/Moderate/Vigorous, preference for heavy weight, preference for bodyweight, default muscle groups)
+FULL_BODY = ('Chest', 'Back', 'Legs', 'Shoulders', 'Arms', 'Abdominals')
+FOCUS_PROFILES = {
+    'Strength Training': ((0.0, 0.5, 1.0), 1.0, -0.5, FULL_BODY),
+    'Cardiovascular Health': ((0.3, 0.8, 0.6), -0.5, 0.5, ('Legs', 'Thighs', 'Hips', 'Abdominals')),
+    'Weight Loss': ((0.2, 0.7, 1.0), 0.0, 0.3, FULL_BODY),
+    'Flexibility': ((1.0, 0.4, -0.5), -1.0, 1.0, ('Back', 'Hips', 'Legs', 'Lower Back')),
+    'Balance and Coordination': ((0.8, 0.6, 0.0), -0.5, 0.8, ('Legs', 'Hips', 'Abdominals', 'Adductors and Abductors')),
+    'Endurance Training': ((0.3, 1.0, 0.6), -0.2, 0.3, FULL_BODY),
+    'High-Intensity Interval Training (HIIT)': ((-0.5, 0.4, 1.0), 0.0, 0.5, FULL_BODY),
+    'Muscle Toning': ((0.4, 1.0, 0.4), 0.4, 0.0, FULL_BODY),
+    'Core Strengthening': ((0.3, 0.8, 0.5), 0.0, 0.5, ('Abdominals', 'Lower Back', 'Hips')),
+    'Functional Fitness': ((0.3, 0.8, 0.6), 0.3, 0.3, FULL_BODY),
+    'Rehabilitation and Recovery': ((1.0, 0.3, -1.0), -0.8, 0.8, ('Back', 'Lower Back', 'Hips', 'Shoulders')),
+    'Sports Specific Training': ((0.0, 0.7, 1.0), 0.4, 0.2, FULL_BODY),
+    'Bodybuilding': ((0.0, 0.6, 1.0), 1.0, -0.8, ('Chest', 'Back', 'Shoulders', 'Arms', 'Legs')),
+    'Circuit Training': ((0.2, 0.8, 0.8), 0.0, 0.4, FULL_BODY),
+    'Mind-Body Wellness': ((1.0, 0.5, -0.5), -1.0, 1.0, ('Back', 'Hips', 'Abdominals', 'Lower Back')),
+}
+
+# Equipment values that mean no equipment is needed; these are always available
+BODYWEIGHT = ('', 'none', 'bodyweight', 'body weight')
+
+DEFAULT_EXERCISE_COUNT = 8
+MAX_EXERCISE_COUNT = 40
+DEFAULT_CANDIDATES = 200
+MAX_CANDIDATES = 5000
+MAX_RESULTS = 20
+# Each muscle group samples from at most this many times its quota of best-scoring exercises
+POOL_FACTOR = 16
+MIN_POOL = 64
+
+
+class GenerationError(ValueError):
+    """
+    Raised for invalid generation constraints, or constraints the catalog cannot satisfy.
+    """
+
+
+class CatalogFeatures:
+    """
+    The exercise catalog as column arrays, one row per exercise.
+    """
+
+    def __init__(self, rows):
+        """
+        :param rows: (exercise_id, muscle_group, intensity, rating, equipment_needed, weight) tuples
+        """
+        n = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * 6
+        self.exercise_ids = np.fromiter(columns[0], dtype=np.int64, count=n)
+
+        group_index = {group: i for i, group in enumerate(MUSCLE_GROUPS)}
+        self.muscle_group = np.fromiter((group_index.get(g, -1) for g in columns[1]), dtype=np.int8, count=n)
+
+        intensity_index = {intensity: i for i, intensity in enumerate(INTENSITIES)}
+        intensity = np.fromiter((intensity_index.get(i, -1) for i in columns[2]), dtype=np.int8, count=n)
+        # Intensity one-hot; unknown intensity rows stay all zero
+        self.intensity_onehot = np.zeros((n, len(INTENSITIES)), dtype=np.float32)
+        known = intensity >= 0
+        self.intensity_onehot[np.nonzero(known)[0], intensity[known]] = 1.0
+
+        rating = np.fromiter((r if r is not None else 5 for r in columns[3]), dtype=np.float32, count=n)
+        self.rating = (rating - 1.0) / 9.0
+
+        # Equipment is free text; exercises share a code when the normalized text matches
+        self.equipment_names = []
+        codes = {}
+        equipment = np.empty(n, dtype=np.int32)
+        for i, name in enumerate(columns[4]):
+            key = (name or '').strip().lower()
+            if key not in codes:
+                codes[key] = len(self.equipment_names)
+                self.equipment_names.append(key)
+            equipment[i] = codes[key]
+        self.equipment = equipment
+        self.bodyweight = np.isin(equipment, [codes[k] for k in BODYWEIGHT if k in codes])
+
+        weight = np.fromiter((w if isinstance(w, (int, float)) else 0 for w in columns[5]), dtype=np.float32, count=n)
+        weight = np.log1p(np.maximum(weight, 0))
+        self.weight = weight / weight.max() if n and weight.max() > 0 else weight
+
+    def __len__(self):
+        return len(self.exercise_ids)
+
+    @classmethod
+    def load(cls, conn):
+        rows = conn.execute("""
+            SELECT e.exercise_id, e.muscle_group, COALESCE(e.intensity, d.intensity),
+                   COALESCE(e.rating, d.rating), d.equipment_needed, d.weight
+            FROM Exercise e
+            LEFT JOIN Exercise_Detail d ON d.exercise_detail_id = e.exercise_detail_id
+            ORDER BY e.exercise_id
+        """).fetchall()
+        return cls([tuple(row) for row in rows])
+
+
+class FeatureCache:
+    """
+    Process-wide CatalogFeatures, reloaded only when Table_Version shows the catalog tables changed.
+    """
+
+    TABLES = ('Exercise', 'Exercise_Detail')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._features = None
+        self._versions = None
+        self.loads = 0
+
+    def _catalog_versions(self, conn):
+        rows = conn.execute(
+            f"SELECT table_name, version FROM Table_Version WHERE table_name IN ({', '.join('?' * len(self.TABLES))})",
+            self.TABLES
+        ).fetchall()
+        return tuple(sorted(tuple(row) for row in rows))
+
+    def get(self, conn):
+        """
+        :param conn: Open SQLite connection
+        :return: CatalogFeatures matching the current catalog
+        """
+        versions = self._catalog_versions(conn)
+        features = self._features
+        if features is not None and versions == self._versions:
+            return features
+        with self._lock:
+            if self._features is None or versions != self._versions:
+                self._features = CatalogFeatures.load(conn)
+                self._versions = versions
+                self.loads += 1
+            return self._features
+
+
+def _int_value(data, name, default, low, high):
+    value = data.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise GenerationError(f"'{name}' must be an integer")
+    if not low <= value <= high:
+        raise GenerationError(f"'{name}' must be between {low} and {high}")
+    return value
+
+
+class GenerationRequest:
+    """
+    Constraints for generated workouts. Every muscle group gets an equal share of the exercises,
+    so each generated workout covers all of them.
+    """
+
+    def __init__(self, focus, intensity=None, equipment=None, muscle_groups=None,
+                 exercise_count=DEFAULT_EXERCISE_COUNT, candidates=DEFAULT_CANDIDATES, results=1,
+                 temperature=0.5, seed=None):
+        if focus not in FOCUS_PROFILES:
+            raise GenerationError(f"Invalid focus '{focus}'")
+        if intensity is not None and intensity not in INTENSITIES:
+            raise GenerationError(f"Invalid intensity '{intensity}'")
+        muscle_groups = list(muscle_groups or FOCUS_PROFILES[focus][3])
+        for group in muscle_groups:
+            if group not in MUSCLE_GROUPS:
+                raise GenerationError(f"Invalid muscle_group '{group}'")
+        if len(set(muscle_groups)) != len(muscle_groups):
+            raise GenerationError("'muscle_groups' must not repeat a group")
+        if exercise_count < len(muscle_groups):
+            raise GenerationError(f"'exercise_count' must be at least the number of muscle groups ({len(muscle_groups)})")
+        if temperature <= 0:
+            raise GenerationError("'temperature' must be positive")
+
+        self.focus = focus
+        self.intensity = intensity
+        # None means any equipment is available
+        self.equipment = None if equipment is None else {e.strip().lower() for e in equipment}
+        self.muscle_groups = muscle_groups
+        self.exercise_count = exercise_count
+        self.candidates = candidates
+        self.results = min(results, candidates)
+        self.temperature = temperature
+        self.seed = seed
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Build a request from a JSON body:
+          focus (required), intensity, equipment (list; omit for any), muscle_groups (list),
+          exercise_count, candidates, results, temperature, seed.
+        """
+        equipment = data.get('equipment')
+        if equipment is not None and not (isinstance(equipment, list) and all(isinstance(e, str) for e in equipment)):
+            raise GenerationError("'equipment' must be a list of strings")
+        muscle_groups = data.get('muscle_groups')
+        if muscle_groups is not None and not isinstance(muscle_groups, list):
+            raise GenerationError("'muscle_groups' must be a list")
+        try:
+            temperature = float(data.get('temperature', 0.5))
+        except (TypeError, ValueError):
+            raise GenerationError("'temperature' must be a number")
+        seed = data.get('seed')
+        if seed is not None and not isinstance(seed, int):
+            raise GenerationError("'seed' must be an integer")
+        return cls(
+            focus=data.get('focus'),
+            intensity=data.get('intensity'),
+            equipment=equipment,
+            muscle_groups=muscle_groups,
+            exercise_count=_int_value(data, 'exercise_count', DEFAULT_EXERCISE_COUNT, 1, MAX_EXERCISE_COUNT),
+            candidates=_int_value(data, 'candidates', DEFAULT_CANDIDATES, 1, MAX_CANDIDATES),
+            results=_int_value(data, 'results', 1, 1, MAX_RESULTS),
+            temperature=temperature,
+            seed=seed,
+        )
+
+    def quotas(self):
+        # Spread the exercise count evenly, earlier groups taking the remainder
+        base, extra = divmod(self.exercise_count, len(self.muscle_groups))
+        return [base + (1 if i < extra else 0) for i in range(len(self.muscle_groups))]
+
+    def base_scores(self, features):
+        """
+        Score every exercise for this request in one pass over the feature columns.
+        :return: float32 array, -inf for exercises ruled out by the equipment constraint
+        """
+        intensity_pref, weight_pref, bodyweight_pref, _ = FOCUS_PROFILES[self.focus]
+        intensity_weights = np.asarray(intensity_pref, dtype=np.float32)
+        if self.intensity is not None:
+            # An explicit intensity dominates the focus preference
+            target = np.zeros(len(INTENSITIES), dtype=np.float32)
+            target[INTENSITIES.index(self.intensity)] = 2.0
+            intensity_weights = 0.5 * intensity_weights + target - 0.5
+
+        scores = features.intensity_onehot @ intensity_weights
+        scores += 1.5 * features.rating
+        scores += weight_pref * features.weight
+        scores += bodyweight_pref * features.bodyweight
+
+        if self.equipment is not None:
+            allowed = [code for code, name in enumerate(features.equipment_names) if name in self.equipment]
+            available = features.bodyweight | np.isin(features.equipment, allowed)
+            scores = np.where(available, scores, -np.inf)
+        return scores.astype(np.float32, copy=False)
+
+    def generate(self, features):
+        """
+        Sample candidate workouts and return the best ones.
+        Each muscle group draws its share of exercises without replacement, with probability
+        proportional to exp(score / temperature) (Gumbel top-k), for all candidates at once.
+        :param features: CatalogFeatures
+        :return: List of (exercise_ids, score) pairs, best first, at most `results` long
+        """
+        rng = np.random.default_rng(self.seed)
+        scores = self.base_scores(features)
+        quotas = self.quotas()
+
+        chosen = []
+        for group, quota in zip(self.muscle_groups, quotas):
+            if quota == 0:
+                continue
+            members = np.nonzero((features.muscle_group == MUSCLE_GROUPS.index(group)) & np.isfinite(scores))[0]
+            if len(members) < quota:
+                raise GenerationError(f"Only {len(members)} exercises match '{group}' with the given equipment; "
+                                      f"{quota} needed")
+            # Low scorers almost never win the draw, so sample from the group's best exercises only
+            pool_size = min(len(members), max(POOL_FACTOR * quota, MIN_POOL))
+            if pool_size < len(members):
+                members = members[np.argpartition(-scores[members], pool_size - 1)[:pool_size]]
+            perturbed = scores[members] / self.temperature + rng.gumbel(size=(self.candidates, len(members)))
+            picks = np.argpartition(-perturbed, quota - 1, axis=1)[:, :quota]
+            chosen.append(members[picks])
+        picked = np.concatenate(chosen, axis=1)
+
+        totals = scores[picked].sum(axis=1)
+        # Small bonus for equipment variety within a workout
+        equipment = np.sort(features.equipment[picked], axis=1)
+        variety = (np.diff(equipment, axis=1) != 0).sum(axis=1) + 1
+        totals = totals + 0.1 * variety
+
+        order = np.argsort(-totals, kind='stable')
+        results, seen = [], set()
+        for i in order:
+            key = tuple(np.sort(picked[i]))
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append(([int(x) for x in features.exercise_ids[picked[i]]], float(totals[i])))
+            if len(results) >= self.results:
+                break
+        return results
@@ -0,0 +1,240 @@
+import contextvars
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class WriteTimeoutError(sqlite3.OperationalError):
+    """
+    Raised when a queued write did not complete before the caller's timeout.
+    """
+
+
+class WriteResult:
+    __slots__ = ('lastrowid', 'rowcount')
+
+    def __init__(self, lastrowid, rowcount):
+        self.lastrowid = lastrowid
+        self.rowcount = rowcount
+
+
+class _WriteOp:
+    __slots__ = ('fn', 'args', 'kwargs', 'future', 'context')
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        # The caller's context variables (e.g. the request's SQL statistics) apply while fn runs
+        self.context = contextvars.copy_context()
+
+
+_STOP = object()
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class WriteQueue:
+    """
+    Single writer thread that owns the write connection and applies queued writes with group commit.
+
+    Callers submit a function taking the connection; every operation waiting in the queue when the
+    writer wakes up is applied in one BEGIN IMMEDIATE ... COMMIT, each inside its own savepoint, so
+    one failing operation is rolled back alone and the rest of the batch still commits with a single
+    fsync. Each caller's future gets its own return value or exception once the batch has committed.
+    Operations must not commit or roll back themselves.
+    """
+
+    def __init__(self, connect, max_batch=128, timeout=30.0, retries=5, retry_delay=0.05,
+                 before_commit=None, after_commit=None, logger=None):
+        """
+        :param connect: Callable returning a new sqlite3 connection for the writer thread
+        :param max_batch: Maximum number of operations committed together
+        :param timeout: Seconds run() waits for an operation before raising WriteTimeoutError
+        :param retries: Times a batch is retried when the database is locked by another process
+        :param retry_delay: Initial backoff between retries, doubled each attempt
+        :param before_commit: Optional before_commit(conn) called inside each batch's transaction after its
+                              operations; its result is passed to after_commit
+        :param after_commit: Optional after_commit(result) called on the writer thread once the batch has
+                             committed; it must not block. Errors it raises are logged and do not affect
+                             the batch's results
+        :param logger: Logger for after_commit errors (defaults to this module's)
+        """
+        self.connect = connect
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self._batches = 0
+        self._operations = 0
+        self._failed = 0
+        self._busy_retries = 0
+        self._largest_batch = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(conn, *args, **kwargs) to run on the writer thread, in a copy of the caller's context, so
+        its statements count towards the calling request's Server-Timing and SQL metrics.
+        :return: concurrent.futures.Future resolved after the enclosing transaction commits
+        """
+        op = _WriteOp(fn, args, kwargs)
+        self._ensure_started()
+        self._queue.put(op)
+        return op.future
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Queue a write and wait for its result; exceptions raised by fn are re-raised here.
+        """
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise WriteTimeoutError(f"Write not completed within {self.timeout} seconds")
+
+    def execute(self, sql, parameters=()):
+        """
+        Run a single statement on the writer thread.
+        :return: WriteResult with the statement's lastrowid and rowcount
+        """
+        def op(conn):
+            cur = conn.execute(sql, parameters)
+            return WriteResult(cur.lastrowid, cur.rowcount)
+        return self.run(op)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+
+        def op(conn):
+            cur = conn.executemany(sql, seq_of_parameters)
+            return WriteResult(cur.lastrowid, cur.rowcount)
+        return self.run(op)
+
+    # -- writer thread -------------------------------------------------------
+
+    def _run(self):
+        conn = None
+        while True:
+            op = self._queue.get()
+            if op is _STOP:
+                break
+            batch = [op]
+            stop = False
+            # Everything that queued up while the previous batch was committing goes in this one
+            while len(batch) < self.max_batch:
+                try:
+                    op = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is _STOP:
+                    stop = True
+                    break
+                batch.append(op)
+
+            batch = [op for op in batch if op.future.set_running_or_notify_cancel()]
+            if batch:
+                try:
+                    if conn is None:
+                        conn = self.connect()
+                        # Transactions are managed explicitly below
+                        conn.isolation_level = None
+                    self._commit_batch(conn, batch)
+                except Exception as e:
+                    for op in batch:
+                        if not op.future.done():
+                            op.future.set_exception(e)
+            if stop:
+                break
+        if conn is not None:
+            conn.close()
+
+    def _commit_batch(self, conn, batch):
+        attempt = 0
+        while True:
+            outcomes = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for op in batch:
+                    conn.execute("SAVEPOINT write_op")
+                    try:
+                        result = op.context.run(op.fn, conn, *op.args, **op.kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_op")
+                        conn.execute("RELEASE write_op")
+                        outcomes.append((False, e))
+                    else:
+                        conn.execute("RELEASE write_op")
+                        outcomes.append((True, result))
+                committed = self.before_commit(conn) if self.before_commit is not None else None
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                # Another process holds the write lock past busy_timeout: back off and replay the batch
+                if _is_busy(e) and attempt < self.retries:
+                    self._busy_retries += 1
+                    time.sleep(self.retry_delay * (2 ** attempt))
+                    attempt += 1
+                    continue
+                raise
+            break
+
+        if self.after_commit is not None:
+            # The batch is durable at this point; a failing hook must not turn it into an error for the callers
+            try:
+                self.after_commit(committed)
+            except Exception:
+                self.logger.exception("after_commit hook failed")
+        self._batches += 1
+        self._operations += len(batch)
+        self._largest_batch = max(self._largest_batch, len(batch))
+        for op, (ok, value) in zip(batch, outcomes):
+            if ok:
+                op.future.set_result(value)
+            else:
+                self._failed += 1
+                op.future.set_exception(value)
+
+    def close(self):
+        """
+        Stop the writer thread after the operations already queued have been applied.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'batches': self._batches,
+            'operations': self._operations,
+            'failed': self._failed,
+            'busy_retries': self._busy_retries,
+            'largest_batch': self._largest_batch,
+            'mean_batch': self._operations / self._batches if self._batches else 0.0,
+        }